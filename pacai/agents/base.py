@@ -25,6 +25,8 @@ class BaseAgent(abc.ABC):
         self.index = index
         self.kwargs = kwargs
 
+        self._moveWarningTime = None
+
     @abc.abstractmethod
     def getAction(self, state):
         """
@@ -41,6 +43,22 @@ class BaseAgent(abc.ABC):
 
         pass
 
+    def getMoveWarningTime(self):
+        """
+        Get the number of seconds this agent can take on a move before the game warns it,
+        or None if the agent has not been told (e.g. it is not in a game).
+        """
+
+        return self._moveWarningTime
+
+    def setMoveWarningTime(self, seconds):
+        """
+        Called by the game (before `BaseAgent.registerInitialState`)
+        with the number of seconds this agent can take on a move before it gets a warning.
+        """
+
+        self._moveWarningTime = seconds
+
     def observationFunction(self, state):
         """
         Make an observation on the state of the game.
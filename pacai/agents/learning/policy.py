@@ -0,0 +1,58 @@
+from pacai.agents.learning.value import ValueEstimationAgent
+from pacai.core.mdp import CompiledMDP
+from pacai.core.mdp import DEFAULT_EVALUATION_TOLERANCE
+
+class PolicyIterationAgent(ValueEstimationAgent):
+    """
+    A policy iteration agent.
+
+    A `PolicyIterationAgent` takes a `pacai.core.mdp.MarkovDecisionProcess` on initialization,
+    and runs policy iteration (see `pacai.core.mdp.CompiledMDP.policyIteration`)
+    for up to the given number of iterations or until the policy stops changing.
+    Each policy is evaluated (almost) exactly, so with high discount rates
+    this usually takes far fewer iterations than value iteration.
+    """
+
+    def __init__(self, index, mdp, discountRate = 0.9, iters = 100,
+            tolerance = DEFAULT_EVALUATION_TOLERANCE, **kwargs):
+        super().__init__(index, **kwargs)
+
+        self.mdp = mdp
+        self.discountRate = discountRate
+        self.iters = iters
+
+        compiled = CompiledMDP(mdp)
+        values, policy, self.numIterations = compiled.policyIteration(discountRate, iters,
+                tolerance)
+
+        self.values = compiled.getValueDict(values)
+        self.policy = compiled.getPolicyActions(policy)
+
+    def getAction(self, state):
+        """
+        Returns the policy at the state (no exploration).
+        """
+
+        return self.getPolicy(state)
+
+    def getPolicy(self, state):
+        if (state in self.policy):
+            return self.policy[state]
+
+        # States that are not part of the MDP (like walls) have nothing to choose between.
+        actions = self.mdp.getPossibleActions(state)
+        if (len(actions) == 0):
+            return None
+
+        return actions[0]
+
+    def getQValue(self, state, action):
+        qValue = 0.0
+        for nextState, probability in self.mdp.getTransitionStatesAndProbs(state, action):
+            qValue += probability * (self.mdp.getReward(state, action, nextState)
+                    + self.discountRate * self.getValue(nextState))
+
+        return qValue
+
+    def getValue(self, state):
+        return self.values.get(state, 0.0)
@@ -3,6 +3,7 @@ import logging
 import time
 
 from pacai.agents.learning.value import ValueEstimationAgent
+from pacai.util.replayBuffer import ReplayBuffer
 
 class ReinforcementAgent(ValueEstimationAgent):
     """
@@ -12,10 +13,15 @@ class ReinforcementAgent(ValueEstimationAgent):
     The environment will call `ReinforcementAgent.observeTransition`,
     which will then call `ReinforcementAgent.update` (which you should override).
     Use `ReinforcementAgent.getLegalActions` to know which actions are available in a state.
+
+    With experience replay (a positive replayCapacity),
+    transitions are kept in a `pacai.util.replayBuffer.ReplayBuffer`
+    and every observed transition instead triggers an update on a mini-batch of experiences
+    (see `ReinforcementAgent.updateBatch`).
     """
 
     def __init__(self, index, actionFn = None, numTraining = 100, epsilon = 0.5,
-            alpha = 0.5, gamma = 1, **kwargs):
+            alpha = 0.5, gamma = 1, replayCapacity = 0, replayBatchSize = 32, **kwargs):
         """
         Args:
             actionFn: A function which takes a state and returns the list of legal actions.
@@ -23,6 +29,8 @@ class ReinforcementAgent(ValueEstimationAgent):
             epsilon: The exploration rate.
             gamma: The discount factor.
             numTraining: The number of training episodes.
+            replayCapacity: The number of experiences to remember (0 for no experience replay).
+            replayBatchSize: The number of experiences in each update when replaying.
         """
         super().__init__(index, **kwargs)
 
@@ -38,6 +46,15 @@ class ReinforcementAgent(ValueEstimationAgent):
         self.alpha = float(alpha)
         self.discountRate = float(gamma)
 
+        self.replayBuffer = None
+        if (int(replayCapacity) > 0):
+            self.replayBuffer = ReplayBuffer(replayCapacity)
+
+        self.replayBatchSize = int(replayBatchSize)
+        if (self.replayBatchSize < 1):
+            raise ValueError('The replay batch size must be positive, got %d.'
+                    % (self.replayBatchSize))
+
     @abc.abstractmethod
     def update(self, state, action, nextState, reward):
         """
@@ -74,7 +91,49 @@ class ReinforcementAgent(ValueEstimationAgent):
         """
 
         self.episodeRewards += deltaReward
-        self.update(state, action, nextState, deltaReward)
+
+        if (self.replayBuffer is None):
+            self.update(state, action, nextState, deltaReward)
+            return
+
+        # Nothing is learned after training, so there is no need to remember or replay anything.
+        if (self.alpha == 0.0):
+            return
+
+        self.replayBuffer.add(*self.makeExperience(state, action, nextState, deltaReward))
+        self.updateBatch(self.replayBuffer.sample(self.replayBatchSize))
+
+    def clearExperience(self):
+        """
+        Forget the transitions seen so far (but not what was learned from them),
+        e.g. the remembered experiences for replay.
+        This is how a training worker starts each round from just the parameters it was sent.
+        """
+
+        self.lastState = None
+        self.lastAction = None
+
+        if (self.replayBuffer is not None):
+            self.replayBuffer.clear()
+
+    def makeExperience(self, state, action, nextState, reward):
+        """
+        Get what to remember about a transition for experience replay,
+        as a (state, action, nextState, reward) tuple.
+        Learners can override this to remember something cheaper to replay
+        (e.g. feature vectors instead of states).
+        """
+
+        return (state, action, nextState, reward)
+
+    def updateBatch(self, experiences):
+        """
+        Learn from a mini-batch of experiences (see `ReinforcementAgent.makeExperience`).
+        By default, this is just an update for each experience.
+        """
+
+        for (state, action, nextState, reward) in experiences:
+            self.update(state, action, nextState, reward)
 
     def startEpisode(self):
         """
@@ -95,7 +154,15 @@ class ReinforcementAgent(ValueEstimationAgent):
         else:
             self.accumTestRewards += self.episodeRewards
 
-        self.episodesSoFar += 1
+        self.addEpisodes(1)
+
+    def addEpisodes(self, numEpisodes):
+        """
+        Count finished episodes, and stop learning once training is over.
+        Also used to count episodes that were played elsewhere (e.g. by training workers).
+        """
+
+        self.episodesSoFar += numEpisodes
         if (self.episodesSoFar >= self.numTraining):
             # Take off the training wheels.
             self.epsilon = 0.0  # No exploration.
@@ -0,0 +1,294 @@
+"""
+A Monte Carlo Tree Search (MCTS) agent.
+"""
+
+import math
+import random
+import time
+
+from pacai.agents.base import BaseAgent
+from pacai.agents.search.multiagent import getMoveTimeLimit
+from pacai.agents.search.multiagent import parseTimeLimit
+from pacai.util import reflection
+
+# The number of simulations per move when there is no time limit (or simulation limit).
+DEFAULT_NUM_SIMULATIONS = 200
+
+# The default UCT exploration constant (for values that are normalized to [0, 1]).
+DEFAULT_EXPLORATION = math.sqrt(2)
+
+class MCTSNode(object):
+    """
+    A state in the search tree where it is the searching agent's turn.
+
+    The tree only branches on the searching agent's actions.
+    The other agents move (using their models) between the searching agent's turns,
+    so an action can lead to many different children (keyed by the hash of their state).
+    """
+
+    def __init__(self, state, agentIndex):
+        self.visits = 0
+
+        # {action: [visits, total value]}
+        self.actionStats = {}
+
+        # {action: {state hash: MCTSNode}}
+        self.children = {}
+
+        self.untriedActions = []
+        if (not state.isOver()):
+            self.untriedActions = list(state.getLegalActions(agentIndex))
+            random.shuffle(self.untriedActions)
+
+    def getChild(self, action, state, agentIndex):
+        """
+        Get the child that taking the action led to, making a new child if it is a new state.
+        Returns (child, is new).
+        """
+
+        children = self.children.setdefault(action, {})
+
+        key = hash(state)
+        if (key in children):
+            return children[key], False
+
+        child = MCTSNode(state, agentIndex)
+        children[key] = child
+
+        return child, True
+
+    def getMostVisitedAction(self):
+        """
+        Get the action that was searched the most (ties broken by the best average value).
+        """
+
+        return max(self.actionStats,
+                key = lambda action: (self.actionStats[action][0], _mean(self.actionStats[action])))
+
+    def selectAction(self, exploration, minValue, maxValue):
+        """
+        Choose the action with the best upper confidence bound (UCT).
+        Values are normalized to [0, 1] using the range of values seen so far.
+        """
+
+        valueRange = maxValue - minValue
+        logVisits = math.log(self.visits)
+
+        bestAction = None
+        bestBound = float('-inf')
+
+        for action, stats in self.actionStats.items():
+            value = 0.5
+            if (valueRange > 0):
+                value = (_mean(stats) - minValue) / valueRange
+
+            bound = value + exploration * math.sqrt(logVisits / stats[0])
+            if (bound > bestBound):
+                bestBound = bound
+                bestAction = action
+
+        return bestAction
+
+    def update(self, action, value):
+        self.visits += 1
+
+        stats = self.actionStats.setdefault(action, [0, 0.0])
+        stats[0] += 1
+        stats[1] += value
+
+class MCTSAgent(BaseAgent):
+    """
+    An agent that plans with Monte Carlo Tree Search (UCT).
+
+    Every simulation walks down the tree (choosing actions with UCT),
+    adds a new node, and then plays a rollout for up to depth rounds
+    before scoring the final state with the evaluation function.
+    In the tree and in rollouts, every other agent (teammates and opponents)
+    moves by asking an instance of the agentModel agent (e.g. RandomGhost or DirectionalGhost).
+    In rollouts, this agent moves by asking an instance of the rolloutPolicy agent.
+
+    Simulations are run until the time limit runs out
+    (in seconds, or 'auto' to use most of the game's move warning time,
+    like `pacai.agents.search.multiagent.MultiAgentSearchAgent`)
+    or numSimulations have been run.
+    When neither is given, DEFAULT_NUM_SIMULATIONS are run.
+
+    The part of the tree under the state that the game actually reached is kept for the next move.
+
+    In games with teams (capture), values are from the perspective of this agent's team
+    (so the evaluation function's value is negated for the blue team).
+    """
+
+    def __init__(self, index, evalFn = 'pacai.core.eval.score', depth = 10, timeLimit = None,
+            numSimulations = None, agentModel = 'pacai.agents.random.RandomAgent',
+            rolloutPolicy = 'pacai.agents.random.RandomAgent',
+            exploration = DEFAULT_EXPLORATION, **kwargs):
+        super().__init__(index, **kwargs)
+
+        self._evaluationFunction = reflection.qualifiedImport(evalFn)
+        self._treeDepth = int(depth)
+
+        self._timeLimit = parseTimeLimit(timeLimit)
+
+        self._numSimulations = None
+        if (numSimulations is not None):
+            self._numSimulations = int(numSimulations)
+
+        self._agentModelName = agentModel
+        self._rolloutPolicyName = rolloutPolicy
+        self._exploration = float(exploration)
+
+        self._models = {}
+        self._valueSign = 1
+
+        self._root = None
+        self._lastAction = None
+
+        self._minValue = float('inf')
+        self._maxValue = float('-inf')
+
+    def getAction(self, state):
+        self._root = self._getRoot(state)
+
+        timeLimit = self.getTimeLimit()
+        numSimulations = self._numSimulations
+        if (timeLimit is None and numSimulations is None):
+            numSimulations = DEFAULT_NUM_SIMULATIONS
+
+        deadline = None
+        if (timeLimit is not None):
+            deadline = time.time() + timeLimit
+
+        # Always run at least one simulation, so there is an action to take.
+        count = 0
+        while (count == 0 or ((numSimulations is None or count < numSimulations)
+                and (deadline is None or time.time() < deadline))):
+            self._simulate(state)
+            count += 1
+
+        self._lastAction = self._root.getMostVisitedAction()
+        return self._lastAction
+
+    def getEvaluationFunction(self):
+        return self._evaluationFunction
+
+    def getRoot(self):
+        """
+        Get the root of the last search.
+        """
+
+        return self._root
+
+    def getTimeLimit(self):
+        """
+        Get the number of seconds to search for on a move,
+        or None if only the number of simulations limits the search.
+        """
+
+        return getMoveTimeLimit(self, self._timeLimit)
+
+    def getTreeDepth(self):
+        return self._treeDepth
+
+    def registerInitialState(self, state):
+        super().registerInitialState(state)
+
+        self._valueSign = 1
+        if (hasattr(state, 'isOnRedTeam') and not state.isOnRedTeam(self.index)):
+            self._valueSign = -1
+
+        self._models = {}
+        for agentIndex in range(state.getNumAgents()):
+            name = self._agentModelName
+            if (agentIndex == self.index):
+                name = self._rolloutPolicyName
+
+            model = BaseAgent.loadAgent(name, agentIndex)
+            model.registerInitialState(state)
+            self._models[agentIndex] = model
+
+        self._root = None
+        self._lastAction = None
+        self._minValue = float('inf')
+        self._maxValue = float('-inf')
+
+    def _advance(self, state, action):
+        """
+        Take the action, and then let the other agents move (using their models)
+        until it is this agent's turn again (or the game is over).
+        """
+
+        state = state.generateSuccessor(self.index, action)
+
+        numAgents = state.getNumAgents()
+        for offset in range(1, numAgents):
+            if (state.isOver()):
+                break
+
+            agentIndex = (self.index + offset) % numAgents
+            state = state.generateSuccessor(agentIndex, self._models[agentIndex].getAction(state))
+
+        return state
+
+    def _evaluate(self, state):
+        return self._valueSign * self.getEvaluationFunction()(state)
+
+    def _getRoot(self, state):
+        """
+        Reuse the node for this state from the last search, if there is one.
+        """
+
+        if (self._root is not None and self._lastAction is not None):
+            children = self._root.children.get(self._lastAction, {})
+            node = children.get(hash(state))
+            if (node is not None):
+                return node
+
+        return MCTSNode(state, self.index)
+
+    def _rollout(self, state):
+        """
+        Play up to depth rounds with the models, and evaluate the final state.
+        """
+
+        numAgents = state.getNumAgents()
+        for i in range(self.getTreeDepth() * numAgents):
+            if (state.isOver()):
+                break
+
+            agentIndex = (self.index + i) % numAgents
+            state = state.generateSuccessor(agentIndex, self._models[agentIndex].getAction(state))
+
+        return self._evaluate(state)
+
+    def _simulate(self, state):
+        """
+        Run a single simulation (selection, expansion, rollout, and backpropagation).
+        """
+
+        node = self._root
+        path = []
+
+        while (not state.isOver()):
+            if (len(node.untriedActions) > 0):
+                action = node.untriedActions.pop()
+            else:
+                action = node.selectAction(self._exploration, self._minValue, self._maxValue)
+
+            state = self._advance(state, action)
+            path.append((node, action))
+
+            node, isNew = node.getChild(action, state, self.index)
+            if (isNew):
+                break
+
+        value = self._rollout(state)
+
+        self._minValue = min(self._minValue, value)
+        self._maxValue = max(self._maxValue, value)
+
+        for (node, action) in path:
+            node.update(action, value)
+
+def _mean(stats):
+    return stats[1] / stats[0]
@@ -1,19 +1,124 @@
+import random
+
 from pacai.agents.base import BaseAgent
+from pacai.core.search.adversarial import AdversarialSearch
+from pacai.core.search.adversarial import DEFAULT_TABLE_SIZE
 from pacai.util import reflection
 
+# The fraction of the game's move warning time that a timed search will use.
+MOVE_TIME_FRACTION = 0.8
+
 class MultiAgentSearchAgent(BaseAgent):
     """
     A common class for all multi-agent searchers.
+
+    By default, searchers go to a fixed depth.
+    If a time limit is given (in seconds, or 'auto' to use most of the game's move warning time),
+    or the search is spread across more than one process (numJobs),
+    searchers can instead use `MultiAgentSearchAgent.getEngineAction`
+    (see `pacai.core.search.adversarial`).
     """
 
-    def __init__(self, index, evalFn = 'pacai.core.eval.score', depth = 2, **kwargs):
+    def __init__(self, index, evalFn = 'pacai.core.eval.score', depth = 2,
+            timeLimit = None, tableSize = DEFAULT_TABLE_SIZE, numJobs = 1, **kwargs):
         super().__init__(index, **kwargs)
 
         self._evaluationFunction = reflection.qualifiedImport(evalFn)
         self._treeDepth = int(depth)
 
+        self._timeLimit = parseTimeLimit(timeLimit)
+
+        self._tableSize = int(tableSize)
+        self._searchEngines = {}
+
+        self._numJobs = int(numJobs)
+        if (self._numJobs < 1):
+            raise ValueError('The number of jobs must be positive, got %d.' % (self._numJobs))
+
+    def final(self, state):
+        """
+        Stop the search processes at the end of the game (they are kept between moves).
+        """
+
+        for engine in self._searchEngines.values():
+            engine.closePool()
+
+    def getEngineAction(self, state, expectimax = False):
+        """
+        Get an action from the search engine.
+        With a time limit, the search iteratively deepens until the time runs out.
+        Otherwise, the search goes to the tree depth with the root's moves spread across processes
+        (and one of the best moves is chosen randomly).
+        """
+
+        engine = self.getSearchEngine(expectimax)
+
+        timeLimit = self.getTimeLimit()
+        if (timeLimit is not None):
+            return engine.iterativeDeepening(state, timeLimit)
+
+        value, bestActions = engine.searchParallel(state, self._treeDepth, self._numJobs)
+        return random.choice(bestActions)
+
     def getEvaluationFunction(self):
         return self._evaluationFunction
 
+    def getNumJobs(self):
+        return self._numJobs
+
+    def getSearchEngine(self, expectimax = False):
+        """
+        Get this agent's `pacai.core.search.adversarial.AdversarialSearch`.
+        The engine (and its transposition table) is kept between moves.
+        """
+
+        if (expectimax not in self._searchEngines):
+            self._searchEngines[expectimax] = AdversarialSearch(self._evaluationFunction,
+                    self.index, expectimax, self._tableSize)
+
+        return self._searchEngines[expectimax]
+
+    def getTimeLimit(self):
+        """
+        Get the number of seconds a timed search can take for a move,
+        or None if this agent searches to a fixed depth.
+        """
+
+        return getMoveTimeLimit(self, self._timeLimit)
+
     def getTreeDepth(self):
         return self._treeDepth
+
+    def useSearchEngine(self):
+        """
+        Check if this agent should get its actions from `MultiAgentSearchAgent.getEngineAction`.
+        """
+
+        return (self.getTimeLimit() is not None or self._numJobs > 1)
+
+def getMoveTimeLimit(agent, timeLimit):
+    """
+    Get the number of seconds an agent's search can take for a move,
+    given its time limit option (see `parseTimeLimit`).
+    An 'auto' time limit is MOVE_TIME_FRACTION of the game's move warning time,
+    or None when the agent has not been told the move warning time (e.g. it is not in a game).
+    """
+
+    if (timeLimit != 'auto'):
+        return timeLimit
+
+    moveWarningTime = agent.getMoveWarningTime()
+    if (moveWarningTime is None):
+        return None
+
+    return moveWarningTime * MOVE_TIME_FRACTION
+
+def parseTimeLimit(timeLimit):
+    """
+    Parse a time limit option: None (no time limit), a number of seconds, or 'auto'.
+    """
+
+    if (timeLimit is None or timeLimit == 'auto'):
+        return timeLimit
+
+    return float(timeLimit)
@@ -58,11 +58,26 @@ def getParser(description, name):
 
     parser.add_argument('--record', dest = 'record',
             action = 'store', type = str, default = None,
-            help = 'writes the moves of a game to the named pickle file (default: %(default)s)')
+            help = 'writes the moves of every game to the named replay file (default: %(default)s)')
 
     parser.add_argument('--replay', dest = 'replay',
             action = 'store', type = str, default = None,
-            help = 'load a recorded pickle game file to replay (default: %(default)s)')
+            help = 'load a recorded replay file to replay (default: %(default)s)')
+
+    parser.add_argument('--replay-index', dest = 'replayIndex',
+            action = 'store', type = int, default = -1,
+            help = 'the index of the game to replay from a replay file with many games,'
+                + ' negative indexes count back from the last game (default: %(default)s)')
+
+    parser.add_argument('--replay-seek', dest = 'replaySeek',
+            action = 'store', type = int, default = 0,
+            help = 'start the replay after this many moves,'
+                + ' negative values count back from the end (default: %(default)s)')
+
+    parser.add_argument('--rescore', dest = 'rescore',
+            action = 'store_true', default = False,
+            help = 'replay every game in the replay file without any display'
+                + ' and report the final scores (default: %(default)s)')
 
     parser.add_argument('--sprites', dest = 'spritesPath',
             action = 'store', type = str, default = view.DEFAULT_SPRITES,
@@ -7,7 +7,6 @@ On your opponents side of the map, you are a pacman and can eat food and capsule
 
 import logging
 import os
-import pickle
 import random
 import sys
 
@@ -18,9 +17,13 @@ from pacai.core.actions import Actions
 from pacai.core.distance import manhattan
 from pacai.core.game import Game
 from pacai.core.gamestate import AbstractGameState
-from pacai.core.grid import Grid
+from pacai.core.grid import BitGrid
 from pacai.core.layout import Layout
 from pacai.core.layout import getLayout
+from pacai.core.replay import ReplayArchive
+from pacai.core.replay import ReplayPlayer
+from pacai.core.replay import ReplayWriter
+from pacai.core.replay import rescoreGames
 from pacai.ui.capture.null import CaptureNullView
 from pacai.ui.capture.text import CaptureTextView
 from pacai.util import reflection
@@ -38,6 +41,8 @@ MIN_FOOD = 2
 
 SCARED_TIME = 40
 
+DEFAULT_REPLAY_PATH = 'replay'
+
 class CaptureGameState(AbstractGameState):
     """
     A game state specific to capture.
@@ -78,11 +83,13 @@ class CaptureGameState(AbstractGameState):
             else:
                 self._blueCapsules.append(capsule)
 
-        self._redFood = Grid(self._food.getWidth(), self._food.getHeight(), initialValue = False)
-        self._blueFood = Grid(self._food.getWidth(), self._food.getHeight(), initialValue = False)
+        width = self._food.getWidth()
+        height = self._food.getHeight()
+        self._redFood = BitGrid(width, height, initialValue = False)
+        self._blueFood = BitGrid(width, height, initialValue = False)
 
-        for x in range(self._food.getWidth()):
-            for y in range(self._food.getHeight()):
+        for x in range(width):
+            for y in range(height):
                 if (not self._food[x][y]):
                     continue
 
@@ -187,6 +194,13 @@ class CaptureGameState(AbstractGameState):
 
         return self._redTeam
 
+    # Override
+    def getSnapshot(self):
+        snapshot = super().getSnapshot()
+        snapshot['timeleft'] = self._timeleft
+
+        return snapshot
+
     def getTimeleft(self):
         return self._timeleft
 
@@ -224,6 +238,38 @@ class CaptureGameState(AbstractGameState):
 
         return self._teams[agentIndex]
 
+    # Override
+    def loadSnapshot(self, snapshot):
+        state = super().loadSnapshot(snapshot)
+        state._timeleft = snapshot['timeleft']
+
+        # Split the food and capsules back up by side.
+        state._redFood = BitGrid(state._food.getWidth(), state._food.getHeight(),
+                initialValue = False)
+        state._blueFood = BitGrid(state._food.getWidth(), state._food.getHeight(),
+                initialValue = False)
+
+        for (x, y) in state._food.asList():
+            if (state.isOnRedSide((x, y))):
+                state._redFood[x][y] = True
+            else:
+                state._blueFood[x][y] = True
+
+        capsules = state._capsules
+        state._redCapsules = [capsule for capsule in capsules if (state.isOnRedSide(capsule))]
+        state._blueCapsules = [capsule for capsule in capsules if (state.isOnBlueSide(capsule))]
+
+        return state
+
+    # Override
+    def undo(self, record):
+        baseRecord, fields = record
+
+        super().undo(baseRecord)
+        (self._timeleft, self._redFood, self._blueFood,
+         self._redCapsules, self._blueCapsules) = fields
+
+    # Override
     def _applySuccessorAction(self, agentIndex, action):
         """
         Apply the action to the context state (self).
@@ -240,6 +286,23 @@ class CaptureGameState(AbstractGameState):
 
         self._hash = None
 
+    # Override
+    def _getAffectedAgents(self, agentIndex):
+        # An agent can only scare or respawn itself and the other team.
+        if (self.isOnRedTeam(agentIndex)):
+            otherTeam = self._blueTeam
+        else:
+            otherTeam = self._redTeam
+
+        return [agentIndex] + list(otherTeam)
+
+    # Override
+    def _makeUndoRecord(self, agentIndex):
+        fields = (self._timeleft, self._redFood, self._blueFood,
+                self._redCapsules, self._blueCapsules)
+
+        return (super()._makeUndoRecord(agentIndex), fields)
+
 class CaptureRules:
     """
     These game rules manage the control flow of a game, deciding when
@@ -306,12 +369,7 @@ class CaptureRules:
         state.endGame(True)
 
     def agentCrash(self, game, agentIndex):
-        if (game.state.isOnRedTeam(agentIndex)):
-            logging.error("Red agent crashed.")
-            game.state.setScore(-1)
-        else:
-            logging.error("Blue agent crashed.")
-            game.state.setScore(1)
+        CaptureRules.penalizeCrash(game.state, agentIndex)
 
     def getMaxTotalTime(self, agentIndex):
         return 900  # Move limits should prevent this from ever happening
@@ -328,6 +386,19 @@ class CaptureRules:
     def getMaxTimeWarnings(self, agentIndex):
         return 2  # Third violation loses the game
 
+    @staticmethod
+    def penalizeCrash(state, agentIndex):
+        """
+        An agent crashing (or timing out) loses the game for its team by a single point.
+        """
+
+        if (state.isOnRedTeam(agentIndex)):
+            logging.error("Red agent crashed.")
+            state.setScore(-1)
+        else:
+            logging.error("Blue agent crashed.")
+            state.setScore(1)
+
 class AgentRules:
     """
     These functions govern how each agent interacts with her environment.
@@ -342,8 +413,8 @@ class AgentRules:
         """
 
         agentState = state.getAgentState(agentIndex)
-        return Actions.getPossibleActions(agentState.getPosition(), agentState.getDirection(),
-                state.getWalls())
+        return list(state.getInitialLayout().getLegalActions(agentState.getPosition(),
+                agentState.getDirection()))
 
     @staticmethod
     def applyAction(state, action, agentIndex):
@@ -619,19 +690,7 @@ def readCommand(argv):
         args['agents'][index] = agent
 
     # Choose a layout.
-    if options.layout.startswith('RANDOM'):
-        layoutSeed = None
-        if (options.layout != 'RANDOM'):
-            layoutSeed = int(options.layout[6:])
-
-        args['layout'] = Layout(generateMaze(layoutSeed).split('\n'))
-    elif options.layout.lower().find('capture') == -1:
-        raise ValueError('You must use a capture layout with capture.py.')
-    else:
-        args['layout'] = getLayout(options.layout)
-
-    if (args['layout'] is None):
-        raise ValueError('The layout ' + options.layout + ' cannot be found.')
+    args['layout'] = getCaptureLayout(options.layout)
 
     args['length'] = options.maxMoves
     args['numGames'] = options.numGames
@@ -639,9 +698,35 @@ def readCommand(argv):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['replay'] = options.replay
+    args['replayIndex'] = options.replayIndex
+    args['replaySeek'] = options.replaySeek
+    args['rescore'] = options.rescore
 
     return args
 
+def getCaptureLayout(name):
+    """
+    Get a capture layout by name.
+    Use RANDOM<seed> for a random map generated with the given seed (e.g. RANDOM23),
+    or just RANDOM for a random map generated from the current random state.
+    """
+
+    if name.startswith('RANDOM'):
+        layoutSeed = None
+        if (name != 'RANDOM'):
+            layoutSeed = int(name[6:])
+
+        layout = Layout(generateMaze(layoutSeed).split('\n'))
+    elif name.lower().find('capture') == -1:
+        raise ValueError('You must use a capture layout with capture.py.')
+    else:
+        layout = getLayout(name)
+
+    if (layout is None):
+        raise ValueError('The layout ' + name + ' cannot be found.')
+
+    return layout
+
 def loadAgents(isRed, agentModule, textgraphics, args):
     """
     Calls agent factories and returns lists of agents.
@@ -660,18 +745,26 @@ def loadAgents(isRed, agentModule, textgraphics, args):
 
     return createTeamFunction(indices[0], indices[1], isRed, **args)
 
-def replayGame(layout, agents, actions, display, length, redTeamName, blueTeamName):
+def replayGame(layout, agents, actions, display, length, redTeamName, blueTeamName, start = 0,
+        keyframes = None):
+    """
+    Show a recorded game, starting after the given number of moves
+    (negative values count back from the end).
+    Any saved keyframes (see `pacai.core.replay.Replay.getKeyframes`) are used to seek.
+    Returns the `pacai.core.replay.ReplayPlayer` that played the game.
+    """
+
     agents = [DummyAgent(index) for index in range(len(agents))]
     rules = CaptureRules()
     game = rules.newGame(layout, agents, display, length, False)
-    state = game.state
     display.redTeam = redTeamName
     display.blueTeam = blueTeamName
-    display.initialize(state)
 
-    for action in actions:
-        # Execute the action
-        state = state.generateSuccessor(*action)
+    player = ReplayPlayer(game.state, actions, snapshots = keyframes)
+    states = player.iterStates(start)
+    display.initialize(next(states))
+
+    for state in states:
         # Change the display
         display.update(state)
         # Allow for game specific conditions (winning, losing, etc.)
@@ -679,6 +772,8 @@ def replayGame(layout, agents, actions, display, length, redTeamName, blueTeamNa
 
     display.finish()
 
+    return player
+
 def runGames(layout, agents, display, length, numGames, record, numTraining,
         redTeamName, blueTeamName, catchExceptions = False, **kwargs):
     rules = CaptureRules()
@@ -689,57 +784,62 @@ def runGames(layout, agents, display, length, numGames, record, numTraining,
         logging.info('Playing %d training games.' % numTraining)
         nullView = CaptureNullView()
 
-    for i in range(numGames):
-        isTraining = (i < numTraining)
+    recorder = None
+    if (record):
+        path = DEFAULT_REPLAY_PATH
+        if (isinstance(record, str)):
+            path = record
 
-        if (isTraining):
-            # Suppress graphics for training.
-            gameDisplay = nullView
-        else:
-            gameDisplay = display
-
-        g = rules.newGame(layout, agents, gameDisplay, length, catchExceptions)
-        g.run()
-
-        if (not isTraining):
-            games.append(g)
-
-        g.record = None
-        if record:
-            components = {
-                'layout': layout,
-                'agents': [agent.__class__.__name__ for agent in agents],
-                'actions': g.moveHistory,
-                'length': length,
-                'redTeamName': redTeamName,
-                'blueTeamName': blueTeamName
-            }
-
-            path = 'replay'
-            if (isinstance(record, str)):
-                path = record
-
-            g.record = pickle.dumps(components)
-            with open(path, 'wb') as file:
-                file.write(g.record)
-
-            logging.info("Game recorded to: '%s'." % (path))
-
-    if (numGames > 0):
-        scores = [game.state.getScore() for game in games]
-        redWinRate = [s > 0 for s in scores].count(True) / float(len(scores))
-        blueWinRate = [s < 0 for s in scores].count(True) / float(len(scores))
-        logging.info('Average Score:%s', sum(scores) / float(len(scores)))
-        logging.info('Scores:%s', ', '.join([str(score) for score in scores]))
-        logging.info('Red Win Rate: %d/%d (%.2f)' %
-                ([s > 0 for s in scores].count(True), len(scores), redWinRate))
-        logging.info('Blue Win Rate: %d/%d (%.2f)' %
-                ([s < 0 for s in scores].count(True), len(scores), blueWinRate))
-        logging.info('Record: %s',
-                ', '.join([('Blue', 'Tie', 'Red')[max(0, min(2, 1 + s))] for s in scores]))
+        recorder = ReplayWriter(path)
+
+    try:
+        for i in range(numGames):
+            isTraining = (i < numTraining)
+
+            if (isTraining):
+                # Suppress graphics for training.
+                gameDisplay = nullView
+            else:
+                gameDisplay = display
+
+            g = rules.newGame(layout, agents, gameDisplay, length, catchExceptions)
+
+            if (recorder is not None):
+                agentNames = [agent.__class__.__name__ for agent in agents]
+                recorder.startGame(layout, agents = agentNames, length = length,
+                        redTeamName = redTeamName, blueTeamName = blueTeamName)
+                g.recorder = recorder
+
+            g.run()
+
+            if (recorder is not None):
+                recorder.endGame()
+
+            if (not isTraining):
+                games.append(g)
+    finally:
+        # Closing the recorder also ends a game that crashed.
+        if (recorder is not None):
+            recorder.close()
+            logging.info("Games recorded to: '%s'." % (recorder.getPath()))
+
+    if (len(games) > 0):
+        _logResults([game.state for game in games])
 
     return games
 
+def _logResults(finalStates):
+    scores = [state.getScore() for state in finalStates]
+    redWinRate = [s > 0 for s in scores].count(True) / float(len(scores))
+    blueWinRate = [s < 0 for s in scores].count(True) / float(len(scores))
+    logging.info('Average Score:%s', sum(scores) / float(len(scores)))
+    logging.info('Scores:%s', ', '.join([str(score) for score in scores]))
+    logging.info('Red Win Rate: %d/%d (%.2f)' %
+            ([s > 0 for s in scores].count(True), len(scores), redWinRate))
+    logging.info('Blue Win Rate: %d/%d (%.2f)' %
+            ([s < 0 for s in scores].count(True), len(scores), blueWinRate))
+    logging.info('Record: %s',
+            ', '.join([('Blue', 'Tie', 'Red')[max(0, min(2, 1 + s))] for s in scores]))
 
 def main(argv):
     """
@@ -754,14 +854,26 @@ def main(argv):
 
     # Special case: recorded games don't use the runGames method.
     if (options['replay'] is not None):
-        logging.info('Replaying recorded game %s.' % options['replay'])
+        archive = ReplayArchive(options['replay'])
 
-        recorded = None
-        with open(options['replay'], 'rb') as file:
-            recorded = pickle.load(file)
+        if (options['rescore']):
+            logging.info('Rescoring recorded games %s.' % options['replay'])
+
+            createState = lambda recorded: CaptureGameState(recorded.getLayout(),
+                    recorded.getInfo()['length'])
+            finalStates = rescoreGames(archive, createState, CaptureRules.penalizeCrash)
+            if (len(finalStates) > 0):
+                _logResults(finalStates)
+
+            return finalStates
+
+        logging.info('Replaying recorded game %s.' % options['replay'])
 
-        recorded['display'] = options['display']
-        replayGame(**recorded)
+        recorded = archive.getGame(options['replayIndex'])
+        player = replayGame(recorded.getLayout(), actions = recorded.getActions(),
+                display = options['display'], start = options['replaySeek'],
+                keyframes = recorded.getKeyframes(), **recorded.getInfo())
+        archive.saveKeyframes(options['replayIndex'], player)
 
         return
 
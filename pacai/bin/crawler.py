@@ -2,22 +2,158 @@
 Binary for the crawler simulation.
 """
 
+import argparse
+import array
+import logging
+import os
+import random
 import sys
+import textwrap
 
-from pacai.ui.crawler.gui import run
+from pacai.core.crawler import CrawlerEnvironment
+from pacai.student.qlearningAgents import QLearningAgent
 from pacai.util.logs import initLogging
+from pacai.util.logs import updateLoggingLevel
 
-def _load_args(args):
-    executable = args.pop(0)
-    if (len(args) > 1 or ({'h', 'help'} & {arg.lower().strip().replace('-', '') for arg in args})):
-        print("USAGE: python3 %s [max steps]" % (executable), file = sys.stderr)
-        sys.exit(1)
+# The number of steps to train for with --headless (when no max steps are given).
+DEFAULT_HEADLESS_STEPS = 100000
 
-    max_steps = None
-    if (len(args) > 0):
-        max_steps = int(args.pop(0))
+# The starting learning parameters of the GUI.
+DEFAULT_DISCOUNT = 0.8
+DEFAULT_EPSILON = 0.5
+DEFAULT_LEARNING_RATE = 0.8
 
-    return max_steps
+def parseOptions(argv):
+    """
+    Processes the command used to run crawler from the command line.
+    """
+
+    description = """
+    DESCRIPTION:
+        This program will show a crawling robot learning to move forward.
+
+    EXAMPLES:
+        (1) python -m pacai.bin.crawler
+            - Opens the crawler GUI.
+        (2) python -m pacai.bin.crawler --headless 1000000 --robots 8
+            - Trains 8 q-learning robots for a million steps each (without any graphics),
+              and logs their average velocity as they learn.
+    """
+
+    parser = argparse.ArgumentParser(description = textwrap.dedent(description),
+        prog = os.path.basename(__file__), formatter_class = argparse.RawTextHelpFormatter)
+
+    parser.add_argument('maxSteps', metavar = 'max steps',
+            action = 'store', type = int, nargs = '?', default = None,
+            help = 'stop after this many steps (default: run until the window is closed, '
+                + 'or %d steps with --headless)' % (DEFAULT_HEADLESS_STEPS))
+
+    parser.add_argument('-d', '--debug', dest = 'debug',
+            action = 'store_true', default = False,
+            help = 'set logging level to debug (default: %(default)s)')
+
+    parser.add_argument('-e', '--epsilon', dest = 'epsilon',
+            action = 'store', type = float, default = DEFAULT_EPSILON,
+            help = 'chance of taking a random action with --headless (default %(default)s)')
+
+    parser.add_argument('-l', '--learning-rate', dest = 'learningRate',
+            action = 'store', type = float, default = DEFAULT_LEARNING_RATE,
+            help = 'the learning rate with --headless (default %(default)s)')
+
+    parser.add_argument('-q', '--quiet', dest = 'quiet',
+            action = 'store_true', default = False,
+            help = 'set logging level to warning (default: %(default)s)')
+
+    parser.add_argument('-y', '--discount', dest = 'discount',
+            action = 'store', type = float, default = DEFAULT_DISCOUNT,
+            help = 'discount on future with --headless (default %(default)s)')
+
+    parser.add_argument('--headless', dest = 'headless',
+            action = 'store_true', default = False,
+            help = 'train without any graphics and log the learning curve (default %(default)s)')
+
+    parser.add_argument('--interval', dest = 'interval',
+            action = 'store', type = int, default = 10000,
+            help = 'the number of steps in each point of the learning curve (default %(default)s)')
+
+    parser.add_argument('--robots', dest = 'robots',
+            action = 'store', type = int, default = 1,
+            help = 'the number of independent robots to train with --headless '
+                + '(default %(default)s)')
+
+    parser.add_argument('--seed', dest = 'seed',
+            action = 'store', type = int, default = None,
+            help = 'random seed for --headless (default: random)')
+
+    options, otherjunk = parser.parse_known_args(argv)
+
+    if len(otherjunk) != 0:
+        raise ValueError('Unrecognized options: \'%s\'.' % (str(otherjunk)))
+
+    # Set the logging level
+    if options.quiet and options.debug:
+        raise ValueError('Logging cannont be set to both debug and quiet.')
+
+    if options.quiet:
+        updateLoggingLevel(logging.WARNING)
+    elif options.debug:
+        updateLoggingLevel(logging.DEBUG)
+
+    if (options.interval < 1):
+        raise ValueError('The learning curve interval must be positive, got %d.'
+                % (options.interval))
+
+    if (options.robots != 1 and not options.headless):
+        raise ValueError('Training more than one robot (--robots) requires --headless.')
+
+    return options
+
+def runHeadless(numSteps, numRobots = 1, interval = 10000, discount = DEFAULT_DISCOUNT,
+        epsilon = DEFAULT_EPSILON, learningRate = DEFAULT_LEARNING_RATE):
+    """
+    Train a `pacai.student.qlearningAgents.QLearningAgent` for each of numRobots robots
+    for numSteps steps (all the robots step together, see `pacai.core.crawler.CrawlerEnvironment`).
+
+    Returns the learning curve:
+    the average reward (velocity) of the robots over each interval of steps.
+    """
+
+    environment = CrawlerEnvironment(numRobots)
+
+    learnerOpts = {
+        'actionFn': environment.getPossibleActions,
+        'alpha': learningRate,
+        'epsilon': epsilon,
+        'gamma': discount,
+    }
+    learners = [QLearningAgent(0, **learnerOpts) for robot in range(numRobots)]
+
+    for learner in learners:
+        learner.startEpisode()
+
+    curve = array.array('d')
+    totalReward = 0.0
+
+    states = environment.getCurrentStates()
+    for step in range(1, numSteps + 1):
+        actions = [learner.getAction(state) for (learner, state) in zip(learners, states)]
+        nextStates, rewards = environment.step(actions)
+
+        for robot in range(numRobots):
+            learners[robot].observeTransition(states[robot], actions[robot], nextStates[robot],
+                    rewards[robot])
+
+        totalReward += sum(rewards)
+        states = nextStates
+
+        if (step % interval == 0):
+            curve.append(totalReward / (interval * numRobots))
+            totalReward = 0.0
+
+    for learner in learners:
+        learner.stopEpisode()
+
+    return curve
 
 def main(argv):
     """
@@ -26,8 +162,28 @@ def main(argv):
     """
 
     initLogging()
-    max_steps = _load_args(argv)
-    sys.exit(run(max_steps = max_steps))
+    opts = parseOptions(argv[1:])
+
+    if (not opts.headless):
+        # Only the GUI needs tkinter.
+        from pacai.ui.crawler.gui import run
+        sys.exit(run(max_steps = opts.maxSteps))
+
+    if (opts.seed is not None):
+        random.seed(opts.seed)
+
+    numSteps = opts.maxSteps
+    if (numSteps is None):
+        numSteps = DEFAULT_HEADLESS_STEPS
+
+    curve = runHeadless(numSteps, opts.robots, opts.interval, opts.discount, opts.epsilon,
+            opts.learningRate)
+
+    for point in range(len(curve)):
+        steps = (point + 1) * opts.interval
+        logging.info('Steps %d: average velocity %.3f' % (steps, curve[point]))
+
+    return curve
 
 if __name__ == '__main__':
     main(sys.argv)
@@ -1,21 +1,35 @@
 import argparse
+import array
 import logging
 import os
 import random
 import sys
 import textwrap
 
+from pacai.agents.learning.policy import PolicyIterationAgent
 from pacai.agents.learning.reinforcement import ReinforcementAgent
 from pacai.core.environment import Environment
 from pacai.core.mdp import MarkovDecisionProcess
 from pacai.student.qlearningAgents import QLearningAgent
+from pacai.student.valueIterationAgent import SYNCHRONOUS
+from pacai.student.valueIterationAgent import VALUE_ITERATION_MODES
 from pacai.student.valueIterationAgent import ValueIterationAgent
 from pacai.ui.gridworld.text import TextGridworldDisplay
 from pacai.ui.gridworld.utils import wait_for_keys
+from pacai.util import parallel
 from pacai.util.logs import initLogging
 from pacai.util.logs import updateLoggingLevel
 
 class Gridworld(MarkovDecisionProcess):
+    """
+    A grid based MDP.
+
+    The states, actions, transitions, and rewards of every cell are built once
+    (the first time they are needed) and then served from tables.
+    The tables are rebuilt after the noise or living reward changes.
+    The grid itself should not be changed after the MDP is made.
+    """
+
     def __init__(self, grid):
         # layout
         if (isinstance(grid, list)):
@@ -27,6 +41,13 @@ class Gridworld(MarkovDecisionProcess):
         self.livingReward = 0.0
         self.noise = 0.2
 
+        # The cached model (see Gridworld._buildModel).
+        self._states = None
+        self._startState = None
+        self._actions = None
+        self._transitions = None
+        self._rewards = None
+
     def setLivingReward(self, reward):
         """
         The (negative) reward for exiting "normal" states.
@@ -37,6 +58,7 @@ class Gridworld(MarkovDecisionProcess):
         """
 
         self.livingReward = reward
+        self._clearModel()
 
     def setNoise(self, noise):
         """
@@ -44,6 +66,7 @@ class Gridworld(MarkovDecisionProcess):
         """
 
         self.noise = noise
+        self._clearModel()
 
     def getPossibleActions(self, state):
         """
@@ -54,29 +77,21 @@ class Gridworld(MarkovDecisionProcess):
         state under the special action "done".
         """
 
-        if state == self.grid.terminalState:
-            return ()
+        self._buildModel()
 
-        x, y = state
-        if isinstance(self.grid[x][y], int):
-            return ('exit', )
+        actions = self._actions.get(state)
+        if (actions is None):
+            actions = self._computePossibleActions(state)
 
-        return ('north', 'west', 'south', 'east')
+        return actions
 
     def getStates(self):
         """
         Return list of all states.
         """
 
-        # The true terminal state.
-        states = [self.grid.terminalState]
-        for x in range(self.grid.width):
-            for y in range(self.grid.height):
-                if self.grid[x][y] != '#':
-                    state = (x, y)
-                    states.append(state)
-
-        return states
+        self._buildModel()
+        return self._states
 
     def getReward(self, state, action, nextState):
         """
@@ -87,23 +102,21 @@ class Gridworld(MarkovDecisionProcess):
         less use this convention).
         """
 
-        if state == self.grid.terminalState:
-            return 0.0
+        self._buildModel()
 
-        x, y = state
-        cell = self.grid[x][y]
-        if isinstance(cell, int) or isinstance(cell, float):
-            return cell
+        reward = self._rewards.get(state)
+        if (reward is None):
+            reward = self._computeReward(state)
 
-        return self.livingReward
+        return reward
 
     def getStartState(self):
-        for x in range(self.grid.width):
-            for y in range(self.grid.height):
-                if self.grid[x][y] == 'S':
-                    return (x, y)
+        self._buildModel()
 
-        raise Exception('Grid has no start state')
+        if (self._startState is None):
+            raise Exception('Grid has no start state')
+
+        return self._startState
 
     def isTerminal(self, state):
         """
@@ -124,7 +137,83 @@ class Gridworld(MarkovDecisionProcess):
         with their transition probabilities.
         """
 
-        if action not in self.getPossibleActions(state):
+        self._buildModel()
+
+        transitions = self._transitions.get((state, action))
+        if (transitions is None):
+            transitions = self._computeTransitionStatesAndProbs(state, action)
+
+        return transitions
+
+    def _buildModel(self):
+        """
+        Build the tables of states, actions, transitions, and rewards (if they are not built).
+        Transitions are shared tuples, so they should not be modified.
+        """
+
+        if (self._transitions is not None):
+            return
+
+        states = [self.grid.terminalState]
+        startState = None
+        actions = {self.grid.terminalState: ()}
+        transitions = {}
+        rewards = {self.grid.terminalState: 0.0}
+
+        for x in range(self.grid.width):
+            for y in range(self.grid.height):
+                state = (x, y)
+
+                if (self.grid[x][y] == 'S' and startState is None):
+                    startState = state
+
+                if (self.grid[x][y] == '#'):
+                    continue
+
+                states.append(state)
+                actions[state] = self._computePossibleActions(state)
+                rewards[state] = self._computeReward(state)
+
+                for action in actions[state]:
+                    successors = self._computeTransitionStatesAndProbs(state, action)
+                    transitions[(state, action)] = tuple(successors)
+
+        self._states = tuple(states)
+        self._startState = startState
+        self._actions = actions
+        self._transitions = transitions
+        self._rewards = rewards
+
+    def _clearModel(self):
+        self._states = None
+        self._startState = None
+        self._actions = None
+        self._transitions = None
+        self._rewards = None
+
+    def _computePossibleActions(self, state):
+        if state == self.grid.terminalState:
+            return ()
+
+        x, y = state
+        if isinstance(self.grid[x][y], int):
+            return ('exit', )
+
+        return ('north', 'west', 'south', 'east')
+
+    def _computeReward(self, state):
+        if state == self.grid.terminalState:
+            return 0.0
+
+        x, y = state
+        cell = self.grid[x][y]
+        if isinstance(cell, int) or isinstance(cell, float):
+            return cell
+
+        return self.livingReward
+
+    def _computeTransitionStatesAndProbs(self, state, action):
+        if action not in self._computePossibleActions(state):
             raise Exception('Illegal action!')
 
         if self.isTerminal(state):
@@ -220,6 +309,30 @@ class GridworldEnvironment(Environment):
     def reset(self):
         self.state = self.gridWorld.getStartState()
 
+class RandomMDPAgent(object):
+    """
+    An agent that acts randomly in an MDP (and has no values).
+    """
+
+    def __init__(self, mdp):
+        self.mdp = mdp
+
+    def getAction(self, state):
+        return random.choice(self.mdp.getPossibleActions(state))
+
+    def getPolicy(self, state):
+        "NOTE: 'random' is a special policy value; don't use it in your code."
+        return 'random'
+
+    def getQValue(self, state, action):
+        return 0.0
+
+    def getValue(self, state):
+        return 0.0
+
+    def update(self, state, action, nextState, reward):
+        pass
+
 class Grid(object):
     """
     A 2-dimensional array of immutables backed by a list of lists.
@@ -385,7 +498,8 @@ def parseOptions(argv):
 
     parser.add_argument('-a', '--agent', dest = 'agent',
             action = 'store', type = str, default = 'random',
-            help = 'agent type (options are \'random\', \'value\' and \'q\', default %(default)s)')
+            help = 'agent type (options are \'random\', \'value\', \'policy\' and \'q\', '
+                + 'default %(default)s)')
 
     parser.add_argument('-d', '--debug', dest = 'debug',
             action = 'store_true', default = False,
@@ -401,7 +515,12 @@ def parseOptions(argv):
 
     parser.add_argument('-i', '--iterations', dest = 'iters',
             action = 'store', type = int, default = 10,
-            help = 'number of rounds of value iteration (default %(default)s)')
+            help = 'number of rounds of value (or policy) iteration (default %(default)s)')
+
+    parser.add_argument('-j', '--jobs', dest = 'jobs',
+            action = 'store', type = int, default = 1,
+            help = 'run the independent agents of --headless across this many processes '
+                + '(default %(default)s)')
 
     parser.add_argument('-k', '--episodes', dest = 'episodes',
             action = 'store', type = int, default = 1,
@@ -439,6 +558,11 @@ def parseOptions(argv):
             action = 'store', type = float, default = 0.9,
             help = 'discount on future (default %(default)s)')
 
+    parser.add_argument('--headless', dest = 'headless',
+            action = 'store_true', default = False,
+            help = 'run the episodes with no display or per step logging, '
+                + 'and log the average return (default %(default)s)')
+
     parser.add_argument('--manual', dest = 'manual',
             action = 'store_true', default = False,
             help = 'manually control agent (default %(default)s)')
@@ -447,10 +571,28 @@ def parseOptions(argv):
             action = 'store_true', default = False,
             help = 'generate no graphics (default: %(default)s)')
 
+    parser.add_argument('--runs', dest = 'runs',
+            action = 'store', type = int, default = 1,
+            help = 'number of independent agents to run with --headless (default %(default)s)')
+
+    parser.add_argument('--seed', dest = 'seed',
+            action = 'store', type = int, default = None,
+            help = 'seed for the independent agents of --headless (default: random)')
+
     parser.add_argument('--text-graphics', dest = 'textGraphics',
             action = 'store_true', default = False,
             help = 'display output as text only (default: %(default)s)')
 
+    parser.add_argument('--tolerance', dest = 'tolerance',
+            action = 'store', type = float, default = 0.0,
+            help = 'stop value iteration early once no value changes by more than this '
+                + '(default %(default)s)')
+
+    parser.add_argument('--value-mode', dest = 'valueMode',
+            action = 'store', type = str, choices = VALUE_ITERATION_MODES, default = SYNCHRONOUS,
+            help = 'how value iteration updates states, for prioritized sweeping the number of '
+                + 'iterations is the number of single state updates (default %(default)s)')
+
     parser.add_argument('--window-size', dest = 'gridSize',
             action = 'store', type = int, default = 150,
             help = 'request a window width of X pixels *per grid cell* (default %(default)s)')
@@ -469,6 +611,15 @@ def parseOptions(argv):
     elif options.debug:
         updateLoggingLevel(logging.DEBUG)
 
+    if (options.jobs < 1):
+        raise ValueError('The number of jobs must be positive, got %d.' % (options.jobs))
+
+    if (options.headless and options.manual):
+        raise ValueError('Manual control (--manual) cannot be used with --headless.')
+
+    if ((options.runs > 1 or options.jobs > 1) and not options.headless):
+        raise ValueError('Running independent agents (--runs, --jobs) requires --headless.')
+
     if options.manual and options.agent != 'q':
         logging.info('Disabling Agents in Manual Mode.')
         options.agent = None
@@ -496,9 +647,10 @@ def main(argv):
     # GET THE GRIDWORLD
     ###########################
 
-    mdp = _getGridWorld(opts.grid)
-    mdp.setLivingReward(opts.livingReward)
-    mdp.setNoise(opts.noise)
+    if (opts.headless):
+        return _runHeadless(opts)
+
+    mdp = _createGridWorld(opts)
     env = GridworldEnvironment(mdp)
 
     ###########################
@@ -516,43 +668,7 @@ def main(argv):
     # GET THE AGENT
     ###########################
 
-    a = None
-    if (opts.agent == 'value'):
-        a = ValueIterationAgent(0, mdp, opts.discount, opts.iters)
-    elif (opts.agent == 'q'):
-        qLearnOpts = {
-            'gamma': opts.discount,
-            'alpha': opts.learningRate,
-            'epsilon': opts.epsilon,
-            'actionFn': lambda state: mdp.getPossibleActions(state),
-        }
-        a = QLearningAgent(0, **qLearnOpts)
-    elif (opts.agent == 'random'):
-        # No reason to use the random agent without episodes.
-        if (opts.episodes == 0):
-            opts.episodes = 10
-
-        class RandomMDPAgent:
-            def getAction(self, state):
-                return random.choice(mdp.getPossibleActions(state))
-
-            def getValue(self, state):
-                return 0.0
-
-            def getQValue(self, state, action):
-                return 0.0
-
-            def getPolicy(self, state):
-                "NOTE: 'random' is a special policy value; don't use it in your code."
-                return 'random'
-
-            def update(self, state, action, nextState, reward):
-                pass
-
-        a = RandomMDPAgent()
-    else:
-        if (not opts.manual):
-            raise 'Unknown agent type: ' + opts.agent
+    a, numEpisodes = _createAgent(opts, mdp)
 
     ###########################
     # RUN EPISODES
@@ -561,14 +677,17 @@ def main(argv):
     # Display q/v values before simulation of episodes.
     if (not opts.manual and opts.agent == 'value'):
         if (opts.valueSteps):
-            for i in range(opts.iters):
-                tempAgent = ValueIterationAgent(0, mdp, opts.discount, i)
+            for i in range(a.numIterations):
+                tempAgent = ValueIterationAgent(0, mdp, opts.discount, i, opts.tolerance,
+                        opts.valueMode)
                 display.displayValues(tempAgent, message = 'VALUES AFTER ' + str(i) + ' ITERATIONS')
                 display.pause()
 
-        display.displayValues(a, message = 'VALUES AFTER ' + str(opts.iters) + ' ITERATIONS')
+    if (not opts.manual and opts.agent in ('value', 'policy')):
+        display.displayValues(a, message = 'VALUES AFTER ' + str(a.numIterations) + ' ITERATIONS')
         display.pause()
-        display.displayQValues(a, message = 'Q-VALUES AFTER ' + str(opts.iters) + ' ITERATIONS')
+        display.displayQValues(a, message = 'Q-VALUES AFTER ' + str(a.numIterations)
+                + ' ITERATIONS')
         display.pause()
 
     # Figure out what to display each time step (if anything).
@@ -579,7 +698,7 @@ def main(argv):
         else:
             if (opts.agent == 'random'):
                 displayCallback = lambda state: display.displayValues(a, state, 'CURRENT VALUES')
-            elif (opts.agent == 'value'):
+            elif (opts.agent in ('value', 'policy')):
                 displayCallback = lambda state: display.displayValues(a, state, 'CURRENT VALUES')
             elif (opts.agent == 'q'):
                 displayCallback = lambda state: display.displayQValues(a, state, 'CURRENT Q-VALUES')
@@ -600,24 +719,129 @@ def main(argv):
         decisionCallback = a.getAction
 
     # Run episodes.
-    if (opts.episodes > 0):
-        logging.debug('RUNNING ' + str(opts.episodes) + ' EPISODES')
+    if (numEpisodes > 0):
+        logging.debug('RUNNING ' + str(numEpisodes) + ' EPISODES')
 
     returns = 0
-    for episode in range(1, opts.episodes + 1):
+    for episode in range(1, numEpisodes + 1):
         returns += runEpisode(a, env, opts.discount, decisionCallback, displayCallback,
                 messageCallback, pauseCallback, episode)
 
-    if (opts.episodes > 0):
-        logging.debug('AVERAGE RETURNS FROM START STATE:' + str((returns + 0.0) / opts.episodes))
+    if (numEpisodes > 0):
+        logging.debug('AVERAGE RETURNS FROM START STATE:' + str((returns + 0.0) / numEpisodes))
 
     # Display post-learning values / q-values.
     if (opts.agent == 'q' and not opts.manual):
-        display.displayQValues(a, message = 'Q-VALUES AFTER ' + str(opts.episodes) + ' EPISODES')
+        display.displayQValues(a, message = 'Q-VALUES AFTER ' + str(numEpisodes) + ' EPISODES')
         display.pause()
-        display.displayValues(a, message = 'VALUES AFTER ' + str(opts.episodes) + ' EPISODES')
+        display.displayValues(a, message = 'VALUES AFTER ' + str(numEpisodes) + ' EPISODES')
         display.pause()
 
+def runEpisodes(agent, environment, discount, numEpisodes):
+    """
+    Run episodes without any display, logging, or pausing (e.g. for batches of experiments).
+    The agent takes the same steps (and learns the same way) as with `runEpisode`.
+    Returns the (discounted) return of each episode.
+    """
+
+    returns = array.array('d')
+
+    isLearning = isinstance(agent, ReinforcementAgent)
+    getAction = agent.getAction
+
+    for episode in range(numEpisodes):
+        episodeReturn = 0.0
+        totalDiscount = 1.0
+        environment.reset()
+
+        if (isLearning):
+            agent.startEpisode()
+
+        state = environment.getCurrentState()
+        while (len(environment.getPossibleActions(state)) > 0):
+            action = getAction(state)
+            if (action is None):
+                raise Exception('Error: Agent returned None action')
+
+            nextState, reward = environment.doAction(action)
+
+            if (isLearning):
+                agent.observeTransition(state, action, nextState, reward)
+
+            episodeReturn += reward * totalDiscount
+            totalDiscount *= discount
+            state = nextState
+
+        returns.append(episodeReturn)
+
+    return returns
+
+def runExperiments(experiments, numJobs = 1, seed = None):
+    """
+    Run headless episodes (see `runEpisodes`) for each experiment.
+    An experiment is a set of options from `parseOptions`
+    (the grid, agent, and episodes to run),
+    and each one gets a new MDP and agent.
+    The experiments are spread across numJobs processes.
+
+    Every experiment gets its own seed (derived from the given seed),
+    so the results do not depend on the number of processes.
+    Returns the returns of each experiment (in order).
+    """
+
+    if (numJobs < 1):
+        raise ValueError('The number of jobs must be positive, got %d.' % (numJobs))
+
+    if (seed is None):
+        seed = random.getrandbits(32)
+
+    tasks = list(zip(experiments, parallel.getSeeds(seed, len(experiments))))
+
+    if (numJobs == 1):
+        return [_runExperimentWorker(task) for task in tasks]
+
+    return parallel.runInPool(_runExperimentWorker, tasks, numJobs)
+
+def _createAgent(opts, mdp):
+    """
+    Make the agent for the given options, or None when the user has control.
+    Returns (agent, the number of episodes to run).
+    """
+
+    agent = None
+    numEpisodes = opts.episodes
+
+    if (opts.agent == 'value'):
+        agent = ValueIterationAgent(0, mdp, opts.discount, opts.iters, opts.tolerance,
+                opts.valueMode)
+    elif (opts.agent == 'policy'):
+        agent = PolicyIterationAgent(0, mdp, opts.discount, opts.iters)
+    elif (opts.agent == 'q'):
+        qLearnOpts = {
+            'gamma': opts.discount,
+            'alpha': opts.learningRate,
+            'epsilon': opts.epsilon,
+            'actionFn': lambda state: mdp.getPossibleActions(state),
+        }
+        agent = QLearningAgent(0, **qLearnOpts)
+    elif (opts.agent == 'random'):
+        # No reason to use the random agent without episodes.
+        if (numEpisodes == 0):
+            numEpisodes = 10
+
+        agent = RandomMDPAgent(mdp)
+    elif (not opts.manual):
+        raise ValueError("Unknown agent type: '%s'." % (opts.agent))
+
+    return agent, numEpisodes
+
+def _createGridWorld(opts):
+    mdp = _getGridWorld(opts.grid)
+    mdp.setLivingReward(opts.livingReward)
+    mdp.setNoise(opts.noise)
+
+    return mdp
+
 def _getGridWorld(name):
     name = name.lower()
 
@@ -639,6 +863,35 @@ def _getGridWorld(name):
 
     return Gridworld(grid)
 
+def _runExperimentWorker(task):
+    """
+    Make a new MDP and agent for an experiment, and run its episodes.
+    """
+
+    opts, seed = task
+    random.seed(seed)
+
+    mdp = _createGridWorld(opts)
+    agent, numEpisodes = _createAgent(opts, mdp)
+
+    return runEpisodes(agent, GridworldEnvironment(mdp), opts.discount, numEpisodes)
+
+def _runHeadless(opts):
+    """
+    Run independent copies of the agent (see `runExperiments`) and log how they did.
+    """
+
+    logging.info('Running %d agents across %d processes.' % (opts.runs, opts.jobs))
+
+    results = runExperiments([opts] * opts.runs, opts.jobs, opts.seed)
+
+    for run, returns in enumerate(results):
+        if (len(returns) > 0):
+            logging.info('Agent %d average return from start state over %d episodes: %f'
+                    % (run, len(returns), sum(returns) / len(returns)))
+
+    return results
+
 BOOK_GRID = [
     [' ', ' ', ' ', +1],
     [' ', '#', ' ', -1],
@@ -9,7 +9,6 @@ Have fun!
 
 import logging
 import os
-import pickle
 import random
 import sys
 
@@ -23,8 +22,14 @@ from pacai.core.distance import manhattan
 from pacai.core.game import Game
 from pacai.core.gamestate import AbstractGameState
 from pacai.core.layout import getLayout
+from pacai.core.replay import MoveRecorder
+from pacai.core.replay import ReplayArchive
+from pacai.core.replay import ReplayPlayer
+from pacai.core.replay import ReplayWriter
+from pacai.core.replay import rescoreGames
 from pacai.ui.pacman.null import PacmanNullView
 from pacai.ui.pacman.text import PacmanTextView
+from pacai.util import parallel
 from pacai.util.logs import initLogging
 from pacai.util.logs import updateLoggingLevel
 from pacai.util.util import nearestPoint
@@ -40,6 +45,23 @@ BOARD_CLEAR_POINTS = 500  # Points for clearning all the food from the board.
 GHOST_POINTS = 200  # Points for eating a ghost.
 LOSE_POINTS = -500  # Points for getting eatten.
 
+# The parts of a game that are sent back from a worker process after playing it.
+GAME_RESULT_FIELDS = ['state', 'moveHistory', 'numMoves', 'gameOver', 'agentCrashed',
+        'agentTimeout', 'totalAgentTimes', 'totalAgentTimeWarnings', 'recorder']
+
+DEFAULT_REPLAY_PATH = 'pacman.replay'
+
+# The methods an agent needs for its training games to be played in parallel.
+TRAINING_METHODS = ['addEpisodes', 'addParameterChanges', 'clearExperience',
+        'getParameterChanges', 'getParameters', 'setParameters']
+
+# The arguments for playing games in a worker process (set by _initGameWorker).
+_workerGameArgs = None
+
+# A training worker's copy of Pacman's parameters: (the number of rounds merged in, parameters).
+# Set by _trainGamesWorker.
+_workerParameters = None
+
 class PacmanGameState(AbstractGameState):
     """
     A game state specific to pacman.
@@ -118,6 +140,7 @@ class PacmanGameState(AbstractGameState):
 
         return self._agentStates[PACMAN_AGENT_INDEX]
 
+    # Override
     def _applySuccessorAction(self, agentIndex, action):
         """
         Apply the action to the context state (self).
@@ -144,6 +167,14 @@ class PacmanGameState(AbstractGameState):
 
         self._hash = None
 
+    # Override
+    def _getAffectedAgents(self, agentIndex):
+        # Pacman can scare or eat any ghost, but a ghost only ever changes itself.
+        if (agentIndex == PACMAN_AGENT_INDEX):
+            return range(self.getNumAgents())
+
+        return (agentIndex,)
+
 class ClassicGameRules(object):
     """
     These game rules manage the control flow of a game, deciding when
@@ -217,8 +248,8 @@ class PacmanRules:
         """
 
         agentState = state.getPacmanState()
-        return Actions.getPossibleActions(agentState.getPosition(), agentState.getDirection(),
-                state.getWalls())
+        return list(state.getInitialLayout().getLegalActions(agentState.getPosition(),
+                agentState.getDirection()))
 
     @staticmethod
     def applyAction(state, action):
@@ -278,17 +309,17 @@ class GhostRules:
         """
 
         agentState = state.getGhostState(ghostIndex)
-        possibleActions = Actions.getPossibleActions(agentState.getPosition(),
-                agentState.getDirection(), state.getWalls())
+        possibleActions = state.getInitialLayout().getLegalActions(agentState.getPosition(),
+                agentState.getDirection())
         reverse = Actions.reverseDirection(agentState.getDirection())
 
-        if (Directions.STOP in possibleActions):
-            possibleActions.remove(Directions.STOP)
+        # The possible actions are shared, so build a new list instead of removing from them.
+        legalActions = [action for action in possibleActions if (action != Directions.STOP)]
 
-        if (reverse in possibleActions and len(possibleActions) > 1):
-            possibleActions.remove(reverse)
+        if (reverse in legalActions and len(legalActions) > 1):
+            legalActions.remove(reverse)
 
-        return possibleActions
+        return legalActions
 
     @staticmethod
     def applyAction(state, action, ghostIndex):
@@ -405,16 +436,34 @@ def readCommand(argv):
             action = 'store', type = str, default = 'WASDKeyboardAgent',
             help = 'use the specified pacmanAgent module for pacman (default: %(default)s)')
 
+    parser.add_argument('-j', '--jobs', dest = 'jobs',
+            action = 'store', type = int, default = 1,
+            help = 'play non-training games across this many processes,'
+                + ' requires --null-graphics (default: %(default)s)')
+
     parser.add_argument('--agent-args', dest = 'agentArgs',
             action = 'store', type = str, default = None,
             help = 'comma separated arguments to be passed to agents (e.g. \'opt1=val1,opt2\')'
                 + '(default: %(default)s)')
 
+    parser.add_argument('--sync-games', dest = 'syncGames',
+            action = 'store', type = int, default = 1,
+            help = 'the number of training games each training process plays '
+                + 'between weight updates (default: %(default)s)')
+
     parser.add_argument('--timeout', dest = 'timeout',
             action = 'store', type = int, default = 30,
             help = 'maximum time limit (seconds) an agent can spend computing per game '
                 + '(default: %(default)s)')
 
+    parser.add_argument('--training-jobs', dest = 'trainingJobs',
+            action = 'store', type = int, default = 1,
+            help = 'play training games across this many processes, '
+                + 'the agent must support parallel training '
+                + '(like PacmanQAgent or ApproximateQAgent), '
+                + 'each round only sends the (averaged) changes to its parameters, '
+                + 'and these games are not recorded (default: %(default)s)')
+
     options, otherjunk = parser.parse_known_args(argv)
     args = dict()
 
@@ -430,6 +479,20 @@ def readCommand(argv):
     elif options.debug:
         updateLoggingLevel(logging.DEBUG)
 
+    if (options.jobs < 1):
+        raise ValueError('The number of jobs must be positive, got %d.' % (options.jobs))
+
+    if (options.trainingJobs < 1):
+        raise ValueError('The number of training jobs must be positive, got %d.'
+                % (options.trainingJobs))
+
+    if (options.syncGames < 1):
+        raise ValueError('The number of games between syncs must be positive, got %d.'
+                % (options.syncGames))
+
+    if (options.jobs > 1 and not options.nullGraphics):
+        raise ValueError('Playing games in parallel (--jobs) requires --null-graphics.')
+
     # If seed value is not entered generate a random seed value.
     seed = options.seed
     if seed is None:
@@ -480,15 +543,29 @@ def readCommand(argv):
 
     args['catchExceptions'] = options.catchExceptions
     args['gameToReplay'] = options.replay
+    args['jobs'] = options.jobs
+    args['replayIndex'] = options.replayIndex
+    args['replaySeek'] = options.replaySeek
+    args['rescore'] = options.rescore
     args['ghosts'] = [BaseAgent.loadAgent(options.ghost, i + 1) for i in range(options.numGhosts)]
     args['numGames'] = options.numGames
     args['pacman'] = BaseAgent.loadAgent(options.pacman, PACMAN_AGENT_INDEX, agentOpts)
     args['record'] = options.record
+    args['seed'] = seed
+    args['syncGames'] = options.syncGames
     args['timeout'] = options.timeout
+    args['trainingJobs'] = options.trainingJobs
 
     return args
 
-def replayGame(layout, actions, display):
+def replayGame(layout, actions, display, start = 0, keyframes = None):
+    """
+    Show a recorded game, starting after the given number of moves
+    (negative values count back from the end).
+    Any saved keyframes (see `pacai.core.replay.Replay.getKeyframes`) are used to seek.
+    Returns the `pacai.core.replay.ReplayPlayer` that played the game.
+    """
+
     rules = ClassicGameRules()
 
     agents = []
@@ -496,13 +573,12 @@ def replayGame(layout, actions, display):
     agents += [RandomGhost(i + 1) for i in range(layout.getNumGhosts())]
 
     game = rules.newGame(layout, agents[PACMAN_AGENT_INDEX], agents[1:], display)
-    state = game.state
-    display.initialize(state)
 
-    for action in actions:
-        # Execute the action
-        state = state.generateSuccessor(*action)
+    player = ReplayPlayer(game.state, actions, snapshots = keyframes)
+    states = player.iterStates(start)
+    display.initialize(next(states))
 
+    for state in states:
         # Change the display
         display.update(state)
 
@@ -511,51 +587,292 @@ def replayGame(layout, actions, display):
 
     display.finish()
 
+    return player
+
 def runGames(layout, pacman, ghosts, display, numGames, record = None, numTraining = 0,
-        catchExceptions = False, timeout = 30, **kwargs):
+        catchExceptions = False, timeout = 30, jobs = 1, seed = None, trainingJobs = 1,
+        syncGames = 1, **kwargs):
+    """
+    Play numGames games, the first numTraining of which are training games.
+
+    If jobs is more than one, then the non-training games are played across a pool of processes
+    (training games change the agents, so they are played in this process).
+    Either way, each of these games is seeded with a seed derived from the master seed,
+    so the results do not depend on the number of jobs
+    (as long as the agents do not carry anything over from one game to the next).
+
+    If trainingJobs is more than one, then the training games are instead played
+    across a pool of processes (see `_runParallelTraining`).
+    """
+
     rules = ClassicGameRules(timeout)
     games = []
 
+    numSequentialGames = numGames
+    if (jobs > 1):
+        numSequentialGames = min(numGames, numTraining)
+
+    if (seed is None):
+        seed = random.getrandbits(32)
+
+    # The seed of each non-training game (no matter which process plays it).
+    gameSeeds = parallel.getSeeds(seed, max(0, numGames - numTraining))
+
     nullView = None
     if (numTraining > 0):
         logging.info('Playing %d training games.' % numTraining)
         nullView = PacmanNullView()
 
-    for i in range(numGames):
-        isTraining = (i < numTraining)
+    recorder = None
+    if (record):
+        path = DEFAULT_REPLAY_PATH
+        if (isinstance(record, str)):
+            path = record
 
-        if (isTraining):
-            # Suppress graphics for training.
-            gameDisplay = nullView
-        else:
-            gameDisplay = display
+        recorder = ReplayWriter(path)
 
-        game = rules.newGame(layout, pacman, ghosts, gameDisplay, catchExceptions)
-        game.run()
+    firstGame = 0
+    if (trainingJobs > 1 and numTraining > 0):
+        _runParallelTraining(rules, layout, pacman, ghosts, nullView,
+                min(numGames, numTraining), catchExceptions, trainingJobs, syncGames, seed)
+        firstGame = min(numGames, numTraining)
+
+    try:
+        for i in range(firstGame, numSequentialGames):
+            isTraining = (i < numTraining)
+
+            if (isTraining):
+                # Suppress graphics for training.
+                gameDisplay = nullView
+            else:
+                gameDisplay = display
+                random.seed(gameSeeds[i - numTraining])
+
+            game = rules.newGame(layout, pacman, ghosts, gameDisplay, catchExceptions)
 
-        if (not isTraining):
-            games.append(game)
+            if (recorder is not None):
+                recorder.startGame(layout)
+                game.recorder = recorder
 
-        if (record):
-            path = 'pacman.replay'
-            if (isinstance(record, str)):
-                path = record
+            game.run()
 
-            components = {'layout': layout, 'actions': game.moveHistory}
-            with open(path, 'wb') as file:
-                pickle.dump(components, file)
+            if (recorder is not None):
+                recorder.endGame()
+
+            if (not isTraining):
+                games.append(game)
+
+        if (numGames > numSequentialGames):
+            parallelGames = _runParallelGames(rules, layout, pacman, ghosts, display,
+                    gameSeeds[numSequentialGames - numTraining:], catchExceptions, jobs)
+            games += parallelGames
+
+            if (recorder is not None):
+                for game in parallelGames:
+                    recorder.writeGame(layout, game.recorder.getMoves(),
+                            crash = game.recorder.getCrash())
+    finally:
+        # Closing the recorder also ends a game that crashed.
+        if (recorder is not None):
+            recorder.close()
+            logging.info("Games recorded to: '%s'." % (recorder.getPath()))
 
     if ((numGames - numTraining) > 0):
-        scores = [game.state.getScore() for game in games]
-        wins = [game.state.isWin() for game in games]
-        winRate = wins.count(True) / float(len(wins))
-        logging.info('Average Score: %s', sum(scores) / float(len(scores)))
-        logging.info('Scores:        %s', ', '.join([str(score) for score in scores]))
-        logging.info('Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), winRate))
-        logging.info('Record:        %s', ', '.join([['Loss', 'Win'][int(w)] for w in wins]))
+        _logResults([game.state for game in games])
+
+    return games
+
+def _initGameWorker(*gameArgs):
+    """
+    Store everything needed to play games in a worker process.
+    """
+
+    global _workerGameArgs, _workerParameters
+    _workerGameArgs = gameArgs
+
+    # A forked worker may have inherited parameters from an earlier pool.
+    _workerParameters = None
+
+def _logResults(finalStates):
+    scores = [state.getScore() for state in finalStates]
+    wins = [state.isWin() for state in finalStates]
+    winRate = wins.count(True) / float(len(wins))
+    logging.info('Average Score: %s', sum(scores) / float(len(scores)))
+    logging.info('Scores:        %s', ', '.join([str(score) for score in scores]))
+    logging.info('Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), winRate))
+    logging.info('Record:        %s', ', '.join([['Loss', 'Win'][int(w)] for w in wins]))
+
+def _mergeParameterChanges(allChanges):
+    """
+    Merge the parameter changes of the workers in a round into a single change.
+    Every worker started from the same parameters, so the changes are averaged (not added up).
+    Otherwise a parameter that J workers all learned would move J times too far.
+    """
+
+    merged = {}
+    for changes in allChanges:
+        for key, change in changes.items():
+            merged[key] = merged.get(key, 0.0) + change
+
+    for key in merged:
+        merged[key] /= len(allChanges)
+
+    return merged
+
+def _playGameWorker(gameSeed):
+    """
+    Play a single game in a worker process and return the results (see GAME_RESULT_FIELDS).
+    """
+
+    rules, layout, pacman, ghosts, display, catchExceptions = _workerGameArgs
+
+    random.seed(gameSeed)
+
+    game = rules.newGame(layout, pacman, ghosts, display, catchExceptions)
+    game.recorder = MoveRecorder()
+    game.run()
+
+    return {field: getattr(game, field) for field in GAME_RESULT_FIELDS}
+
+def _runParallelGames(rules, layout, pacman, ghosts, display, gameSeeds, catchExceptions,
+        jobs):
+    """
+    Play a game for each seed across a pool of processes,
+    and rebuild the finished games (in order).
+    """
+
+    logging.info('Playing %d games across %d processes.' % (len(gameSeeds), jobs))
+
+    gameArgs = (rules, layout, pacman, ghosts, display, catchExceptions)
+    results = parallel.runInPool(_playGameWorker, gameSeeds, jobs,
+            initializer = _initGameWorker, initargs = gameArgs)
+
+    games = []
+    for result in results:
+        game = rules.newGame(layout, pacman, ghosts, display, catchExceptions)
+        for field, value in result.items():
+            setattr(game, field, value)
+
+        games.append(game)
 
     return games
 
+def _runParallelTraining(rules, layout, pacman, ghosts, display, numTraining, catchExceptions,
+        jobs, syncGames, seed):
+    """
+    Play training games across a pool of processes.
+
+    Training happens in rounds.
+    Every round, each worker starts from Pacman's parameters (e.g. weights)
+    and plays syncGames training games with them (learning as it goes).
+    The workers then send back how their parameters changed,
+    and the average of these changes is added to Pacman's parameters before the next round.
+
+    Workers keep their own copy of Pacman's parameters,
+    so instead of the whole parameters (e.g. every Q-value),
+    a task only has the merged changes of the rounds that its worker may not have seen yet.
+    """
+
+    for method in TRAINING_METHODS:
+        if (not hasattr(pacman, method)):
+            raise ValueError("Pacman agent '%s' cannot be trained in parallel."
+                    % (type(pacman).__name__))
+
+    if (seed is None):
+        seed = random.getrandbits(32)
+
+    # Training games get their own seeds (the non-training games use the master seed).
+    gameSeeds = parallel.getSeeds('training %d' % (seed), numTraining)
+
+    logging.info('Playing %d training games across %d processes.' % (numTraining, jobs))
+
+    gameArgs = (rules, layout, pacman, ghosts, display, catchExceptions)
+    with parallel.createPool(jobs, initializer = _initGameWorker, initargs = gameArgs) as pool:
+        numPlayed = 0
+        scores = []
+
+        # The merged changes of each round since firstRound (that some worker has not seen).
+        firstRound = 0
+        roundChanges = []
+
+        # {worker process id: the number of rounds the worker has merged in}.
+        workerRounds = {}
+
+        while (numPlayed < numTraining):
+            tasks = []
+            for worker in range(jobs):
+                roundSeeds = gameSeeds[numPlayed:numPlayed + syncGames]
+                if (len(roundSeeds) == 0):
+                    break
+
+                tasks.append((firstRound, roundChanges, pacman.episodesSoFar + numPlayed,
+                        roundSeeds))
+                numPlayed += len(roundSeeds)
+
+            results = pool.map(_trainGamesWorker, tasks, chunksize = 1)
+
+            for workerId, changes, roundScores in results:
+                workerRounds[workerId] = firstRound + len(roundChanges)
+                scores += roundScores
+
+            merged = _mergeParameterChanges([result[1] for result in results])
+            pacman.addParameterChanges(merged)
+            roundChanges.append(merged)
+
+            # Forget the rounds that every worker has seen.
+            if (len(workerRounds) == jobs):
+                seenRounds = min(workerRounds.values())
+                roundChanges = roundChanges[seenRounds - firstRound:]
+                firstRound = seenRounds
+
+        pacman.addEpisodes(numPlayed)
+
+    logging.info('Average Training Score: %s', sum(scores) / float(len(scores)))
+
+def _trainGamesWorker(task):
+    """
+    Play training games in a worker process,
+    starting from Pacman's parameters (after merging in the rounds it has not seen yet)
+    and the given episode count.
+    Workers are reused across rounds, so anything left over from earlier rounds
+    (e.g. experiences to replay) is forgotten first.
+    Returns this worker's id, how the parameters changed, and the score of each game.
+    """
+
+    global _workerParameters
+
+    rules, layout, pacman, ghosts, display, catchExceptions = _workerGameArgs
+    firstRound, roundChanges, episodesSoFar, gameSeeds = task
+
+    # Workers start with the parameters Pacman had when the pool was made.
+    if (_workerParameters is None):
+        _workerParameters = (0, pacman.getParameters())
+
+    numRounds, parameters = _workerParameters
+    if (numRounds < firstRound):
+        raise ValueError('Training worker is missing rounds %d to %d.' % (numRounds, firstRound))
+
+    for changes in roundChanges[numRounds - firstRound:]:
+        for key, change in changes.items():
+            parameters[key] = parameters.get(key, 0.0) + change
+
+    _workerParameters = (firstRound + len(roundChanges), parameters)
+
+    pacman.clearExperience()
+    pacman.setParameters(parameters)
+    pacman.episodesSoFar = episodesSoFar
+
+    scores = []
+    for gameSeed in gameSeeds:
+        random.seed(gameSeed)
+
+        game = rules.newGame(layout, pacman, ghosts, display, catchExceptions)
+        game.run()
+
+        scores.append(game.state.getScore())
+
+    return os.getpid(), pacman.getParameterChanges(parameters), scores
+
 def main(argv):
     """
     Entry point for a pacman game.
@@ -569,14 +886,24 @@ def main(argv):
 
     # Special case: recorded games don't use the runGames method.
     if (args['gameToReplay'] is not None):
-        logging.info('Replaying recorded game %s.' % args['gameToReplay'])
+        archive = ReplayArchive(args['gameToReplay'])
+
+        if (args['rescore']):
+            logging.info('Rescoring recorded games %s.' % args['gameToReplay'])
 
-        recorded = None
-        with open(args['gameToReplay'], 'rb') as file:
-            recorded = pickle.load(file)
+            finalStates = rescoreGames(archive,
+                    lambda recorded: PacmanGameState(recorded.getLayout()))
+            if (len(finalStates) > 0):
+                _logResults(finalStates)
+
+            return finalStates
+
+        logging.info('Replaying recorded game %s.' % args['gameToReplay'])
 
-        recorded['display'] = args['display']
-        replayGame(**recorded)
+        recorded = archive.getGame(args['replayIndex'])
+        player = replayGame(recorded.getLayout(), recorded.getActions(), args['display'],
+                args['replaySeek'], recorded.getKeyframes())
+        archive.saveKeyframes(args['replayIndex'], player)
 
         return
 
@@ -0,0 +1,308 @@
+"""
+A round-robin tournament between capture teams.
+
+Every ordered pairing of teams (so each team plays both red and blue)
+plays on every layout with a number of different seeds.
+Games are spread across a pool of processes,
+and the results are aggregated into standings with win rates and Elo ratings.
+"""
+
+import csv
+import logging
+import os
+import random
+import sys
+
+from pacai.bin import capture
+from pacai.bin.arguments import getParser
+from pacai.ui.capture.null import CaptureNullView
+from pacai.util import parallel
+from pacai.util.logs import initLogging
+from pacai.util.logs import updateLoggingLevel
+
+RED_WIN = 'Red'
+BLUE_WIN = 'Blue'
+TIE = 'Tie'
+
+DEFAULT_ELO = 1500
+ELO_K_FACTOR = 32
+
+STANDINGS_FIELDS = ['team', 'elo', 'games', 'wins', 'losses', 'ties', 'winRate']
+
+def computeStandings(results, teams = None):
+    """
+    Aggregate game results (as returned by `runTournament`) into standings.
+    Returns a list of dicts (with the keys in STANDINGS_FIELDS), best team first.
+
+    Elo ratings are updated after every game, in the order of the results.
+    Since results are always in schedule order, the ratings are deterministic.
+    """
+
+    if (teams is None):
+        teams = []
+        for result in results:
+            for team in (result['red'], result['blue']):
+                if (team not in teams):
+                    teams.append(team)
+
+    standings = {team: {
+        'team': team,
+        'elo': float(DEFAULT_ELO),
+        'games': 0,
+        'wins': 0,
+        'losses': 0,
+        'ties': 0,
+    } for team in teams}
+
+    for result in results:
+        red = standings[result['red']]
+        blue = standings[result['blue']]
+
+        red['games'] += 1
+        blue['games'] += 1
+
+        if (result['winner'] == RED_WIN):
+            red['wins'] += 1
+            blue['losses'] += 1
+            redScore = 1.0
+        elif (result['winner'] == BLUE_WIN):
+            blue['wins'] += 1
+            red['losses'] += 1
+            redScore = 0.0
+        else:
+            red['ties'] += 1
+            blue['ties'] += 1
+            redScore = 0.5
+
+        expectedRedScore = 1.0 / (1.0 + 10.0 ** ((blue['elo'] - red['elo']) / 400.0))
+        change = ELO_K_FACTOR * (redScore - expectedRedScore)
+
+        red['elo'] += change
+        blue['elo'] -= change
+
+    for team in standings.values():
+        team['winRate'] = 0.0
+        if (team['games'] > 0):
+            team['winRate'] = team['wins'] / float(team['games'])
+
+    return sorted(standings.values(), key = lambda team: (-team['elo'], team['team']))
+
+def readCommand(argv):
+    """
+    Processes the command used to run a tournament from the command line.
+    """
+
+    description = """
+    DESCRIPTION:
+        This program will run a round-robin tournament between capture teams.
+        Every pairing of teams plays on every layout --num-games times (each with its own seed).
+        Games are always headless and always enforce the capture time limits.
+
+    EXAMPLES:
+        (1) python -m pacai.bin.tournament -t pacai.core.baselineTeam pacai.student.myTeam
+          - Plays the baseline team against pacai.student.myTeam on the default layout.
+        (2) python -m pacai.bin.tournament -t pacai.core.baselineTeam pacai.student.myTeam
+                -l defaultCapture RANDOM1 RANDOM2 --num-games 5 --jobs 8 --output standings.csv
+          - Plays 5 games for each pairing on three layouts across 8 processes,
+            and writes the standings to standings.csv.
+    """
+
+    parser = getParser(description, os.path.basename(__file__))
+
+    parser.add_argument('-j', '--jobs', dest = 'jobs',
+            action = 'store', type = int, default = 1,
+            help = 'play games across this many processes (default: %(default)s)')
+
+    parser.add_argument('-l', '--layouts', dest = 'layouts',
+            action = 'store', type = str, nargs = '+', default = ['defaultCapture'],
+            help = 'play on the specified layouts, RANDOM<seed> can be used for a random '
+                + 'seeded map (i.e. RANDOM23) (default: %(default)s)')
+
+    parser.add_argument('-t', '--teams', dest = 'teams',
+            action = 'store', type = str, nargs = '+', required = True,
+            help = 'the team modules to play (at least two, each listed once)')
+
+    parser.add_argument('--max-moves', dest = 'maxMoves',
+            action = 'store', type = int, default = 1200,
+            help = 'set maximum number of moves in a game (default: %(default)s)')
+
+    parser.add_argument('--output', dest = 'output',
+            action = 'store', type = str, default = None,
+            help = 'write the standings to the specified CSV file (default: %(default)s)')
+
+    options, otherjunk = parser.parse_known_args(argv)
+    args = dict()
+
+    if len(otherjunk) != 0:
+        raise ValueError('Unrecognized options: \'%s\'.' % (str(otherjunk)))
+
+    # Set the logging level.
+    if options.quiet and options.debug:
+        raise ValueError('Logging cannont be set to both debug and quiet.')
+
+    if options.quiet:
+        updateLoggingLevel(logging.WARNING)
+    elif options.debug:
+        updateLoggingLevel(logging.DEBUG)
+
+    # Tournament games are always headless, and their results are only reported as standings.
+    unsupportedOptions = [
+        ('--gif', options.gif),
+        ('--num-training', options.numTraining),
+        ('--record', options.record),
+        ('--replay', options.replay),
+        ('--rescore', options.rescore),
+        ('--text-graphics', options.textGraphics),
+    ]
+
+    for (option, value) in unsupportedOptions:
+        if (value):
+            raise ValueError('%s is not supported in a tournament.' % (option))
+
+    _checkTeams(options.teams)
+
+    if (options.numGames < 1):
+        raise ValueError('The number of games must be positive, got %d.' % (options.numGames))
+
+    # If no seed entry generate a random seed value.
+    seed = options.seed
+    if seed is None:
+        seed = random.randint(0, 2**32)
+    logging.debug('Seed value: ' + str(seed))
+
+    args['jobs'] = options.jobs
+    args['layouts'] = options.layouts
+    args['length'] = options.maxMoves
+    args['numSeeds'] = options.numGames
+    args['output'] = options.output
+    args['seed'] = seed
+    args['teams'] = options.teams
+
+    return args
+
+def runTournament(teams, layouts, numSeeds = 1, length = 1200, jobs = 1, seed = None):
+    """
+    Play every game in the tournament (see `scheduleGames`).
+    Returns a list with the result of each game (in schedule order) as a dict:
+    red, blue, layout, seed, score, winner (RED_WIN, BLUE_WIN, or TIE), crashed, and timeout.
+    """
+
+    schedule = scheduleGames(teams, layouts, numSeeds, seed)
+    logging.info('Playing %d games across %d processes.' % (len(schedule), jobs))
+
+    tasks = [task + (length,) for task in schedule]
+    return parallel.runInPool(_playGameWorker, tasks, jobs)
+
+def scheduleGames(teams, layouts, numSeeds, seed = None):
+    """
+    Get the (red team, blue team, layout, game seed) of every game in the tournament.
+    Every ordered pairing of different teams plays on every layout numSeeds times.
+    Game seeds are derived from the master seed.
+    """
+
+    _checkTeams(teams)
+
+    if (seed is None):
+        seed = random.getrandbits(32)
+
+    games = []
+    for red in teams:
+        for blue in teams:
+            if (red == blue):
+                continue
+
+            for layout in layouts:
+                games += [(red, blue, layout)] * numSeeds
+
+    gameSeeds = parallel.getSeeds(seed, len(games))
+    return [game + (gameSeed,) for (game, gameSeed) in zip(games, gameSeeds)]
+
+def writeStandings(standings, path):
+    with open(path, 'w', newline = '') as file:
+        writer = csv.DictWriter(file, fieldnames = STANDINGS_FIELDS)
+        writer.writeheader()
+
+        for team in standings:
+            writer.writerow(team)
+
+def _checkTeams(teams):
+    duplicates = sorted(set(team for team in teams if (teams.count(team) > 1)))
+    if (len(duplicates) > 0):
+        raise ValueError('Teams can only be listed once, got duplicates: %s.' % (duplicates))
+
+    if (len(teams) < 2):
+        raise ValueError('A tournament needs at least two teams.')
+
+def _logStandings(standings):
+    logging.info('Standings:')
+
+    width = max(len(team['team']) for team in standings)
+    logging.info('    %s  %7s  %5s  %4s  %6s  %4s  %8s' % ('Team'.ljust(width),
+            'Elo', 'Games', 'Wins', 'Losses', 'Ties', 'Win Rate'))
+
+    for team in standings:
+        logging.info('    %s  %7.1f  %5d  %4d  %6d  %4d  %8.2f',
+                team['team'].ljust(width), team['elo'], team['games'], team['wins'],
+                team['losses'], team['ties'], team['winRate'])
+
+def _playGameWorker(task):
+    """
+    Play a single tournament game (with the capture time limits enforced) and return its result.
+    """
+
+    red, blue, layoutName, gameSeed, length = task
+
+    random.seed(gameSeed)
+
+    layout = capture.getCaptureLayout(layoutName)
+    redAgents = capture.loadAgents(True, red, True, {})
+    blueAgents = capture.loadAgents(False, blue, True, {})
+    agents = sum([list(el) for el in zip(redAgents, blueAgents)], [])
+
+    rules = capture.CaptureRules()
+    game = rules.newGame(layout, agents, CaptureNullView(), length, True)
+    game.run()
+
+    score = game.state.getScore()
+
+    winner = TIE
+    if (score > 0):
+        winner = RED_WIN
+    elif (score < 0):
+        winner = BLUE_WIN
+
+    return {
+        'red': red,
+        'blue': blue,
+        'layout': layoutName,
+        'seed': gameSeed,
+        'score': score,
+        'winner': winner,
+        'crashed': game.agentCrashed,
+        'timeout': game.agentTimeout,
+    }
+
+def main(argv):
+    """
+    Entry point for a capture tournament.
+    The args are a blind pass of `sys.argv` with the executable stripped.
+    """
+
+    initLogging()
+
+    args = readCommand(argv)
+
+    results = runTournament(args['teams'], args['layouts'], args['numSeeds'], args['length'],
+            args['jobs'], args['seed'])
+    standings = computeStandings(results, args['teams'])
+
+    _logStandings(standings)
+
+    if (args['output'] is not None):
+        writeStandings(standings, args['output'])
+        logging.info("Standings written to: '%s'." % (args['output']))
+
+    return standings
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
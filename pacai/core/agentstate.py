@@ -1,6 +1,7 @@
 from pacai.core.actions import Actions
 from pacai.core.directions import Directions
 from pacai.util import util
+from pacai.util import zobrist
 
 class AgentState:
     """
@@ -11,11 +12,14 @@ class AgentState:
     Therefore, north is the direction of increasing y, or (0, 1).
     """
 
+    # Agent states are copied for every agent on every successor,
+    # so slots are used to keep them small and fast to copy.
+    __slots__ = ('_start', '_position', '_direction', '_isPacman', '_scaredTimer', '_hash')
+
     def __init__(self, position, direction, isPacman):
         # Save the starting information for later use.
-        self._startPosition = position
-        self._startDirection = direction
-        self._startIsPacman = isPacman
+        # It never changes, so it is shared between all copies.
+        self._start = (position, direction, isPacman)
 
         self._position = position
         self._direction = direction
@@ -23,18 +27,25 @@ class AgentState:
         self._isPacman = isPacman
         self._scaredTimer = 0
 
+        # A Zobrist hash over the fields used in equality.
+        # It is computed on first use, and after that every mutation updates it in place.
+        self._hash = None
+
     def copy(self):
-        state = AgentState(self._startPosition, self._startDirection, self._startIsPacman)
+        # Skip __init__, every field is about to be overwritten anyways.
+        state = object.__new__(AgentState)
 
-        state._isPacman = self._isPacman
+        state._start = self._start
         state._position = self._position
         state._direction = self._direction
+        state._isPacman = self._isPacman
         state._scaredTimer = self._scaredTimer
+        state._hash = self._hash
 
         return state
 
     def decrementScaredTimer(self):
-        self._scaredTimer = max(0, self._scaredTimer - 1)
+        self.setScaredTimer(max(0, self._scaredTimer - 1))
 
     def getDirection(self):
         return self._direction
@@ -68,9 +79,11 @@ class AgentState:
         return (self.isGhost() and self.isScared())
 
     def setIsPacman(self, isPacman):
+        self._swapHashKey('isPacman', self._isPacman, isPacman)
         self._isPacman = isPacman
 
     def setScaredTimer(self, timer):
+        self._swapHashKey('scaredTimer', self._scaredTimer, timer)
         self._scaredTimer = timer
 
     def snapToNearestPoint(self):
@@ -78,17 +91,19 @@ class AgentState:
         Move the agent to the nearest point to its current location.
         """
 
-        self._position = util.nearestPoint(self._position)
+        self._setPosition(util.nearestPoint(self._position))
 
     def respawn(self):
         """
         This agent was killed, respawn it at the start as a pacman.
         """
 
-        self._position = self._startPosition
-        self._direction = self._startDirection
-        self._isPacman = self._startIsPacman
-        self._scaredTimer = 0
+        startPosition, startDirection, startIsPacman = self._start
+
+        self._setPosition(startPosition)
+        self._setDirection(startDirection)
+        self.setIsPacman(startIsPacman)
+        self.setScaredTimer(0)
 
     def updatePosition(self, vector):
         """
@@ -98,12 +113,42 @@ class AgentState:
         x, y = self._position
         dx, dy = vector
 
-        self._position = (x + dx, y + dy)
+        self._setPosition((x + dx, y + dy))
 
         direction = Actions.vectorToDirection(vector)
         if (direction != Directions.STOP):
             # If this is a zero vector, face the same direction as before.
-            self._direction = direction
+            self._setDirection(direction)
+
+    def _computeHash(self):
+        """
+        Compute the hash from scratch.
+        """
+
+        return (zobrist.getKey('position', self._position)
+                ^ zobrist.getKey('direction', self._direction)
+                ^ zobrist.getKey('isPacman', self._isPacman)
+                ^ zobrist.getKey('scaredTimer', self._scaredTimer))
+
+    def _makeUndoRecord(self):
+        return (self._position, self._direction, self._isPacman, self._scaredTimer, self._hash)
+
+    def _setDirection(self, direction):
+        self._swapHashKey('direction', self._direction, direction)
+        self._direction = direction
+
+    def _setPosition(self, position):
+        self._swapHashKey('position', self._position, position)
+        self._position = position
+
+    def _swapHashKey(self, field, oldValue, newValue):
+        if (self._hash is None or oldValue == newValue):
+            return
+
+        self._hash ^= zobrist.getKey(field, oldValue) ^ zobrist.getKey(field, newValue)
+
+    def _undo(self, record):
+        (self._position, self._direction, self._isPacman, self._scaredTimer, self._hash) = record
 
     def __eq__(self, other):
         if (other is None):
@@ -115,7 +160,10 @@ class AgentState:
                 and self._scaredTimer == other._scaredTimer)
 
     def __hash__(self):
-        return util.buildHash(self._position, self._direction, self._isPacman, self._scaredTimer)
+        if (self._hash is None):
+            self._hash = self._computeHash()
+
+        return self._hash
 
     def __str__(self):
         typeString = 'Ghost'
@@ -127,4 +175,4 @@ class AgentState:
             scaredString = '!'
 
         return "%s%s: Position: %s, Direction: %s" % (typeString, scaredString,
-                str(self._position), str(self.direction))
+                str(self._position), str(self._direction))
@@ -0,0 +1,224 @@
+"""
+The crawling robot, without any graphics.
+
+The crawler only ever moves its arm and hand between a fixed set of angles (buckets),
+so how far the robot moves for every state and action is computed once
+(when the environment is made) and then looked up.
+This makes it cheap to step many robots at once (see `CrawlerEnvironment.step`),
+e.g. for benchmarking learners.
+"""
+
+import array
+import math
+
+from pacai.core.environment import Environment
+
+ARM_LENGTH = 60
+HAND_LENGTH = 40
+ROBOT_WIDTH = 80
+ROBOT_HEIGHT = 40
+
+MIN_ARM_ANGLE = -math.pi / 6
+MAX_ARM_ANGLE = math.pi / 6
+MIN_HAND_ANGLE = -(5.0 / 6.0) * math.pi
+MAX_HAND_ANGLE = 0.0
+
+NUM_ARM_STATES = 9
+NUM_HAND_STATES = 13
+
+ACTIONS = ('arm-down', 'arm-up', 'hand-down', 'hand-up')
+
+# The change in (arm bucket, hand bucket) for each action.
+ACTION_DELTAS = {
+    'arm-down': (-1, 0),
+    'arm-up': (1, 0),
+    'hand-down': (0, -1),
+    'hand-up': (0, 1),
+}
+
+class CrawlerEnvironment(Environment):
+    """
+    Any number of independent crawling robots.
+
+    States are (arm bucket, hand bucket) pairs, just like in the GUI
+    (`pacai.ui.crawler.gui.CrawlingRobotEnvironment`),
+    and the reward is how far the robot moved forward.
+    All the robots are advanced together with `CrawlerEnvironment.step`.
+    With a single robot, this can also be used like a `pacai.core.environment.Environment`.
+    """
+
+    def __init__(self, numRobots = 1):
+        if (numRobots < 1):
+            raise ValueError('The number of robots must be positive, got %d.' % (numRobots))
+
+        self.numRobots = numRobots
+
+        self.armBuckets = _getBuckets(MIN_ARM_ANGLE, MAX_ARM_ANGLE, NUM_ARM_STATES)
+        self.handBuckets = _getBuckets(MIN_HAND_ANGLE, MAX_HAND_ANGLE, NUM_HAND_STATES)
+
+        self._buildModel()
+
+        # The index of each robot's state.
+        self._states = array.array('i', [0] * numRobots)
+
+        # How far each robot has moved.
+        self._positions = array.array('d', [0.0] * numRobots)
+
+        self.reset()
+
+    def doAction(self, action):
+        """
+        Move the first robot.
+        Returns (next state, reward).
+        """
+
+        nextStates, rewards = self.step([action] + [None] * (self.numRobots - 1))
+        return nextStates[0], rewards[0]
+
+    def getCurrentState(self):
+        """
+        Get the state of the first robot.
+        """
+
+        return self._stateTuples[self._states[0]]
+
+    def getCurrentStates(self):
+        """
+        Get the state of every robot.
+        """
+
+        stateTuples = self._stateTuples
+        return [stateTuples[index] for index in self._states]
+
+    def getPositions(self):
+        """
+        Get how far each robot has moved since the last reset.
+        """
+
+        return array.array('d', self._positions)
+
+    def getPossibleActions(self, state):
+        return self._actions[self._stateIndexes[state]]
+
+    def reset(self):
+        """
+        Put every robot back at the start (the middle bucket of the arm and hand).
+        """
+
+        startState = self._stateIndexes[(int(NUM_ARM_STATES / 2), int(NUM_HAND_STATES / 2))]
+
+        for robot in range(self.numRobots):
+            self._states[robot] = startState
+            self._positions[robot] = 0.0
+
+    def step(self, actions):
+        """
+        Take an action for every robot (None leaves a robot where it is).
+        Returns (the next state of every robot, the reward of every robot).
+        """
+
+        if (len(actions) != self.numRobots):
+            raise ValueError('Expected %d actions, got %d.' % (self.numRobots, len(actions)))
+
+        states = self._states
+        positions = self._positions
+        stateTuples = self._stateTuples
+        actionIndexes = self._actionIndexes
+        nextStateTable = self._nextStates
+        rewardTable = self._rewards
+        numActions = len(ACTIONS)
+
+        nextStates = []
+        rewards = array.array('d', [0.0] * self.numRobots)
+
+        for robot in range(self.numRobots):
+            action = actions[robot]
+            state = states[robot]
+
+            if (action is not None):
+                row = state * numActions + actionIndexes[action]
+
+                nextState = nextStateTable[row]
+                if (nextState < 0):
+                    raise ValueError("Illegal crawler action '%s' in state %s."
+                            % (action, stateTuples[state]))
+
+                reward = rewardTable[row]
+
+                state = nextState
+                states[robot] = state
+                positions[robot] += reward
+                rewards[robot] = reward
+
+            nextStates.append(stateTuples[state])
+
+        return nextStates, rewards
+
+    def _buildModel(self):
+        """
+        Compute the next state and reward of every state and action.
+        Illegal actions have a next state of -1.
+        """
+
+        self._stateTuples = []
+        self._stateIndexes = {}
+        for arm in range(NUM_ARM_STATES):
+            for hand in range(NUM_HAND_STATES):
+                self._stateIndexes[(arm, hand)] = len(self._stateTuples)
+                self._stateTuples.append((arm, hand))
+
+        self._actionIndexes = {action: index for (index, action) in enumerate(ACTIONS)}
+
+        self._actions = []
+        self._nextStates = array.array('i')
+        self._rewards = array.array('d')
+
+        for (arm, hand) in self._stateTuples:
+            actions = []
+
+            for action in ACTIONS:
+                armDelta, handDelta = ACTION_DELTAS[action]
+                nextArm = arm + armDelta
+                nextHand = hand + handDelta
+
+                if (nextArm < 0 or nextArm >= NUM_ARM_STATES
+                        or nextHand < 0 or nextHand >= NUM_HAND_STATES):
+                    self._nextStates.append(-1)
+                    self._rewards.append(0.0)
+                    continue
+
+                actions.append(action)
+                self._nextStates.append(self._stateIndexes[(nextArm, nextHand)])
+                self._rewards.append(getDisplacement(self.armBuckets[arm], self.handBuckets[hand],
+                        self.armBuckets[nextArm], self.handBuckets[nextHand]))
+
+            self._actions.append(actions)
+
+def getDisplacement(oldArmAngle, oldHandAngle, armAngle, handAngle):
+    """
+    Get how far the robot moves forward when its arm and hand move between the given angles.
+    This is the same geometry as `pacai.ui.crawler.gui.CrawlingRobot.displacement`.
+    """
+
+    xOld, yOld = _getHandPosition(oldArmAngle, oldHandAngle)
+    x, y = _getHandPosition(armAngle, handAngle)
+
+    if (y < 0):
+        if (yOld <= 0):
+            return math.sqrt(xOld * xOld + yOld * yOld) - math.sqrt(x * x + y * y)
+        return (xOld - yOld * (x - xOld) / (y - yOld)) - math.sqrt(x * x + y * y)
+
+    if (yOld >= 0):
+        return 0.0
+
+    return -(x - y * (xOld - x) / (yOld - y)) + math.sqrt(xOld * xOld + yOld * yOld)
+
+def _getBuckets(minAngle, maxAngle, numBuckets):
+    increment = (maxAngle - minAngle) / (numBuckets - 1)
+    return [minAngle + (increment * i) for i in range(numBuckets)]
+
+def _getHandPosition(armAngle, handAngle):
+    x = ARM_LENGTH * math.cos(armAngle) + HAND_LENGTH * math.cos(handAngle) + ROBOT_WIDTH
+    y = ARM_LENGTH * math.sin(armAngle) + HAND_LENGTH * math.sin(handAngle) + ROBOT_HEIGHT
+
+    return x, y
@@ -1,10 +1,23 @@
+import array
+import collections
+import hashlib
+import logging
+import mmap
+import os
+import struct
 import sys
+import tempfile
 
 from pacai.core.distance import manhattan
-from pacai.util import priorityQueue
 
 DEFAULT_DISTANCE = 10000
 
+# The default number of rows of distances kept by `LazyMazeDistances`.
+DEFAULT_MAX_ROWS = 256
+
+# If set, maze distances will be cached on disk in this directory.
+CACHE_DIR_ENV_VAR = 'PACAI_DISTANCE_CACHE_DIR'
+
 class Distancer(object):
     """
     A class for computing and caching the shortest path between any two points in a given maze.
@@ -14,13 +27,25 @@ class Distancer(object):
     distancer = Distancer(gameState.getInitialLayout())
     distancer.getDistance((1, 1), (10, 10))
     ```
+
+    In lazy mode, distances are not computed up front.
+    Instead, the distances from a position are computed the first time that they are needed
+    (see `LazyMazeDistances`), and at most maxRows sets of distances are kept.
     """
 
-    def __init__(self, layout):
+    def __init__(self, layout, lazy = False, maxRows = DEFAULT_MAX_ROWS):
         self._distances = None
+        self._lazy = lazy
+        self._maxRows = maxRows
         self.dc = DistanceCalculator(layout, self)
 
     def getMazeDistances(self):
+        """
+        Compute (or load from the cache) the maze distances for this layout.
+        In lazy mode, this only prepares the distances to be computed on demand.
+        Until this is called, `Distancer.getDistance` will use manhattan distance.
+        """
+
         self.dc.run()
 
     def getDistance(self, pos1, pos2):
@@ -47,12 +72,28 @@ class Distancer(object):
 
         return bestDistance
 
-    def getDistanceOnGrid(self, pos1, pos2):
-        key = (pos1, pos2)
-        if key in self._distances:
-            return self._distances[key]
+    def getDistances(self, pos, positions):
+        """
+        Get the distance from pos to each of the given positions (in the same order).
+        This is much faster than calling `Distancer.getDistance` repeatedly.
+        """
 
-        raise Exception("Position not in grid: " + str(key))
+        if (self._distances is None):
+            return [manhattan(pos, other) for other in positions]
+
+        if (not isInt(pos) or not all(isInt(other) for other in positions)):
+            return [self.getDistance(pos, other) for other in positions]
+
+        try:
+            return self._distances.getDistances(pos, positions)
+        except KeyError as ex:
+            raise Exception("Position not in grid: " + str(ex.args[0]))
+
+    def getDistanceOnGrid(self, pos1, pos2):
+        try:
+            return self._distances.getDistance(pos1, pos2)
+        except KeyError:
+            raise Exception("Position not in grid: " + str((pos1, pos2)))
 
     def isReadyForMazeDistance(self):
         return (self._distances is not None)
@@ -80,77 +121,431 @@ def getGrids1D(x):
 
 distanceMap = {}
 
+# The largest distance that can be stored in each type of distance matrix.
+# It is used as a marker for unreachable pairs of positions.
+SHORT_UNREACHABLE = 0xFFFF
+LONG_UNREACHABLE = 0xFFFFFFFF
+
+class MazeDistances(object):
+    """
+    All-pairs maze distances for a set of walls.
+
+    Every open cell is given an integer id,
+    and distances are stored in a flat (row-major) matrix of unsigned ints,
+    where the distance from cell i to cell j is at index (i * numCells + j).
+    Unreachable pairs have a distance of sys.maxsize.
+    """
+
+    def __init__(self, walls, matrix = None):
+        """
+        If a matrix is supplied (e.g. a previously computed matrix loaded from disk),
+        then it will be used as-is instead of computing the distances.
+        """
+
+        self._cells = walls.asList(False)
+        self._cellIds = {cell: cellId for (cellId, cell) in enumerate(self._cells)}
+
+        numCells = len(self._cells)
+        typecode, self._unreachable = _getMatrixType(numCells)
+
+        self._numCells = numCells
+        self._typecode = typecode
+
+        if (matrix is not None):
+            if (len(matrix) != numCells * numCells):
+                raise ValueError('Distance matrix does not match the walls.')
+
+            self._matrix = matrix
+            return
+
+        self._matrix = array.array(typecode, [self._unreachable]) * (numCells * numCells)
+        self._computeDistances(walls)
+
+    def getCells(self):
+        """
+        Get all the open cells, ordered by their id.
+        """
+
+        return self._cells
+
+    def getDistance(self, pos1, pos2):
+        """
+        Get the distance between two grid positions.
+        Raises a KeyError if either position is not an open cell.
+        """
+
+        distance = self._matrix[self._cellIds[pos1] * self._numCells + self._cellIds[pos2]]
+        if (distance == self._unreachable):
+            return sys.maxsize
+
+        return distance
+
+    def getDistances(self, pos, positions):
+        """
+        Get the distance from pos to each of the given grid positions (in the same order).
+        Raises a KeyError if any position is not an open cell.
+        """
+
+        matrix = self._matrix
+        cellIds = self._cellIds
+        unreachable = self._unreachable
+        rowStart = cellIds[pos] * self._numCells
+
+        distances = [matrix[rowStart + cellIds[other]] for other in positions]
+        if (unreachable in distances):
+            distances = [(sys.maxsize if (distance == unreachable) else distance)
+                    for distance in distances]
+
+        return distances
+
+    def getMatrix(self):
+        """
+        Get the flat distance matrix.
+        The caller should not modify the matrix.
+        """
+
+        return self._matrix
+
+    def getTypecode(self):
+        """
+        Get the array typecode of the distance matrix.
+        """
+
+        return self._typecode
+
+    def _computeDistances(self, walls):
+        """
+        Run a BFS from each open cell.
+        Every move costs the same, so a BFS finds the same distances as UCS
+        without needing a priority queue.
+        """
+
+        neighbors = _buildNeighbors(self._cells, self._cellIds)
+
+        for source in range(self._numCells):
+            _searchFrom(neighbors, source, self._matrix, source * self._numCells,
+                    self._unreachable)
+
+class LazyMazeDistances(object):
+    """
+    Maze distances for a set of walls that are computed one source at a time.
+
+    The first time a source is queried, a single BFS is run from it
+    and the resulting row of distances is cached.
+    Since maze distances are symmetric, a query can also be answered by the row of its target.
+    At most maxRows rows are kept (the least recently used rows are dropped first),
+    use None for no limit.
+
+    This has the same query interface as `MazeDistances`,
+    but almost no startup cost, which is useful on large layouts
+    where only distances from a few sources are ever needed.
+    """
+
+    def __init__(self, walls, maxRows = DEFAULT_MAX_ROWS):
+        if (maxRows is not None and maxRows < 1):
+            raise ValueError('At least one row of distances must be kept, got %d.' % (maxRows))
+
+        self._cells = walls.asList(False)
+        self._cellIds = {cell: cellId for (cellId, cell) in enumerate(self._cells)}
+        self._neighbors = _buildNeighbors(self._cells, self._cellIds)
+
+        self._numCells = len(self._cells)
+        self._typecode, self._unreachable = _getMatrixType(self._numCells)
+
+        self._maxRows = maxRows
+        self._rows = collections.OrderedDict()
+
+    def getCells(self):
+        """
+        Get all the open cells, ordered by their id.
+        """
+
+        return self._cells
+
+    def getDistance(self, pos1, pos2):
+        """
+        Get the distance between two grid positions.
+        Raises a KeyError if either position is not an open cell.
+        """
+
+        id1 = self._cellIds[pos1]
+        id2 = self._cellIds[pos2]
+
+        if (id1 not in self._rows and id2 in self._rows):
+            distance = self._getRow(id2)[id1]
+        else:
+            distance = self._getRow(id1)[id2]
+
+        if (distance == self._unreachable):
+            return sys.maxsize
+
+        return distance
+
+    def getDistances(self, pos, positions):
+        """
+        Get the distance from pos to each of the given grid positions (in the same order).
+        Raises a KeyError if any position is not an open cell.
+        """
+
+        cellIds = self._cellIds
+        unreachable = self._unreachable
+        row = self._getRow(cellIds[pos])
+
+        distances = [row[cellIds[other]] for other in positions]
+        if (unreachable in distances):
+            distances = [(sys.maxsize if (distance == unreachable) else distance)
+                    for distance in distances]
+
+        return distances
+
+    def getNumCachedRows(self):
+        return len(self._rows)
+
+    def _getRow(self, source):
+        """
+        Get the row of distances from a source cell id,
+        running a BFS from the source if the row is not cached.
+        """
+
+        row = self._rows.get(source)
+        if (row is not None):
+            self._rows.move_to_end(source)
+            return row
+
+        row = array.array(self._typecode, [self._unreachable]) * self._numCells
+        _searchFrom(self._neighbors, source, row, 0, self._unreachable)
+
+        self._rows[source] = row
+        if (self._maxRows is not None and len(self._rows) > self._maxRows):
+            self._rows.popitem(last = False)
+
+        return row
+
+def _buildNeighbors(cells, cellIds):
+    """
+    Get the ids of the open neighbors of each cell (ordered by cell id).
+    """
+
+    neighbors = []
+    for (x, y) in cells:
+        cellNeighbors = []
+        for neighbor in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            if (neighbor in cellIds):
+                cellNeighbors.append(cellIds[neighbor])
+
+        neighbors.append(cellNeighbors)
+
+    return neighbors
+
+def _getMatrixType(numCells):
+    """
+    Get the smallest array typecode that can hold every distance (and its unreachable marker).
+    """
+
+    if (numCells < SHORT_UNREACHABLE):
+        return 'H', SHORT_UNREACHABLE
+
+    return 'L', LONG_UNREACHABLE
+
+def _searchFrom(neighbors, source, matrix, rowStart, unreachable):
+    """
+    Run a BFS from a single source,
+    filling in the row of the matrix that starts at rowStart.
+    The row must be initialized to the unreachable marker.
+    """
+
+    matrix[rowStart + source] = 0
+
+    frontier = [source]
+    distance = 0
+
+    while (len(frontier) > 0):
+        distance += 1
+        nextFrontier = []
+
+        for cell in frontier:
+            for neighbor in neighbors[cell]:
+                if (matrix[rowStart + neighbor] != unreachable):
+                    continue
+
+                matrix[rowStart + neighbor] = distance
+                nextFrontier.append(neighbor)
+
+        frontier = nextFrontier
+
 class DistanceCalculator:
     def __init__(self, layout, distancer):
         self.layout = layout
         self.distancer = distancer
-        self.cache = {}
 
     def run(self):
-        if self.layout.walls not in self.cache:
-            self.cache[self.layout.walls] = computeDistances(self.layout)
+        distancer = self.distancer
 
-        self.distancer._distances = self.cache[self.layout.walls]
+        # Lazy distancers still use a full set of distances if one has already been loaded.
+        if (distancer._lazy and getWallsKey(self.layout.walls) not in _cache):
+            distancer._distances = LazyMazeDistances(self.layout.walls, distancer._maxRows)
+        else:
+            distancer._distances = loadDistances(self.layout)
 
 def computeDistances(layout):
     """
-    Runs UCS to all other positions from each position.
+    Compute the distances between all pairs of open positions in the layout.
+    Returns a `MazeDistances`.
     """
 
-    distances = {}
-    allNodes = layout.walls.asList(False)
+    return MazeDistances(layout.walls)
 
-    for source in allNodes:
-        dist = {}
-        closed = {}
+def getDistanceOnGrid(distances, pos1, pos2):
+    try:
+        return distances.getDistance(pos1, pos2)
+    except KeyError:
+        return DEFAULT_DISTANCE
 
-        for node in allNodes:
-            dist[node] = sys.maxsize
+#############################
+# CACHING OF MAZE DISTANCES #
+#############################
 
-        queue = priorityQueue.PriorityQueue()
-        queue.push(source, 0)
-        dist[source] = 0
+# Maze distances only depend on the walls, so they are shared across the whole process
+# (all agents and all games), keyed by `getWallsKey`.
+_cache = {}
 
-        while not queue.isEmpty():
-            node = queue.pop()
-            if node in closed:
-                continue
+_cacheDir = os.environ.get(CACHE_DIR_ENV_VAR)
 
-            closed[node] = True
-            nodeDist = dist[node]
-            adjacent = []
-            x, y = node
+CACHE_FILE_VERSION = 1
+CACHE_FILE_MAGIC = b'PACDIST'
+CACHE_FILE_EXTENSION = '.dist'
 
-            if not layout.isWall((x, y + 1)):
-                adjacent.append((x, y + 1))
+# Magic, version, typecode, byte order, padding, number of cells.
+# The header is a multiple of 8 bytes so that the matrix that follows is aligned.
+CACHE_FILE_HEADER = struct.Struct('<7sBcc6xQ')
 
-            if not layout.isWall((x, y - 1)):
-                adjacent.append((x, y - 1))
+def clearCache():
+    """
+    Clear the in-memory distance cache.
+    Files in the on-disk cache are left alone.
+    """
 
-            if not layout.isWall((x + 1, y)):
-                adjacent.append((x + 1, y))
+    _cache.clear()
 
-            if not layout.isWall((x - 1, y)):
-                adjacent.append((x - 1, y))
+def getCacheDirectory():
+    return _cacheDir
 
-            for other in adjacent:
-                if other not in dist:
-                    continue
+def setCacheDirectory(path):
+    """
+    Set the directory that maze distances are cached in.
+    Use None to disable the on-disk cache.
+    The default can be set with the PACAI_DISTANCE_CACHE_DIR environment variable.
+    """
+
+    global _cacheDir
+    _cacheDir = path
 
-                oldDist = dist[other]
-                newDist = nodeDist + 1
-                if newDist < oldDist:
-                    dist[other] = newDist
-                    queue.push(other, newDist)
+def getWallsKey(walls):
+    """
+    Get a key for a set of walls that is stable across processes
+    (unlike hash(), which is randomized per process).
+    """
 
-        for target in allNodes:
-            distances[(target, source)] = dist[target]
+    description = '%d,%d,%s' % (walls.getWidth(), walls.getHeight(), walls.asList())
+    return hashlib.sha256(description.encode()).hexdigest()
 
+def loadDistances(layout):
+    """
+    Get the maze distances for a layout.
+    Distances come from the in-memory cache, then the on-disk cache (if enabled),
+    and are only computed if they are not found in either.
+    """
+
+    key = getWallsKey(layout.walls)
+    if (key in _cache):
+        return _cache[key]
+
+    distances = None
+    path = None
+
+    if (_cacheDir is not None):
+        path = os.path.join(_cacheDir, key + CACHE_FILE_EXTENSION)
+        distances = _readDistances(layout.walls, path)
+
+    if (distances is None):
+        distances = computeDistances(layout)
+
+        if (path is not None):
+            _writeDistances(distances, path)
+
+    _cache[key] = distances
     return distances
 
-def getDistanceOnGrid(distances, pos1, pos2):
-    key = (pos1, pos2)
-    if key in distances:
-        return distances[key]
+def _readDistances(walls, path):
+    """
+    Memory-map a cached distance file.
+    Returns None if the file does not exist or cannot be used.
+    """
+
+    if (not os.path.isfile(path)):
+        return None
+
+    try:
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+    except (OSError, ValueError) as ex:
+        logging.warning("Could not read cached maze distances '%s': %s" % (path, ex))
+        return None
+
+    if (len(buffer) < CACHE_FILE_HEADER.size):
+        return None
+
+    magic, version, typecode, byteOrder, numCells = CACHE_FILE_HEADER.unpack_from(buffer)
+    if (magic != CACHE_FILE_MAGIC
+            or version != CACHE_FILE_VERSION
+            or byteOrder != sys.byteorder[0].encode()):
+        return None
+
+    # Compare the raw bytes (a corrupt typecode may not even decode),
+    # and only accept the typecode that would have been written for this many cells.
+    expectedTypecode = _getMatrixType(numCells)[0]
+    if (typecode != expectedTypecode.encode()):
+        return None
+
+    typecode = expectedTypecode
+    matrixSize = numCells * numCells * array.array(typecode).itemsize
+    if (len(buffer) != CACHE_FILE_HEADER.size + matrixSize):
+        return None
+
+    matrix = memoryview(buffer)[CACHE_FILE_HEADER.size:].cast(typecode)
+
+    try:
+        return MazeDistances(walls, matrix)
+    except ValueError:
+        return None
+
+def _writeDistances(distances, path):
+    """
+    Write distances to the on-disk cache.
+    The file is written to a temp file and then moved into place,
+    so concurrent readers never see a partial file.
+    """
+
+    numCells = len(distances.getCells())
+    header = CACHE_FILE_HEADER.pack(CACHE_FILE_MAGIC, CACHE_FILE_VERSION,
+            distances.getTypecode().encode(), sys.byteorder[0].encode(), numCells)
+
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+
+        handle, tempPath = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)))
+    except OSError as ex:
+        logging.warning("Could not cache maze distances to '%s': %s" % (path, ex))
+        return
+
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            file.write(header)
+            file.write(distances.getMatrix().tobytes())
+
+        os.replace(tempPath, path)
+    except OSError as ex:
+        logging.warning("Could not cache maze distances to '%s': %s" % (path, ex))
 
-    return DEFAULT_DISTANCE
+        if (os.path.exists(tempPath)):
+            os.remove(tempPath)
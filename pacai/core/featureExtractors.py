@@ -3,6 +3,7 @@ Feature extractors for game states.
 """
 
 import abc
+import array
 
 from pacai.core.actions import Actions
 from pacai.core.search import search
@@ -12,8 +13,13 @@ class FeatureExtractor(abc.ABC):
     """
     A class that takes a `pacai.core.gamestate.AbstractGameState` and `pacai.core.actions.Actions`,
     and returns a dict of features.
+
+    Extractors that always return the same features can list them in FEATURES,
+    so they get fixed positions in a `FeatureIndex`.
     """
 
+    FEATURES = ()
+
     @abc.abstractmethod
     def getFeatures(self, state, action):
         """
@@ -24,6 +30,53 @@ class FeatureExtractor(abc.ABC):
 
         pass
 
+class FeatureIndex(object):
+    """
+    Gives each feature a fixed position (index) in a vector.
+    Features that have not been seen before are added to the end.
+    """
+
+    def __init__(self, features = ()):
+        self._indexes = {}
+        self._features = []
+
+        for feature in features:
+            self.getIndex(feature)
+
+    def getFeatures(self):
+        """
+        Get all the features (in index order).
+        """
+
+        return list(self._features)
+
+    def getIndex(self, feature):
+        index = self._indexes.get(feature)
+        if (index is None):
+            index = len(self._features)
+            self._indexes[feature] = index
+            self._features.append(feature)
+
+        return index
+
+    def vectorize(self, features):
+        """
+        Turn a dict of features into a sparse vector: (indexes, values).
+        The features keep their order.
+        """
+
+        indexes = array.array('i')
+        values = array.array('d')
+
+        for feature, value in features.items():
+            indexes.append(self.getIndex(feature))
+            values.append(value)
+
+        return indexes, values
+
+    def __len__(self):
+        return len(self._features)
+
 class IdentityExtractor(FeatureExtractor):
     def getFeatures(self, state, action):
         feats = {}
@@ -36,6 +89,8 @@ class SimpleExtractor(FeatureExtractor):
     Returns simple features for a basic reflex Pacman.
     """
 
+    FEATURES = ('bias', '#-of-ghosts-1-step-away', 'eats-food', 'closest-food')
+
     def getFeatures(self, state, action):
         # Extract the grid of food and wall locations and get the ghost locations.
         food = state.getFood()
@@ -51,8 +106,9 @@ class SimpleExtractor(FeatureExtractor):
         next_x, next_y = int(x + dx), int(y + dy)
 
         # Count the number of ghosts 1-step away.
+        layout = state.getInitialLayout()
         features["#-of-ghosts-1-step-away"] = sum((next_x, next_y) in
-                Actions.getLegalNeighbors(g, walls) for g in ghosts)
+                layout.getLegalNeighbors(g) for g in ghosts)
 
         # If there is no danger of ghosts then add the food feature.
         if not features["#-of-ghosts-1-step-away"] and food[next_x][next_y]:
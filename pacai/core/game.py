@@ -22,6 +22,11 @@ class Game:
         self.totalAgentTimeWarnings = [0 for agent in agents]
         self.agentTimeout = False
 
+        # If set, every move is also passed to recorder.recordMove(agentIndex, action)
+        # as it is made (e.g. a `pacai.core.replay.ReplayWriter`),
+        # and a crash to recorder.recordCrash(agentIndex, timeout).
+        self.recorder = None
+
         self.enforceTimeouts = catchExceptions
         self.catchExceptions = catchExceptions
 
@@ -78,6 +83,10 @@ class Game:
                 self._agentCrash(agentIndex, ex)
                 return False
 
+            # Only legal moves are recorded, since only they can be replayed.
+            if (self.recorder is not None):
+                self.recorder.recordMove(agentIndex, action)
+
             # Update the display.
             self.display.update(self.state)
 
@@ -108,6 +117,9 @@ class Game:
         self.agentCrashed = True
         self.rules.agentCrash(self, agentIndex)
 
+        if (self.recorder is not None):
+            self.recorder.recordCrash(agentIndex, self.agentTimeout)
+
     def _checkForTimeouts(self, agentIndex, timeTaken):
         """
         Check if an agent timed out.
@@ -164,6 +176,8 @@ class Game:
                 self._agentCrash(agentIndex)
                 return False
 
+            agent.setMoveWarningTime(self.rules.getMoveWarningTime(agentIndex))
+
             maxStartupTime = int(self.rules.getMaxStartupTime(agentIndex))
             startTime = time.time()
 
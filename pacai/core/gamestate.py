@@ -3,7 +3,9 @@ import copy
 
 from pacai.core.agentstate import AgentState
 from pacai.core.directions import Directions
+from pacai.core.grid import BitGrid
 from pacai.util import util
+from pacai.util import zobrist
 
 class AbstractGameState(abc.ABC):
     """
@@ -26,6 +28,11 @@ class AbstractGameState(abc.ABC):
         # Any children should be sure to clear the hash when modifications are made.
         self._hash = None
 
+        # A Zobrist hash of the remaining food and capsules.
+        # It is updated incrementally as things are eaten (see eatFood() and eatCapsule()),
+        # so the full hash only needs to mix in a few small fields.
+        self._zobrist = 0
+
         # For food and capsules, we will only copy on write (if we eat one of them).
         # This avoid additional copies on successors that don't eat.
 
@@ -47,6 +54,8 @@ class AbstractGameState(abc.ABC):
 
         self._score = 0
 
+        self._zobrist = self._computeZobrist()
+
     @abc.abstractmethod
     def generateSuccessor(self, agentIndex, action):
         """
@@ -68,6 +77,41 @@ class AbstractGameState(abc.ABC):
         self._hash = None
         self._score += score
 
+    def applyAction(self, agentIndex, action):
+        """
+        Apply the action to this state in-place (instead of creating a successor).
+        Returns an undo record that can be passed to `AbstractGameState.undo`
+        to put this state back exactly how it was.
+
+        This is much cheaper than `AbstractGameState.generateSuccessor`
+        for deep searches that walk down and back up a tree:
+        ```
+        record = state.applyAction(agentIndex, action)
+        value = evaluate(state)
+        state.undo(record)
+        ```
+
+        Records must be undone in the reverse order that they were made.
+        """
+
+        if (self.isOver()):
+            raise RuntimeError("Can't apply actions to a terminal state.")
+
+        record = self._makeUndoRecord(agentIndex)
+
+        # Food and capsules may be shared with other states,
+        # so force a copy on write if anything is eaten.
+        self._foodCopied = False
+        self._capsulesCopied = False
+
+        try:
+            self._applySuccessorAction(agentIndex, action)
+        except Exception:
+            self.undo(record)
+            raise
+
+        return record
+
     def eatCapsule(self, x, y):
         """
         Mark the capsule at the given location as eaten.
@@ -82,6 +126,7 @@ class AbstractGameState(abc.ABC):
 
         self._capsules.remove((x, y))
         self._lastCapsuleEaten = (x, y)
+        self._zobrist ^= zobrist.getKey('capsule', x, y)
 
         self._hash = None
         return True
@@ -100,6 +145,7 @@ class AbstractGameState(abc.ABC):
 
         self._food[x][y] = False
         self._lastFoodEaten = (x, y)
+        self._zobrist ^= zobrist.getKey('food', x, y)
 
         self._hash = None
         return True
@@ -205,6 +251,28 @@ class AbstractGameState(abc.ABC):
 
         return self._layout.walls
 
+    def getSnapshot(self):
+        """
+        Get everything about this state that changes during a game (but not the layout)
+        as JSON serializable data.
+        See `AbstractGameState.loadSnapshot`.
+        """
+
+        agents = [[agentState.getPosition(), agentState.getDirection(), agentState.isPacman(),
+                agentState.getScaredTimer()] for agentState in self._agentStates]
+
+        return {
+            'score': self._score,
+            'gameover': self._gameover,
+            'win': self._win,
+            'lastAgentMoved': self._lastAgentMoved,
+            'lastFoodEaten': self._lastFoodEaten,
+            'lastCapsuleEaten': self._lastCapsuleEaten,
+            'food': self._food.asList(),
+            'capsules': self._capsules,
+            'agents': agents,
+        }
+
     def hasCapsule(self, x, y):
         """
         Returns true if the location (x, y) has a capsule.
@@ -235,6 +303,41 @@ class AbstractGameState(abc.ABC):
     def isWin(self):
         return self.isOver() and self._win
 
+    def loadSnapshot(self, snapshot):
+        """
+        Get a state on the same layout as this one,
+        but with everything else from a snapshot (see `AbstractGameState.getSnapshot`).
+        """
+
+        state = self._initSuccessor()
+
+        state._score = snapshot['score']
+        state._gameover = snapshot['gameover']
+        state._win = snapshot['win']
+        state._lastAgentMoved = snapshot['lastAgentMoved']
+        state._lastFoodEaten = _toPosition(snapshot['lastFoodEaten'])
+        state._lastCapsuleEaten = _toPosition(snapshot['lastCapsuleEaten'])
+
+        state._food = BitGrid(self._food.getWidth(), self._food.getHeight(),
+                initialValue = False)
+        for (x, y) in snapshot['food']:
+            state._food[x][y] = True
+        state._foodCopied = True
+
+        state._capsules = [_toPosition(capsule) for capsule in snapshot['capsules']]
+        state._capsulesCopied = True
+
+        for agentState, (position, direction, isPacman, scaredTimer) in zip(state._agentStates,
+                snapshot['agents']):
+            agentState._setPosition(_toPosition(position))
+            agentState._setDirection(direction)
+            agentState.setIsPacman(isPacman)
+            agentState.setScaredTimer(scaredTimer)
+
+        state._zobrist = state._computeZobrist()
+
+        return state
+
     def setHighlightLocations(self, locations):
         self._highlightLocations = list(locations)
 
@@ -242,6 +345,52 @@ class AbstractGameState(abc.ABC):
         self._score = score
         self._hash = None
 
+    def undo(self, record):
+        """
+        Restore this state using a record from `AbstractGameState.applyAction`.
+        """
+
+        fields, agentRecords = record
+
+        (self._score, self._gameover, self._win, self._lastAgentMoved, self._hash, self._zobrist,
+         self._food, self._foodCopied, self._lastFoodEaten,
+         self._capsules, self._capsulesCopied, self._lastCapsuleEaten) = fields
+
+        for agentIndex, agentRecord in agentRecords:
+            self._agentStates[agentIndex]._undo(agentRecord)
+
+    @abc.abstractmethod
+    def _applySuccessorAction(self, agentIndex, action):
+        """
+        Apply the action to the context state (self).
+        """
+
+        pass
+
+    def _computeZobrist(self):
+        """
+        Compute the Zobrist hash of the food and capsules from scratch.
+        """
+
+        hashCode = 0
+
+        for (x, y) in self._food.asList():
+            hashCode ^= zobrist.getKey('food', x, y)
+
+        for (x, y) in self._capsules:
+            hashCode ^= zobrist.getKey('capsule', x, y)
+
+        return hashCode
+
+    def _getAffectedAgents(self, agentIndex):
+        """
+        Get the indexes of the agents whose state an action by the given agent can change
+        (the agent itself, and any agent it can scare or respawn).
+        By default, this is every agent.
+        """
+
+        return range(len(self._agentStates))
+
     def _initSuccessor(self):
         """
         Get a state that will eventually serve as a successor.
@@ -261,6 +410,23 @@ class AbstractGameState(abc.ABC):
 
         return successor
 
+    def _makeUndoRecord(self, agentIndex):
+        """
+        Snapshot the fields that an action by the given agent can change.
+        Food and capsules are never modified in-place by an action (they are copied on write),
+        so keeping a reference to the old containers is enough to put back anything eaten.
+        Agent states are modified in-place, so the ones that can change keep their own records.
+        """
+
+        fields = (self._score, self._gameover, self._win, self._lastAgentMoved, self._hash,
+                self._zobrist, self._food, self._foodCopied, self._lastFoodEaten,
+                self._capsules, self._capsulesCopied, self._lastCapsuleEaten)
+
+        agentRecords = [(index, self._agentStates[index]._makeUndoRecord())
+                for index in self._getAffectedAgents(agentIndex)]
+
+        return (fields, agentRecords)
+
     def __eq__(self, other):
         if (other is None):
             return False
@@ -288,8 +454,20 @@ class AbstractGameState(abc.ABC):
                 and self._layout == other._layout)
 
     def __hash__(self):
+        # Agent states keep their own incremental hash,
+        # so this is O(number of agents) instead of O(size of the board).
         if (self._hash is None):
-            self._hash = util.buildHash(self._score, self._gameover, self._win, *self._capsules,
-                self._food, *self._agentStates, self._layout)
+            self._hash = util.buildHash(self._score, self._gameover, self._win, self._zobrist,
+                *self._agentStates, self._layout)
 
         return self._hash
+
+def _toPosition(position):
+    """
+    JSON turns position tuples into lists, so turn them back.
+    """
+
+    if (position is None):
+        return None
+
+    return tuple(position)
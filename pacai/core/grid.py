@@ -82,3 +82,153 @@ class Grid:
         out = [[str(self._data[x][y])[0] for x in range(self._width)] for y in range(self._height)]
         out.reverse()
         return '\n'.join([''.join(x) for x in out])
+
+class BitGrid:
+    """
+    A 2-dimensional array of booleans backed by a single (arbitrary-precision) int.
+    Data is accessed the same way as `Grid`, via grid[x][y].
+
+    The cell (x, y) is stored in bit (x * height + y).
+    Since ints are immutable, copies are O(1) and share nothing that can be modified.
+    Counting, equality, and hashing all work directly on the bitmask.
+    """
+
+    def __init__(self, width, height, initialValue = False):
+        if (not isinstance(initialValue, bool)):
+            raise ValueError('Grids can only contain booleans')
+
+        self._width = width
+        self._height = height
+        self._bits = 0
+
+        if (initialValue):
+            self._bits = self._fullMask()
+
+    def asList(self, key = True):
+        bits = self._bits
+        if (not key):
+            bits = ~bits & self._fullMask()
+
+        values = []
+        while (bits):
+            lowestBit = bits & -bits
+            index = lowestBit.bit_length() - 1
+            bits ^= lowestBit
+
+            values.append(self._cellIndexToPosition(index))
+
+        return values
+
+    def copy(self):
+        grid = BitGrid(self._width, self._height)
+        grid._bits = self._bits
+        return grid
+
+    def count(self, item = True):
+        setBits = bin(self._bits).count('1')
+        if (item):
+            return setBits
+
+        return self._width * self._height - setBits
+
+    def deepCopy(self):
+        return self.copy()
+
+    def getHeight(self):
+        return self._height
+
+    def getWidth(self):
+        return self._width
+
+    def shallowCopy(self):
+        return self.copy()
+
+    def _cellIndexToPosition(self, index):
+        x = index // self._height
+        y = index % self._height
+
+        return x, y
+
+    def _fullMask(self):
+        return (1 << (self._width * self._height)) - 1
+
+    def _getBit(self, x, y):
+        return ((self._bits >> (x * self._height + y)) & 1) == 1
+
+    def _setBit(self, x, y, value):
+        if (not isinstance(value, bool)):
+            raise ValueError('Grids can only contain booleans')
+
+        if (value):
+            self._bits |= (1 << (x * self._height + y))
+        else:
+            self._bits &= ~(1 << (x * self._height + y))
+
+    def __eq__(self, other):
+        if (not isinstance(other, BitGrid)):
+            return False
+
+        return (self._bits == other._bits
+                and self._width == other._width
+                and self._height == other._height)
+
+    def __getitem__(self, x):
+        # Column views are small and made on demand, so copies never need to rebuild them.
+        if (x < 0):
+            x += self._width
+
+        if (x < 0 or x >= self._width):
+            raise IndexError('Grid index out of range: %d.' % (x))
+
+        return _BitGridColumn(self, x)
+
+    def __hash__(self):
+        return hash(self._bits)
+
+    def __lt__(self, other):
+        return self.__hash__() < other.__hash__()
+
+    def __setitem__(self, key, item):
+        if (len(item) != self._height):
+            raise ValueError('Grid columns must have exactly %d values.' % (self._height))
+
+        column = self[key]
+        for y in range(self._height):
+            column[y] = item[y]
+
+    def __str__(self):
+        out = [[str(self[x][y])[0] for x in range(self._width)] for y in range(self._height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+class _BitGridColumn:
+    """
+    A view of a single column (fixed x) of a `BitGrid`.
+    Indexing behaves like a list of booleans (including negative indexes).
+    """
+
+    def __init__(self, grid, x):
+        self._grid = grid
+        self._x = x
+
+    def count(self, item = True):
+        return [self[y] for y in range(len(self))].count(item)
+
+    def _checkIndex(self, y):
+        height = self._grid._height
+        if (y < 0):
+            y += height
+
+        if (y < 0 or y >= height):
+            raise IndexError('Grid index out of range: %d.' % (y))
+
+        return y
+
+    def __getitem__(self, y):
+        return self._grid._getBit(self._x, self._checkIndex(y))
+
+    def __len__(self):
+        return self._grid._height
+
+    def __setitem__(self, y, value):
+        self._grid._setBit(self._x, self._checkIndex(y), value)
@@ -1,14 +1,20 @@
 import os
 import random
 
+from pacai.core.actions import Actions
+from pacai.core.directions import Directions
 from pacai.core.distance import manhattan
-from pacai.core.grid import Grid
+from pacai.core.grid import BitGrid
+from pacai.util import zobrist
 
 # By default, the layout directory is adjacent to this file.
 DEFAULT_LAYOUT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'layouts')
 
 GHOST_NUMS = ['1', '2', '3', '4']
 
+# The order that legal actions are listed in (the same as `pacai.core.actions.Actions`).
+ACTION_ORDER = sorted(Directions.CARDINAL + [Directions.STOP])
+
 class Layout(object):
     """
     A Layout manages the static information about the game board.
@@ -17,14 +23,60 @@ class Layout(object):
     def __init__(self, layoutText, maxGhosts = None):
         self.width = len(layoutText[0])
         self.height = len(layoutText)
-        self.walls = Grid(self.width, self.height, initialValue = False)
-        self.food = Grid(self.width, self.height, initialValue = False)
+        self.walls = BitGrid(self.width, self.height, initialValue = False)
+        self.food = BitGrid(self.width, self.height, initialValue = False)
         self.capsules = []
         self.agentPositions = []
         self.numGhosts = 0
         self.layoutText = layoutText
+        self._hash = None
 
         self.processLayoutText(layoutText, maxGhosts)
+        self._buildMoveTables()
+
+    def getCardinalMoves(self, position):
+        """
+        Get the (action, next position) pairs for each non-STOP move
+        that does not run into a wall from a grid position.
+        Moves are in the order of `pacai.core.directions.Directions.CARDINAL`,
+        which makes this suitable for generating the successors of search problems.
+
+        The returned tuple is shared, so it should not be modified.
+        """
+
+        moves = self._cardinalMoves.get(position)
+        if (moves is not None):
+            return moves
+
+        return self._computeCardinalMoves(position)
+
+    def getLegalActions(self, position, direction):
+        """
+        The same as `pacai.core.actions.Actions.getPossibleActions`,
+        but uses a precomputed table for agents that are on a grid point.
+
+        The returned tuple is shared, so it should not be modified.
+        """
+
+        actions = self._legalActions.get(position)
+        if (actions is not None):
+            return actions
+
+        return tuple(Actions.getPossibleActions(position, direction, self.walls))
+
+    def getLegalNeighbors(self, position):
+        """
+        The same as `pacai.core.actions.Actions.getLegalNeighbors`,
+        but uses a precomputed table for grid points.
+
+        The returned tuple is shared, so it should not be modified.
+        """
+
+        neighbors = self._legalNeighbors.get(position)
+        if (neighbors is not None):
+            return neighbors
+
+        return tuple(Actions.getLegalNeighbors(position, self.walls))
 
     def getNumGhosts(self):
         return self.numGhosts
@@ -72,12 +124,30 @@ class Layout(object):
         row, col = [int(x) for x in pacPos]
         return ghostPos in self.visibility[row][col][pacDirection]
 
-    def __str__(self):
-        return "\n".join(self.layoutText)
-
     def deepCopy(self):
         return Layout(self.layoutText[:])
 
+    def __eq__(self, other):
+        if (self is other):
+            return True
+
+        if (not isinstance(other, Layout)):
+            return False
+
+        return (self.numGhosts == other.numGhosts
+                and list(self.layoutText) == list(other.layoutText))
+
+    def __hash__(self):
+        # Hash the text (instead of using identity or Python's randomized string hashing),
+        # so game states that include the layout hash the same in every process.
+        if (self._hash is None):
+            self._hash = zobrist.getKey('layout', tuple(self.layoutText), self.numGhosts)
+
+        return self._hash
+
+    def __str__(self):
+        return "\n".join(self.layoutText)
+
     def processLayoutText(self, layoutText, maxGhosts):
         """
         Coordinates are flipped from the input format to the (x, y) convention here
@@ -118,6 +188,54 @@ class Layout(object):
             self.agentPositions.append((int(layoutChar), (x, y)))
             self.numGhosts += 1
 
+    def _buildMoveTables(self):
+        """
+        Precompute the legal actions, legal neighbors, and cardinal moves of every open cell.
+        Legal moves are needed for every agent on every turn,
+        so they are found once here instead of on every call.
+        Positions off the board are treated as walls.
+        """
+
+        self._legalActions = {}
+        self._legalNeighbors = {}
+        self._cardinalMoves = {}
+
+        for position in self.walls.asList(False):
+            x, y = position
+
+            actions = []
+            neighbors = []
+            for action in ACTION_ORDER:
+                dx, dy = Actions.directionToVector(action)
+                nextx, nexty = int(x + dx), int(y + dy)
+
+                if (self._isOpen(nextx, nexty)):
+                    actions.append(action)
+                    neighbors.append((nextx, nexty))
+
+            self._legalActions[position] = tuple(actions)
+            self._legalNeighbors[position] = tuple(neighbors)
+            self._cardinalMoves[position] = self._computeCardinalMoves(position)
+
+    def _computeCardinalMoves(self, position):
+        x, y = position
+
+        moves = []
+        for action in Directions.CARDINAL:
+            dx, dy = Actions.directionToVector(action)
+            nextx, nexty = int(x + dx), int(y + dy)
+
+            if (self._isOpen(nextx, nexty)):
+                moves.append((action, (nextx, nexty)))
+
+        return tuple(moves)
+
+    def _isOpen(self, x, y):
+        if (x < 0 or x >= self.width or y < 0 or y >= self.height):
+            return False
+
+        return not self.walls[x][y]
+
 def getLayout(name, layout_dir = DEFAULT_LAYOUT_DIR, maxGhosts = None):
     if (not name.endswith('.lay')):
         name += '.lay'
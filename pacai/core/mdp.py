@@ -1,4 +1,14 @@
 import abc
+import array
+import logging
+
+from pacai.util.priorityQueue import PriorityQueue
+
+# How close a policy's values must be to exact when evaluating it.
+DEFAULT_EVALUATION_TOLERANCE = 1e-10
+
+# The most sweeps that evaluating a single policy can take.
+MAX_EVALUATION_SWEEPS = 10000
 
 class MarkovDecisionProcess(abc.ABC):
     @abc.abstractmethod
@@ -59,3 +69,400 @@ class MarkovDecisionProcess(abc.ABC):
         """
 
         pass
+
+class CompiledMDP(object):
+    """
+    A `MarkovDecisionProcess` that has been compiled into flat arrays,
+    so that it can be solved without calling back into the MDP.
+
+    States are numbered (in the order of `MarkovDecisionProcess.getStates`),
+    and every (state, action) pair is a row.
+    The rows of a state are contiguous (rowStarts[state] to rowStarts[state + 1]),
+    as are the transitions of a row (transitionStarts[row] to transitionStarts[row + 1]).
+    Since the reward only matters in expectation,
+    each row keeps its expected reward instead of a reward for each transition.
+    """
+
+    def __init__(self, mdp):
+        self.mdp = mdp
+
+        self.states = list(mdp.getStates())
+        self.stateIndexes = {state: index for (index, state) in enumerate(self.states)}
+
+        # The number of states that values are computed for.
+        # States that only appear as successors are added after these, and are never updated.
+        self.numStates = len(self.states)
+
+        self.rowActions = []
+        self.rowStarts = array.array('l', [0])
+        self.transitionStarts = array.array('l', [0])
+        self.nextStates = array.array('l')
+        self.probabilities = array.array('d')
+        self.rewards = array.array('d')
+
+        for stateIndex in range(self.numStates):
+            state = self.states[stateIndex]
+
+            for action in mdp.getPossibleActions(state):
+                reward = 0.0
+                for nextState, probability in mdp.getTransitionStatesAndProbs(state, action):
+                    self.nextStates.append(self._getStateIndex(nextState))
+                    self.probabilities.append(probability)
+                    reward += probability * mdp.getReward(state, action, nextState)
+
+                self.rowActions.append(action)
+                self.rewards.append(reward)
+                self.transitionStarts.append(len(self.nextStates))
+
+            self.rowStarts.append(len(self.rowActions))
+
+        # The states that can lead to each state (built the first time they are needed).
+        self._predecessors = None
+
+    def asynchronousValueIteration(self, discountRate, iterations, tolerance = 0.0,
+            values = None):
+        """
+        Run value iteration with in-place updates,
+        so every update within a sweep sees the updates made before it.
+        Runs up to the given number of sweeps (over every state),
+        stopping early once no value changes by more than tolerance in a sweep.
+        Returns (values, the number of sweeps run).
+        """
+
+        if (values is None):
+            values = self.initialValues()
+
+        for iteration in range(iterations):
+            maxChange = 0.0
+
+            for stateIndex in range(self.numStates):
+                if (self.rowStarts[stateIndex] == self.rowStarts[stateIndex + 1]):
+                    continue
+
+                best = self._getBestValue(values, discountRate, stateIndex)
+
+                change = abs(best - values[stateIndex])
+                if (change > maxChange):
+                    maxChange = change
+
+                values[stateIndex] = best
+
+            if (maxChange <= tolerance):
+                return values, iteration + 1
+
+        return values, iterations
+
+    def evaluatePolicy(self, policy, discountRate, tolerance = DEFAULT_EVALUATION_TOLERANCE,
+            values = None):
+        """
+        Get the values of following a policy (the row that each state takes, or -1 for none).
+        The values are the solution to the (sparse) linear system
+        `V(s) = R(s, policy(s)) + discountRate * sum(P(s' | s, policy(s)) V(s'))`,
+        solved iteratively (Gauss-Seidel) until no value changes by more than tolerance.
+        Starting from the values of a similar policy (e.g. the previous one) converges faster.
+        Without discounting, the policy must be proper (see `CompiledMDP.isProperPolicy`),
+        since the values of a policy that may never end do not converge.
+        Returns (values, the number of sweeps run).
+        """
+
+        if (discountRate >= 1.0 and not self.isProperPolicy(policy)):
+            raise ValueError(('Cannot evaluate a policy that may never end'
+                    + ' without discounting (discount rate %f).') % (discountRate))
+
+        if (values is None):
+            values = self.initialValues()
+        else:
+            values = array.array('d', values)
+
+        for sweep in range(MAX_EVALUATION_SWEEPS):
+            maxChange = 0.0
+
+            for stateIndex in range(self.numStates):
+                row = policy[stateIndex]
+                if (row < 0):
+                    continue
+
+                value = self._getRowValue(values, discountRate, row)
+
+                change = abs(value - values[stateIndex])
+                if (change > maxChange):
+                    maxChange = change
+
+                values[stateIndex] = value
+
+            if (maxChange <= tolerance):
+                return values, sweep + 1
+
+        logging.warning(('Policy evaluation stopped after %d sweeps without converging'
+                + ' (last change: %g, tolerance: %g).')
+                % (MAX_EVALUATION_SWEEPS, maxChange, tolerance))
+
+        return values, MAX_EVALUATION_SWEEPS
+
+    def getActions(self, stateIndex):
+        return self.rowActions[self.rowStarts[stateIndex]:self.rowStarts[stateIndex + 1]]
+
+    def getPolicyActions(self, policy):
+        """
+        Convert a policy (of rows) into a {state: action} dict (for every state with actions).
+        """
+
+        return {self.states[index]: self.rowActions[policy[index]]
+                for index in range(self.numStates) if policy[index] >= 0}
+
+    def getPredecessors(self):
+        """
+        Get a set for each state of the states that have some chance of leading to it.
+        """
+
+        if (self._predecessors is None):
+            self._predecessors = [set() for state in self.states]
+
+            for stateIndex in range(self.numStates):
+                firstTransition = self.transitionStarts[self.rowStarts[stateIndex]]
+                lastTransition = self.transitionStarts[self.rowStarts[stateIndex + 1]]
+
+                for transition in range(firstTransition, lastTransition):
+                    if (self.probabilities[transition] > 0.0):
+                        self._predecessors[self.nextStates[transition]].add(stateIndex)
+
+        return self._predecessors
+
+    def getQValues(self, values, discountRate, stateIndex):
+        """
+        Get the q-value of each action (in the same order as `CompiledMDP.getActions`).
+        """
+
+        return [self._getRowValue(values, discountRate, row)
+                for row in range(self.rowStarts[stateIndex], self.rowStarts[stateIndex + 1])]
+
+    def getStateIndex(self, state):
+        return self.stateIndexes[state]
+
+    def getValueDict(self, values):
+        """
+        Convert an array of values into a {state: value} dict (for every state with actions).
+        """
+
+        return {self.states[index]: values[index] for index in range(self.numStates)
+                if self.rowStarts[index] != self.rowStarts[index + 1]}
+
+    def improvePolicy(self, policy, values, discountRate, tolerance = 0.0):
+        """
+        Get the greedy policy for the values.
+        A state only changes its action if another action is better by more than tolerance,
+        so a policy that is already greedy is left exactly as it is.
+        Returns (new policy, the number of states that changed their action).
+        """
+
+        newPolicy = array.array('l', policy)
+        numChanged = 0
+
+        for stateIndex in range(self.numStates):
+            row = policy[stateIndex]
+            if (row < 0):
+                continue
+
+            bestRow = row
+            bestValue = self._getRowValue(values, discountRate, row) + tolerance
+
+            for otherRow in range(self.rowStarts[stateIndex], self.rowStarts[stateIndex + 1]):
+                value = self._getRowValue(values, discountRate, otherRow)
+                if (value > bestValue):
+                    bestRow = otherRow
+                    bestValue = value
+
+            if (bestRow != row):
+                newPolicy[stateIndex] = bestRow
+                numChanged += 1
+
+        return newPolicy, numChanged
+
+    def initialPolicy(self):
+        """
+        Get the policy that takes the first action in every state (-1 for states without actions).
+        """
+
+        policy = array.array('l', [-1]) * len(self.states)
+        for stateIndex in range(self.numStates):
+            if (self.rowStarts[stateIndex] != self.rowStarts[stateIndex + 1]):
+                policy[stateIndex] = self.rowStarts[stateIndex]
+
+        return policy
+
+    def initialValues(self):
+        return array.array('d', [0.0]) * len(self.states)
+
+    def isProperPolicy(self, policy):
+        """
+        Check if following a policy ends (reaches a state without a row) with probability 1,
+        which is when a state without a row can be reached from every state.
+        """
+
+        # The states that each state has some chance of leading to under the policy.
+        policyPredecessors = [[] for state in self.states]
+        for stateIndex in range(self.numStates):
+            row = policy[stateIndex]
+            if (row < 0):
+                continue
+
+            for transition in range(self.transitionStarts[row], self.transitionStarts[row + 1]):
+                if (self.probabilities[transition] > 0.0):
+                    policyPredecessors[self.nextStates[transition]].append(stateIndex)
+
+        # Search backwards from the states that end.
+        ends = [policy[stateIndex] < 0 for stateIndex in range(len(self.states))]
+        stack = [stateIndex for stateIndex in range(len(self.states)) if ends[stateIndex]]
+
+        while (len(stack) > 0):
+            for stateIndex in policyPredecessors[stack.pop()]:
+                if (not ends[stateIndex]):
+                    ends[stateIndex] = True
+                    stack.append(stateIndex)
+
+        return all(ends)
+
+    def policyIteration(self, discountRate, iterations,
+            tolerance = DEFAULT_EVALUATION_TOLERANCE):
+        """
+        Alternate between evaluating the policy (see `CompiledMDP.evaluatePolicy`)
+        and greedily improving it, for up to the given number of iterations
+        or until the policy stops changing.
+        Returns (values, policy, the number of iterations run).
+        """
+
+        policy = self.initialPolicy()
+        values = None
+
+        for iteration in range(iterations):
+            values, numSweeps = self.evaluatePolicy(policy, discountRate, tolerance, values)
+
+            # Only switch for improvements that are bigger than the evaluation error.
+            policy, numChanged = self.improvePolicy(policy, values, discountRate, tolerance)
+            if (numChanged == 0):
+                return values, policy, iteration + 1
+
+        if (values is None):
+            values = self.initialValues()
+
+        return values, policy, iterations
+
+    def prioritizedSweeping(self, discountRate, iterations, tolerance = 0.0, values = None):
+        """
+        Run value iteration one state at a time,
+        always updating the state with the largest Bellman error (change in its value) first.
+        After a state is updated, its predecessors are queued by their new Bellman error.
+        States whose error is not more than tolerance are not updated.
+        Runs up to the given number of (single state) updates,
+        stopping early once no state has an error over the tolerance.
+        Returns (values, the number of updates).
+        """
+
+        if (values is None):
+            values = self.initialValues()
+
+        predecessors = self.getPredecessors()
+
+        queue = PriorityQueue()
+        for stateIndex in range(self.numStates):
+            self._queueError(queue, values, discountRate, stateIndex, tolerance)
+
+        numUpdates = 0
+        while (numUpdates < iterations and not queue.isEmpty()):
+            stateIndex = queue.pop()
+
+            # A state can be queued more than once, so it may have already been updated.
+            best = self._getBestValue(values, discountRate, stateIndex)
+            if (abs(best - values[stateIndex]) <= tolerance):
+                continue
+
+            values[stateIndex] = best
+            numUpdates += 1
+
+            for predecessor in predecessors[stateIndex]:
+                self._queueError(queue, values, discountRate, predecessor, tolerance)
+
+        return values, numUpdates
+
+    def valueIteration(self, discountRate, iterations, tolerance = 0.0, values = None):
+        """
+        Run (synchronous) value iteration for up to the given number of iterations,
+        stopping early once no value changes by more than tolerance in an iteration.
+        Returns (values, the number of iterations run).
+        """
+
+        if (values is None):
+            values = self.initialValues()
+
+        rowStarts = self.rowStarts
+        transitionStarts = self.transitionStarts
+        nextStates = self.nextStates
+        probabilities = self.probabilities
+        rewards = self.rewards
+
+        for iteration in range(iterations):
+            newValues = array.array('d', values)
+            maxChange = 0.0
+
+            for stateIndex in range(self.numStates):
+                firstRow = rowStarts[stateIndex]
+                lastRow = rowStarts[stateIndex + 1]
+                if (firstRow == lastRow):
+                    continue
+
+                best = float('-inf')
+                for row in range(firstRow, lastRow):
+                    expected = 0.0
+                    for transition in range(transitionStarts[row], transitionStarts[row + 1]):
+                        expected += probabilities[transition] * values[nextStates[transition]]
+
+                    qValue = rewards[row] + discountRate * expected
+                    if (qValue > best):
+                        best = qValue
+
+                change = abs(best - values[stateIndex])
+                if (change > maxChange):
+                    maxChange = change
+
+                newValues[stateIndex] = best
+
+            values = newValues
+
+            if (maxChange <= tolerance):
+                return values, iteration + 1
+
+        return values, iterations
+
+    def _getBestValue(self, values, discountRate, stateIndex):
+        best = float('-inf')
+        for row in range(self.rowStarts[stateIndex], self.rowStarts[stateIndex + 1]):
+            best = max(best, self._getRowValue(values, discountRate, row))
+
+        return best
+
+    def _getRowValue(self, values, discountRate, row):
+        expected = 0.0
+        for transition in range(self.transitionStarts[row], self.transitionStarts[row + 1]):
+            expected += self.probabilities[transition] * values[self.nextStates[transition]]
+
+        return self.rewards[row] + discountRate * expected
+
+    def _getStateIndex(self, state):
+        if (state not in self.stateIndexes):
+            self.stateIndexes[state] = len(self.states)
+            self.states.append(state)
+
+        return self.stateIndexes[state]
+
+    def _queueError(self, queue, values, discountRate, stateIndex, tolerance):
+        """
+        Queue the state (largest error first) if its Bellman error is more than tolerance.
+        """
+
+        if (stateIndex >= self.numStates
+                or self.rowStarts[stateIndex] == self.rowStarts[stateIndex + 1]):
+            return
+
+        error = abs(self._getBestValue(values, discountRate, stateIndex) - values[stateIndex])
+        if (error > tolerance):
+            queue.push(stateIndex, -error)
@@ -0,0 +1,659 @@
+"""
+A compact binary format for recording games.
+
+A replay file is an archive that can hold any number of games.
+Each game is stored as:
+ - a header (the layout text and any other information about the game, as JSON),
+ - one byte per move (the agent index and the action),
+ - if an agent crashed (or timed out), one byte with the agent index and a crash code,
+ - an end of game marker.
+
+Moves are written (and flushed) as they are made,
+so a game that crashes still leaves a replay of every move up to the crash.
+When a writer is closed, an index of where each game starts is written at the end of the file,
+so any game can be loaded without reading the games before it.
+Files without an index (e.g. from a crashed process) are indexed by scanning the games.
+
+A `ReplayPlayer` steps through the states of a recorded game,
+keeping periodic snapshots (keyframes) so that it can quickly seek to any move.
+Keyframes can be saved to a JSON file next to the replay file (see `ReplayArchive.saveKeyframes`),
+so later players of the same game can seek from them without replaying the moves before them.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+
+from pacai.core.directions import Directions
+from pacai.core.layout import Layout
+
+FILE_VERSION = 1
+FILE_MAGIC = b'PACRPLY'
+FILE_HEADER = struct.Struct('<7sB')
+
+# The length of a game's (JSON) header.
+GAME_HEADER_LENGTH = struct.Struct('<I')
+
+INDEX_MAGIC = b'PACRIDX'
+INDEX_OFFSET = struct.Struct('<Q')
+# Number of games, magic, version.
+INDEX_TRAILER = struct.Struct('<Q7sB')
+
+# Each move is a single byte: the agent index in the high 5 bits and the action in the low 3 bits.
+ACTIONS = [Directions.STOP, Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]
+ACTION_CODES = {action: code for (code, action) in enumerate(ACTIONS)}
+AGENT_INDEX_SHIFT = 3
+ACTION_MASK = 0b111
+MAX_AGENT_INDEX = 31
+
+# An agent crashing (or timing out) is recorded like a move, but with one of these codes.
+CRASH_CODE = 5
+TIMEOUT_CODE = 6
+
+# Cannot be a move, since no action has a code of 7.
+END_OF_GAME = bytes([0xFF])
+
+# The default number of moves between each keyframe of a `ReplayPlayer`.
+DEFAULT_KEYFRAME_INTERVAL = 50
+
+# Saved keyframes go in a file next to the replay file with this extension.
+KEYFRAMES_EXTENSION = '.keyframes'
+KEYFRAMES_VERSION = 1
+
+class MoveRecorder(object):
+    """
+    Records moves in memory (with the same recordMove() as `ReplayWriter`).
+    This is useful for games that are played in another process
+    and written to a replay file later.
+    """
+
+    def __init__(self):
+        self._moves = []
+        self._crash = None
+
+    def getCrash(self):
+        """
+        Get the (agent index, timeout) of the crash that ended the game,
+        or None if no agent crashed.
+        """
+
+        return self._crash
+
+    def getMoves(self):
+        """
+        Get the (agent index, action) of each recorded move.
+        """
+
+        return self._moves
+
+    def recordCrash(self, agentIndex, timeout = False):
+        self._crash = (agentIndex, timeout)
+
+    def recordMove(self, agentIndex, action):
+        self._moves.append((agentIndex, action))
+
+class Replay(object):
+    """
+    A single recorded game.
+    """
+
+    def __init__(self, header, moves, complete, keyframes = None):
+        self._header = header
+        self._complete = complete
+        self._keyframes = keyframes
+
+        # A crash is always the last thing recorded.
+        self._crash = None
+        if (len(moves) > 0 and (moves[-1] & ACTION_MASK) in (CRASH_CODE, TIMEOUT_CODE)):
+            code = moves[-1] & ACTION_MASK
+            self._crash = (moves[-1] >> AGENT_INDEX_SHIFT, code == TIMEOUT_CODE)
+            moves = moves[:-1]
+
+        self._moves = moves
+
+    def getActions(self):
+        """
+        Get the (agent index, action) of each move, in order
+        (the same as `pacai.core.game.Game.moveHistory`).
+        """
+
+        return [(move >> AGENT_INDEX_SHIFT, ACTIONS[move & ACTION_MASK]) for move in self._moves]
+
+    def getCrash(self):
+        """
+        Get the (agent index, timeout) of the agent that crashed (or timed out) and ended the game,
+        or None if no agent crashed.
+        """
+
+        return self._crash
+
+    def getInfo(self):
+        """
+        Get the extra information that was recorded with the game.
+        """
+
+        return self._header['info']
+
+    def getKeyframes(self, keyframeInterval = DEFAULT_KEYFRAME_INTERVAL):
+        """
+        Get the keyframe snapshots that were saved for this game
+        (see `ReplayArchive.saveKeyframes`), if they were made with the same interval.
+        """
+
+        if (self._keyframes is None or self._keyframes['interval'] != keyframeInterval):
+            return []
+
+        return self._keyframes['snapshots']
+
+    def getLayout(self):
+        return Layout(self._header['layout'], maxGhosts = self._header['numGhosts'])
+
+    def getNumMoves(self):
+        return len(self._moves)
+
+    def isComplete(self):
+        """
+        Check if the game was properly ended.
+        Games that crashed (or were never finished) will only have some of their moves.
+        """
+
+        return self._complete
+
+class ReplayArchive(object):
+    """
+    Read games from a replay file.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._data = file.read()
+
+        offsets, self._dataEnd = _readIndex(self._data)
+        self._offsets = offsets
+
+        self._keyframesPath = path + KEYFRAMES_EXTENSION
+        self._keyframes = _readKeyframes(self._keyframesPath)
+
+    def getGame(self, index):
+        """
+        Get a `Replay` of the game at the given index.
+        Negative indexes count back from the end (like lists).
+        """
+
+        start = self._offsets[index]
+        movesStart, movesEnd = self._findGame(start)
+
+        header = self._data[start + GAME_HEADER_LENGTH.size:movesStart]
+        header = json.loads(header.decode())
+
+        complete = (movesEnd != -1)
+        if (not complete):
+            movesEnd = self._dataEnd
+
+        # Saved keyframes are only used if the game they were made from has not changed.
+        keyframes = self._keyframes.get(str(start))
+        if (keyframes is not None and keyframes['digest'] != self._getDigest(start)):
+            keyframes = None
+
+        return Replay(header, self._data[movesStart:movesEnd], complete, keyframes)
+
+    def getNumGames(self):
+        return len(self._offsets)
+
+    def saveKeyframes(self, index, player):
+        """
+        Save the keyframes that a `ReplayPlayer` has made for the game at the given index
+        to the keyframe file next to the replay file,
+        so that they can be loaded with the game later (see `Replay.getKeyframes`).
+        Nothing is written if there are no keyframes to save,
+        or if the file already has as many keyframes for the game.
+        Returns true if the file was written.
+        """
+
+        start = self._offsets[index]
+        snapshots = player.getSnapshots()
+        if (len(snapshots) == 0):
+            return False
+
+        keyframes = self._keyframes.get(str(start))
+        digest = self._getDigest(start)
+
+        if (keyframes is not None
+                and keyframes['digest'] == digest
+                and keyframes['interval'] == player.getKeyframeInterval()
+                and len(keyframes['snapshots']) >= len(snapshots)):
+            return False
+
+        self._keyframes[str(start)] = {
+            'digest': digest,
+            'interval': player.getKeyframeInterval(),
+            'snapshots': snapshots,
+        }
+
+        return _writeKeyframes(self._keyframesPath, self._keyframes)
+
+    def _findGame(self, start):
+        return _findMoves(self._data, start, self._dataEnd)
+
+    def _getDigest(self, start):
+        """
+        Get a digest of the recorded game (header and moves) that starts at the given offset.
+        """
+
+        movesStart, movesEnd = self._findGame(start)
+        if (movesEnd == -1):
+            movesEnd = self._dataEnd
+
+        return hashlib.sha256(self._data[start:movesEnd]).hexdigest()
+
+    def __iter__(self):
+        for index in range(len(self._offsets)):
+            yield self.getGame(index)
+
+    def __len__(self):
+        return len(self._offsets)
+
+class ReplayPlayer(object):
+    """
+    Generates the states of a recorded game.
+
+    Every keyframeInterval moves, the state is kept as a keyframe.
+    Seeking to a move starts from the closest keyframe before it,
+    so it takes at most keyframeInterval moves (once the keyframes have been made).
+    Keyframes are made as the game is played forward, so no work is done up front.
+    Since successor states are separate objects, a keyframe is just a reference to a state.
+
+    Keyframes can also be given as snapshots that were saved from an earlier player
+    (see `ReplayArchive.saveKeyframes` and `Replay.getKeyframes`),
+    in which case seeking starts from the closest saved keyframe right away.
+    """
+
+    def __init__(self, initialState, actions, keyframeInterval = DEFAULT_KEYFRAME_INTERVAL,
+            snapshots = None):
+        if (keyframeInterval < 1):
+            raise ValueError('The keyframe interval must be positive, got %d.' % (keyframeInterval))
+
+        if (snapshots is None):
+            snapshots = []
+
+        self._actions = actions
+        self._keyframeInterval = keyframeInterval
+        self._initialState = initialState
+
+        # The snapshot of each keyframe after the initial state.
+        # Saved keyframes are only turned into states when they are needed (None until then).
+        self._snapshots = list(snapshots[:len(actions) // keyframeInterval])
+        self._keyframes = [initialState] + [None] * len(self._snapshots)
+
+    def getFinalState(self):
+        return self.getState(len(self._actions))
+
+    def getKeyframeInterval(self):
+        return self._keyframeInterval
+
+    def getNumKeyframes(self):
+        return len(self._keyframes)
+
+    def getNumMoves(self):
+        return len(self._actions)
+
+    def getSnapshots(self):
+        """
+        Get a snapshot of every keyframe after the initial state
+        (see `pacai.core.gamestate.AbstractGameState.getSnapshot`).
+        """
+
+        for keyframe in range(len(self._snapshots) + 1, len(self._keyframes)):
+            self._snapshots.append(self._keyframes[keyframe].getSnapshot())
+
+        return list(self._snapshots)
+
+    def getState(self, numMoves):
+        """
+        Get the state after the given number of moves (zero is the initial state).
+        Negative numbers count back from the end of the game (like lists).
+        """
+
+        numMoves = self._checkNumMoves(numMoves)
+
+        keyframe = min(numMoves // self._keyframeInterval, len(self._keyframes) - 1)
+        state = self._getKeyframe(keyframe)
+
+        for moveIndex in range(keyframe * self._keyframeInterval, numMoves):
+            state = self._advance(state, moveIndex)
+
+        return state
+
+    def iterStates(self, start = 0):
+        """
+        Iterate over the states of the game in order,
+        starting with the state after start moves and ending with the final state.
+        """
+
+        start = self._checkNumMoves(start)
+
+        state = self.getState(start)
+        yield state
+
+        for moveIndex in range(start, len(self._actions)):
+            state = self._advance(state, moveIndex)
+            yield state
+
+    def _advance(self, state, moveIndex):
+        """
+        Apply a move to the state before it, and keep the result if it is the next keyframe.
+        """
+
+        state = state.generateSuccessor(*self._actions[moveIndex])
+
+        numMoves = moveIndex + 1
+        if (numMoves == len(self._keyframes) * self._keyframeInterval):
+            self._keyframes.append(state)
+
+        return state
+
+    def _getKeyframe(self, keyframe):
+        state = self._keyframes[keyframe]
+        if (state is None):
+            state = self._initialState.loadSnapshot(self._snapshots[keyframe - 1])
+            self._keyframes[keyframe] = state
+
+        return state
+
+    def _checkNumMoves(self, numMoves):
+        """
+        Resolve a negative number of moves and make sure it is in range.
+        """
+
+        if (numMoves < 0):
+            numMoves += len(self._actions) + 1
+
+        if (numMoves < 0 or numMoves > len(self._actions)):
+            raise IndexError('Move %d is out of range for a game of %d moves.'
+                    % (numMoves, len(self._actions)))
+
+        return numMoves
+
+class ReplayWriter(object):
+    """
+    Write games to a replay file.
+
+    By default, an existing file is overwritten.
+    If append is true, games are instead added to the end of an existing archive.
+
+    Example:
+    ```
+    with ReplayWriter(path) as writer:
+        writer.startGame(layout)
+        game.recorder = writer
+        game.run()
+        writer.endGame()
+    ```
+    """
+
+    def __init__(self, path, append = False):
+        self._path = path
+        self._offsets = []
+        self._inGame = False
+
+        if (append and os.path.isfile(path)):
+            self._file = open(path, 'r+b')
+            self._openForAppend()
+        else:
+            self._file = open(path, 'wb')
+            self._file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+
+    def close(self):
+        """
+        End any game in progress and write the index.
+        """
+
+        if (self._file is None):
+            return
+
+        if (self._inGame):
+            self.endGame()
+
+        for offset in self._offsets:
+            self._file.write(INDEX_OFFSET.pack(offset))
+
+        self._file.write(INDEX_TRAILER.pack(len(self._offsets), INDEX_MAGIC, FILE_VERSION))
+        self._file.close()
+        self._file = None
+
+    def endGame(self):
+        if (not self._inGame):
+            return
+
+        self._file.write(END_OF_GAME)
+        self._file.flush()
+        self._inGame = False
+
+    def getPath(self):
+        return self._path
+
+    def recordCrash(self, agentIndex, timeout = False):
+        """
+        Record that an agent crashed (or timed out), which ends the current game.
+        """
+
+        code = CRASH_CODE
+        if (timeout):
+            code = TIMEOUT_CODE
+
+        self._writeMove(agentIndex, code)
+        self.endGame()
+
+    def recordMove(self, agentIndex, action):
+        """
+        Write a single move of the current game.
+        """
+
+        self._writeMove(agentIndex, ACTION_CODES[action])
+
+    def startGame(self, layout, **info):
+        """
+        Start recording a new game on the given layout.
+        Any extra information about the game (which must be JSON serializable)
+        can be passed as keyword arguments and later retrieved with `Replay.getInfo`.
+        """
+
+        if (self._inGame):
+            self.endGame()
+
+        header = json.dumps({
+            'layout': layout.layoutText,
+            'numGhosts': layout.getNumGhosts(),
+            'info': info,
+        }).encode()
+
+        self._offsets.append(self._file.tell())
+        self._file.write(GAME_HEADER_LENGTH.pack(len(header)))
+        self._file.write(header)
+        self._file.flush()
+
+        self._inGame = True
+
+    def writeGame(self, layout, actions, crash = None, **info):
+        """
+        Write an entire game at once (see `ReplayWriter.startGame`).
+        If the game ended with a crash, it should be given as (agent index, timeout).
+        """
+
+        self.startGame(layout, **info)
+        for agentIndex, action in actions:
+            self.recordMove(agentIndex, action)
+
+        if (crash is not None):
+            self.recordCrash(*crash)
+
+        self.endGame()
+
+    def _openForAppend(self):
+        """
+        Drop the index from the end of an existing archive so that more games can be added.
+        """
+
+        data = self._file.read()
+        self._offsets, dataEnd = _readIndex(data)
+
+        self._file.seek(dataEnd)
+        self._file.truncate()
+
+        # The last game may have been left without an end (e.g. if the process crashed).
+        if (len(self._offsets) > 0):
+            movesStart, movesEnd = _findMoves(data, self._offsets[-1], dataEnd)
+            if (movesEnd == -1):
+                self._file.write(END_OF_GAME)
+
+    def _writeMove(self, agentIndex, code):
+        if (not self._inGame):
+            raise RuntimeError('Cannot record a move outside of a game.')
+
+        if (agentIndex < 0 or agentIndex > MAX_AGENT_INDEX):
+            raise ValueError('Cannot record a move for agent %d.' % (agentIndex))
+
+        self._file.write(bytes([(agentIndex << AGENT_INDEX_SHIFT) | code]))
+        self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+def rescoreGames(archive, createInitialState, penalizeCrash = None):
+    """
+    Replay every game in an archive without any display (or agents),
+    and return the final state of each game.
+    createInitialState is called with each `Replay` and should return the starting state.
+
+    If a game ended with an agent crashing (or timing out),
+    penalizeCrash is called with the final state and the index of that agent,
+    and should apply the same penalty that the game's rules did.
+    """
+
+    finalStates = []
+    for recorded in archive:
+        state = createInitialState(recorded)
+        for action in recorded.getActions():
+            state = state.generateSuccessor(*action)
+
+        crash = recorded.getCrash()
+        if (crash is not None and penalizeCrash is not None):
+            penalizeCrash(state, crash[0])
+
+        finalStates.append(state)
+
+    return finalStates
+
+def _findMoves(data, start, dataEnd):
+    """
+    Get where the moves of the game starting at the given offset start and end.
+    The end is -1 if the game was never ended.
+    """
+
+    headerLength, = GAME_HEADER_LENGTH.unpack_from(data, start)
+    movesStart = start + GAME_HEADER_LENGTH.size + headerLength
+
+    return movesStart, data.find(END_OF_GAME, movesStart, dataEnd)
+
+def _readKeyframes(path):
+    """
+    Read saved keyframes as {game offset: {digest, interval, snapshots}}.
+    A missing or unusable file has no keyframes.
+    """
+
+    if (not os.path.isfile(path)):
+        return {}
+
+    try:
+        with open(path, 'r') as file:
+            data = json.load(file)
+    except (OSError, ValueError) as ex:
+        logging.warning("Could not read replay keyframes '%s': %s" % (path, ex))
+        return {}
+
+    if (not isinstance(data, dict) or data.get('version') != KEYFRAMES_VERSION):
+        return {}
+
+    return data.get('games', {})
+
+def _readIndex(data):
+    """
+    Get the offset of each game and the end of the game data.
+    Uses the index if there is one, otherwise the games are scanned.
+    """
+
+    if (len(data) < FILE_HEADER.size):
+        raise ValueError('Not a replay file.')
+
+    magic, version = FILE_HEADER.unpack_from(data)
+    if (magic != FILE_MAGIC):
+        raise ValueError('Not a replay file.')
+
+    if (version != FILE_VERSION):
+        raise ValueError('Unsupported replay file version: %d.' % (version))
+
+    if (len(data) >= FILE_HEADER.size + INDEX_TRAILER.size):
+        trailerStart = len(data) - INDEX_TRAILER.size
+        numGames, magic, version = INDEX_TRAILER.unpack_from(data, trailerStart)
+
+        indexStart = trailerStart - numGames * INDEX_OFFSET.size
+        if (magic == INDEX_MAGIC and version == FILE_VERSION and indexStart >= FILE_HEADER.size):
+            offsets = [INDEX_OFFSET.unpack_from(data, indexStart + i * INDEX_OFFSET.size)[0]
+                    for i in range(numGames)]
+            return offsets, indexStart
+
+    return _scanGames(data), len(data)
+
+def _scanGames(data):
+    offsets = []
+
+    start = FILE_HEADER.size
+    while (start + GAME_HEADER_LENGTH.size <= len(data)):
+        movesStart, movesEnd = _findMoves(data, start, len(data))
+
+        # A game whose header was never fully written has no moves to replay.
+        if (movesStart > len(data)):
+            break
+
+        offsets.append(start)
+        if (movesEnd == -1):
+            break
+
+        start = movesEnd + 1
+
+    return offsets
+
+def _writeKeyframes(path, games):
+    """
+    Write saved keyframes (see `_readKeyframes`).
+    The file is written to a temp file and then moved into place,
+    so concurrent readers never see a partial file.
+    Returns true if the file was written.
+    """
+
+    try:
+        handle, tempPath = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)))
+    except OSError as ex:
+        logging.warning("Could not save replay keyframes to '%s': %s" % (path, ex))
+        return False
+
+    try:
+        with os.fdopen(handle, 'w') as file:
+            json.dump({'version': KEYFRAMES_VERSION, 'games': games}, file)
+
+        os.replace(tempPath, path)
+    except OSError as ex:
+        logging.warning("Could not save replay keyframes to '%s': %s" % (path, ex))
+
+        if (os.path.exists(tempPath)):
+            os.remove(tempPath)
+
+        return False
+
+    return True
@@ -0,0 +1,491 @@
+"""
+An adversarial (multi-agent) search engine.
+
+The engine searches with alpha-beta (minimax) or expectimax,
+and remembers the results of previous searches in a transposition table,
+so positions that are reached by different orders of moves are only searched once.
+
+Searches can either be to a fixed depth (see `AdversarialSearch.search`),
+or iteratively deepen until a time limit runs out (see `AdversarialSearch.iterativeDeepening`).
+When iteratively deepening, the best move from each depth is tried first at the next depth,
+which makes alpha-beta prune much more.
+Fixed depth searches can also be spread across processes (see `AdversarialSearch.searchParallel`).
+"""
+
+import struct
+import time
+
+from pacai.util import parallel
+
+# The default number of entries in a transposition table.
+DEFAULT_TABLE_SIZE = 2 ** 16
+
+# The deepest that iterative deepening will go (when there is time left).
+MAX_DEPTH = 64
+
+# How many nodes to search between checking the time.
+TIME_CHECK_INTERVAL = 128
+
+# The kinds of values stored in the transposition table.
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# The engine and shared bound of a parallel search worker
+# (set when the worker process starts).
+_workerSearch = None
+
+class AdversarialSearch(object):
+    """
+    Search for the best action of the root agent.
+
+    The root agent maximizes the evaluation function,
+    and all other agents either minimize it (minimax)
+    or choose uniformly at random from their legal actions (expectimax).
+    Like `pacai.agents.search.multiagent.MultiAgentSearchAgent`,
+    the depth of a search is the number of times that every agent moves.
+
+    The transposition table has a fixed number of slots.
+    A slot is chosen from the hash of the state,
+    and a new entry only replaces an old one if it came from an equal or deeper search
+    (or the old one came from an earlier call to the engine).
+    Each entry also keeps a second, independent hash of its state (see `_getCheck`),
+    which must match as well before the entry is used.
+    The table is kept between searches, so work from the previous move can be reused.
+
+    Parallel searches also keep their pool of processes between searches
+    (starting processes takes time away from the move),
+    until `AdversarialSearch.closePool` is called (e.g. at the end of a game).
+    """
+
+    def __init__(self, evaluationFunction, rootIndex = 0, expectimax = False,
+            tableSize = DEFAULT_TABLE_SIZE):
+        if (tableSize < 1):
+            raise ValueError('The table size must be positive, got %d.' % (tableSize))
+
+        self._evaluationFunction = evaluationFunction
+        self._rootIndex = rootIndex
+        self._expectimax = expectimax
+
+        self._table = [None] * tableSize
+
+        # Incremented on every search, so that entries from old searches can be replaced.
+        self._generation = 0
+
+        self._deadline = None
+        self._numNodes = 0
+        self._numCutoffs = 0
+        self._lastDepth = 0
+
+        # The process pool for parallel searches, its size, and the bound that its workers share.
+        self._pool = None
+        self._poolJobs = 0
+        self._poolBound = None
+
+    def clearTable(self):
+        self._table = [None] * len(self._table)
+
+    def closePool(self):
+        """
+        Stop the processes of parallel searches (a later parallel search will start new ones).
+        """
+
+        if (self._pool is None):
+            return
+
+        self._pool.terminate()
+        self._pool.join()
+
+        self._pool = None
+        self._poolJobs = 0
+        self._poolBound = None
+
+    def getLastDepth(self):
+        """
+        Get the depth of the last completed search.
+        """
+
+        return self._lastDepth
+
+    def getNumNodes(self):
+        """
+        Get the number of nodes expanded by the last search.
+        """
+
+        return self._numNodes
+
+    def iterativeDeepening(self, state, timeLimit, maxDepth = MAX_DEPTH):
+        """
+        Search to depth 1, 2, ... until timeLimit (seconds) runs out or maxDepth is reached,
+        and return the best action of the deepest completed search.
+        Deepening also stops early if a search reached the end of every game in the tree.
+
+        The first depth is always completed (even if it takes longer than the time limit),
+        so there is always an action to return.
+        """
+
+        deadline = time.time() + timeLimit
+
+        self._generation += 1
+        self._numNodes = 0
+        self._lastDepth = 0
+        bestAction = None
+
+        for depth in range(1, maxDepth + 1):
+            # Always finish the first depth.
+            self._deadline = None
+            if (depth > 1):
+                self._deadline = deadline
+
+            try:
+                value, bestAction, complete = self._searchRoot(state, depth, bestAction)
+            except _SearchTimeout:
+                break
+            finally:
+                self._deadline = None
+
+            self._lastDepth = depth
+
+            if (complete or time.time() >= deadline):
+                break
+
+        return bestAction
+
+    def search(self, state, depth):
+        """
+        Search to a fixed depth and return the (value, best action) for the root agent.
+        """
+
+        self._generation += 1
+        self._numNodes = 0
+        self._deadline = None
+
+        value, bestAction, complete = self._searchRoot(state, depth, None)
+        self._lastDepth = depth
+
+        return value, bestAction
+
+    def searchParallel(self, state, depth, numJobs):
+        """
+        Search to a fixed depth with the root agent's moves spread across numJobs processes,
+        and return the (value, best actions) for the root agent.
+
+        The first move (the best move from the table, if there is one) is searched here,
+        so the rest of the moves have a bound to be searched against (young brothers wait).
+        The rest of the moves are then searched in parallel,
+        and the best value so far is shared so that each move starts with the latest bound.
+        Moves are only pruned if they are strictly worse than the bound,
+        so every best move gets an exact value and the result does not depend on timing.
+        All of the best moves are returned (in the order of the legal actions).
+        The processes are kept for the next parallel search (see `AdversarialSearch.closePool`).
+        """
+
+        self._generation += 1
+        self._numNodes = 0
+        self._deadline = None
+
+        legalActions = state.getLegalActions(self._rootIndex)
+
+        key, check, entry = self._probe(state, self._rootIndex)
+        actions = self._orderActions(legalActions, entry[4] if entry is not None else None)
+
+        values = {}
+        values[actions[0]] = self._getActionValue(state, actions[0], depth, float('-inf'))
+
+        otherActions = actions[1:]
+        if (numJobs == 1):
+            bound = values[actions[0]]
+            for action in otherActions:
+                values[action] = self._searchAgainstBound(state, action, depth, bound)
+                bound = max(bound, values[action])
+        elif (len(otherActions) > 0):
+            pool = self._getPool(numJobs)
+            self._poolBound.value = values[actions[0]]
+
+            tasks = [(state, action, depth, self._generation) for action in otherActions]
+            results = pool.map(_searchActionWorker, tasks, chunksize = 1)
+            values.update(zip(otherActions, results))
+
+        bestValue = max(values.values())
+        bestActions = [action for action in legalActions if values[action] == bestValue]
+
+        numAgents = state.getNumAgents()
+        self._store(key, check, depth * numAgents, bestValue, EXACT, bestActions[0], False)
+        self._lastDepth = depth
+
+        return bestValue, bestActions
+
+    def _checkTime(self):
+        self._numNodes += 1
+
+        if (self._deadline is None or self._numNodes % TIME_CHECK_INTERVAL != 0):
+            return
+
+        if (time.time() >= self._deadline):
+            raise _SearchTimeout()
+
+    def _expectedValue(self, state, agentIndex, nextAgent, actions, remaining):
+        total = 0.0
+        for action in actions:
+            record = state.applyAction(agentIndex, action)
+            total += self._value(state, nextAgent, remaining - 1,
+                    float('-inf'), float('inf'))
+            state.undo(record)
+
+        return total / len(actions), None
+
+    def _getActionValue(self, state, action, depth, alpha):
+        """
+        Get the value of the root agent taking an action (searched to the given depth).
+        """
+
+        # Below the root, the search is done in-place (with undo) on the successor.
+        # So if the search is stopped part way, the given state is still untouched.
+        successor = state.generateSuccessor(self._rootIndex, action)
+
+        numAgents = state.getNumAgents()
+        nextAgent = (self._rootIndex + 1) % numAgents
+
+        return self._value(successor, nextAgent, depth * numAgents - 1, alpha, float('inf'))
+
+    def _getPool(self, numJobs):
+        """
+        Get the pool for parallel searches (starting it the first time, or if numJobs changed).
+        Each worker has its own copy of this engine (and its table).
+        """
+
+        if (self._pool is not None and self._poolJobs != numJobs):
+            self.closePool()
+
+        if (self._pool is None):
+            self._poolBound = parallel.getContext().Value('d', 0.0)
+            self._pool = parallel.createPool(numJobs, _initSearchWorker, (self, self._poolBound))
+            self._poolJobs = numJobs
+
+        return self._pool
+
+    def _maxValue(self, state, agentIndex, nextAgent, actions, remaining, alpha, beta):
+        bestValue = float('-inf')
+        bestAction = None
+
+        for action in actions:
+            record = state.applyAction(agentIndex, action)
+            value = self._value(state, nextAgent, remaining - 1, alpha, beta)
+            state.undo(record)
+
+            if (bestAction is None or value > bestValue):
+                bestValue = value
+                bestAction = action
+
+            alpha = max(alpha, value)
+            if (alpha >= beta):
+                break
+
+        return bestValue, bestAction
+
+    def _minValue(self, state, agentIndex, nextAgent, actions, remaining, alpha, beta):
+        bestValue = float('inf')
+        bestAction = None
+
+        for action in actions:
+            record = state.applyAction(agentIndex, action)
+            value = self._value(state, nextAgent, remaining - 1, alpha, beta)
+            state.undo(record)
+
+            if (bestAction is None or value < bestValue):
+                bestValue = value
+                bestAction = action
+
+            beta = min(beta, value)
+            if (alpha >= beta):
+                break
+
+        return bestValue, bestAction
+
+    def _orderActions(self, actions, firstAction):
+        if (firstAction is None or firstAction not in actions):
+            return actions
+
+        return [firstAction] + [action for action in actions if action != firstAction]
+
+    def _probe(self, state, agentIndex):
+        """
+        Get the (key, check, entry) for a state from the transposition table.
+        The entry is None if the state is not in the table.
+        """
+
+        # The state does not know whose turn it is, so that is part of the key.
+        key = hash((hash(state), agentIndex))
+        check = _getCheck(state, agentIndex)
+
+        entry = self._table[key % len(self._table)]
+        if (entry is not None and (entry[0] != key or entry[7] != check)):
+            entry = None
+
+        return key, check, entry
+
+    def _searchAgainstBound(self, state, action, depth, bound):
+        """
+        Get the value of a root move, only pruning if it is strictly worse than the bound.
+        """
+
+        return self._getActionValue(state, action, depth, _nextBelow(bound))
+
+    def _searchRoot(self, state, depth, firstAction):
+        """
+        Returns (value, best action, complete),
+        where complete is true if no part of the tree was cut off by the depth.
+        """
+
+        numCutoffs = self._numCutoffs
+
+        alpha = float('-inf')
+        bestValue = float('-inf')
+        bestAction = None
+
+        actions = self._orderActions(state.getLegalActions(self._rootIndex), firstAction)
+        for action in actions:
+            value = self._getActionValue(state, action, depth, alpha)
+
+            if (bestAction is None or value > bestValue):
+                bestValue = value
+                bestAction = action
+
+            alpha = max(alpha, value)
+
+        return bestValue, bestAction, (self._numCutoffs == numCutoffs)
+
+    def _store(self, key, check, remaining, value, flag, bestAction, complete):
+        slot = key % len(self._table)
+
+        # Prefer to keep entries from deeper searches (of the current position).
+        entry = self._table[slot]
+        if (entry is not None and entry[0] != key
+                and entry[6] == self._generation and entry[1] > remaining):
+            return
+
+        self._table[slot] = (key, remaining, value, flag, bestAction, complete, self._generation,
+                check)
+
+    def _value(self, state, agentIndex, remaining, alpha, beta):
+        """
+        Get the value of a state where it is agentIndex's turn
+        and there are remaining moves left before the depth limit.
+        """
+
+        self._checkTime()
+
+        if (state.isOver()):
+            return self._evaluationFunction(state)
+
+        if (remaining == 0):
+            self._numCutoffs += 1
+            return self._evaluationFunction(state)
+
+        key, check, entry = self._probe(state, agentIndex)
+
+        bestAction = None
+        if (entry is not None):
+            bestAction = entry[4]
+
+            if (entry[1] >= remaining):
+                value, flag = entry[2], entry[3]
+                if (flag == EXACT
+                        or (flag == LOWER_BOUND and value >= beta)
+                        or (flag == UPPER_BOUND and value <= alpha)):
+                    # The stored search may have been cut off by the depth.
+                    if (not entry[5]):
+                        self._numCutoffs += 1
+
+                    return value
+
+        numCutoffs = self._numCutoffs
+        nextAgent = (agentIndex + 1) % state.getNumAgents()
+        actions = self._orderActions(state.getLegalActions(agentIndex), bestAction)
+
+        if (agentIndex == self._rootIndex):
+            value, bestAction = self._maxValue(state, agentIndex, nextAgent, actions,
+                    remaining, alpha, beta)
+        elif (self._expectimax):
+            value, bestAction = self._expectedValue(state, agentIndex, nextAgent, actions,
+                    remaining)
+        else:
+            value, bestAction = self._minValue(state, agentIndex, nextAgent, actions,
+                    remaining, alpha, beta)
+
+        # Chance nodes always average every action, so their values are exact.
+        # Max and min nodes may have been cut off against the bounds they were searched with.
+        flag = EXACT
+        if (agentIndex == self._rootIndex or not self._expectimax):
+            if (value <= alpha):
+                flag = UPPER_BOUND
+            elif (value >= beta):
+                flag = LOWER_BOUND
+
+        self._store(key, check, remaining, value, flag, bestAction,
+                self._numCutoffs == numCutoffs)
+
+        return value
+
+class _SearchTimeout(Exception):
+    """
+    Raised (and caught) inside a search when the time limit has run out.
+    """
+
+    pass
+
+def _getCheck(state, agentIndex):
+    """
+    Get a second hash of a state, to verify transposition table hits with.
+    It is built from the raw fields of the state (instead of the Zobrist keys that the state's
+    own hash uses), so a state with a colliding hash will almost never have a matching check.
+    """
+
+    agents = tuple((agentState.getPosition(), agentState.getDirection(),
+            agentState.getScaredTimer()) for agentState in state.getAgentStates())
+
+    return hash((agentIndex, state.getScore(), state.getNumFood(), state.getNumCapsules(), agents))
+
+def _initSearchWorker(engine, bound):
+    global _workerSearch
+    _workerSearch = (engine, bound)
+
+def _nextBelow(value):
+    """
+    Get the largest float that is less than value
+    (like `math.nextafter(value, -inf)`, which needs Python 3.9).
+    """
+
+    if (value != value or value == float('-inf')):
+        return value
+
+    if (value == 0.0):
+        return -5e-324
+
+    # Floats of the same sign are ordered like their bits.
+    bits = struct.unpack('<q', struct.pack('<d', value))[0]
+    if (value > 0.0):
+        bits -= 1
+    else:
+        bits += 1
+
+    return struct.unpack('<d', struct.pack('<q', bits))[0]
+
+def _searchActionWorker(task):
+    """
+    Search a single root move against the shared bound, and then update the bound.
+    """
+
+    engine, bound = _workerSearch
+    state, action, depth, generation = task
+
+    # Entries from the worker's earlier searches can be replaced, like in the main engine.
+    engine._generation = generation
+
+    value = engine._searchAgainstBound(state, action, depth, bound.value)
+
+    with bound.get_lock():
+        if (value > bound.value):
+            bound.value = value
+
+    return value
@@ -1,5 +1,4 @@
 from pacai.core.actions import Actions
-from pacai.core.directions import Directions
 from pacai.core.search.problem import SearchProblem
 
 class FoodSearchProblem(SearchProblem):
@@ -18,6 +17,7 @@ class FoodSearchProblem(SearchProblem):
 
         self.start = (startingGameState.getPacmanPosition(), startingGameState.getFood())
         self.walls = startingGameState.getWalls()
+        self.layout = startingGameState.getInitialLayout()
         self.startingGameState = startingGameState
         self.heuristicInfo = {}  # A dictionary for the heuristic to store information
 
@@ -34,14 +34,10 @@ class FoodSearchProblem(SearchProblem):
 
         successors = []
         self._numExpanded += 1
-        for direction in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            x, y = state[0]
-            dx, dy = Actions.directionToVector(direction)
-            nextx, nexty = int(x + dx), int(y + dy)
-            if not self.walls[nextx][nexty]:
-                nextFood = state[1].copy()
-                nextFood[nextx][nexty] = False
-                successors.append((((nextx, nexty), nextFood), direction, 1))
+        for direction, (nextx, nexty) in self.layout.getCardinalMoves(state[0]):
+            nextFood = state[1].copy()
+            nextFood[nextx][nexty] = False
+            successors.append((((nextx, nexty), nextFood), direction, 1))
 
         return successors
 
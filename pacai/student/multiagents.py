@@ -113,6 +113,11 @@ class MinimaxAgent(MultiAgentSearchAgent):
     `pacai.core.gamestate.AbstractGameState.generateSuccessor`:
     Get the successor game state after an agent takes an action.
 
+    `pacai.core.gamestate.AbstractGameState.applyAction`:
+    Apply an action to a game state in-place and get back an undo record.
+    Passing the record to `pacai.core.gamestate.AbstractGameState.undo` restores the state.
+    This avoids allocating a new state for every node in the search tree.
+
     `pacai.core.directions.Directions.STOP`:
     The stop direction, which is always legal, but you may not want to include in your search.
 
@@ -128,6 +133,9 @@ class MinimaxAgent(MultiAgentSearchAgent):
         super().__init__(index, **kwargs)
 
     def getAction(self, gameState):
+        if (self.useSearchEngine()):
+            return self.getEngineAction(gameState)
+
         def value(agent, depth, s):
             if s.isLose() or s.isWin() or depth == self.getTreeDepth():
                 return self.getEvaluationFunction()(s)
@@ -139,7 +147,11 @@ class MinimaxAgent(MultiAgentSearchAgent):
         def maxValue(agent, depth, s):
             max = float('-inf')
             for action in s.getLegalActions(0):
-                temp_value = value(1, depth, s.generateSuccessor(0, action))
+                record = s.applyAction(0, action)
+                try:
+                    temp_value = value(1, depth, s)
+                finally:
+                    s.undo(record)
                 if temp_value > max:
                     max = temp_value
             return max
@@ -152,7 +164,11 @@ class MinimaxAgent(MultiAgentSearchAgent):
 
             min = float('inf')
             for action in s.getLegalActions(agent):
-                temp_value = value(nextAgent, depth, s.generateSuccessor(agent, action))
+                record = s.applyAction(agent, action)
+                try:
+                    temp_value = value(nextAgent, depth, s)
+                finally:
+                    s.undo(record)
                 if temp_value < min:
                     min = temp_value
             return min
@@ -184,6 +200,9 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         super().__init__(index, **kwargs)
 
     def getAction(self, gameState):
+        if (self.useSearchEngine()):
+            return self.getEngineAction(gameState)
+
         def value(agent, depth, s, alpha, beta):
             if s.isLose() or s.isWin() or depth == self.getTreeDepth():
                 return self.getEvaluationFunction()(s)
@@ -195,7 +214,11 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         def maxValue(agent, depth, s, alpha, beta):
             max_val = float('-inf')
             for action in s.getLegalActions(0):
-                temp_value = value(1, depth, s.generateSuccessor(0, action), alpha, beta)
+                record = s.applyAction(0, action)
+                try:
+                    temp_value = value(1, depth, s, alpha, beta)
+                finally:
+                    s.undo(record)
                 if temp_value > max_val:
                     max_val = temp_value
                 alpha = max(alpha, temp_value)
@@ -211,8 +234,11 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
 
             min_val = float('inf')
             for action in s.getLegalActions(agent):
-                temp_value = value(nextAgent, depth,
-                                s.generateSuccessor(agent, action), alpha, beta)
+                record = s.applyAction(agent, action)
+                try:
+                    temp_value = value(nextAgent, depth, s, alpha, beta)
+                finally:
+                    s.undo(record)
                 if temp_value < min_val:
                     min_val = temp_value
                 beta = min(beta, temp_value)
@@ -252,6 +278,9 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         super().__init__(index, **kwargs)
 
     def getAction(self, gameState):
+        if (self.useSearchEngine()):
+            return self.getEngineAction(gameState, expectimax = True)
+
         def value(agent, depth, s):
             if s.isLose() or s.isWin() or depth == self.getTreeDepth():
                 return self.getEvaluationFunction()(s)
@@ -263,7 +292,11 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         def maxValue(agent, depth, s):
             max = float('-inf')
             for action in s.getLegalActions(0):
-                temp_value = value(1, depth, s.generateSuccessor(0, action))
+                record = s.applyAction(0, action)
+                try:
+                    temp_value = value(1, depth, s)
+                finally:
+                    s.undo(record)
                 if temp_value > max:
                     max = temp_value
             return max
@@ -276,7 +309,11 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
 
             sum = 0
             for action in s.getLegalActions(agent):
-                temp_value = value(nextAgent, depth, s.generateSuccessor(agent, action))
+                record = s.applyAction(agent, action)
+                try:
+                    temp_value = value(nextAgent, depth, s)
+                finally:
+                    s.undo(record)
                 sum = sum + temp_value
             return sum / len(s.getLegalActions(agent))
 
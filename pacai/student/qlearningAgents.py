@@ -1,6 +1,13 @@
+import array
+
 from pacai.agents.learning.reinforcement import ReinforcementAgent
+from pacai.core.featureExtractors import FeatureIndex
 from pacai.util import reflection
 from pacai.util.probability import flipCoin, random
+from pacai.util.qtable import QTable
+
+# The number of (most recent) states that ApproximateQAgent keeps feature vectors for.
+FEATURE_CACHE_SIZE = 2
 
 class QLearningAgent(ReinforcementAgent):
     """
@@ -43,11 +50,48 @@ class QLearningAgent(ReinforcementAgent):
     DESCRIPTION: <Write something here so we know what you did.>
     """
 
-    def __init__(self, index, **kwargs):
+    def __init__(self, index, stateKey = None, **kwargs):
         super().__init__(index, **kwargs)
 
+        if (stateKey is not None):
+            stateKey = reflection.qualifiedImport(stateKey)
+
         # You can initialize Q-values here.
-        self.values = {}
+        # States are interned, so each state is only stored once (see `pacai.util.qtable.QTable`).
+        self.values = QTable(stateKey)
+
+    def addParameterChanges(self, changes):
+        """
+        Add changes to the Q-values: {(state key, action): change}
+        (see `QLearningAgent.getParameterChanges`).
+        This is how a learner merges what its training workers learned.
+        """
+
+        self.values.addValues(changes)
+
+    def getParameterChanges(self, parameters):
+        """
+        Get how much each Q-value has changed since this agent had the given parameters
+        (see `QLearningAgent.getParameters`): {(state key, action): change}.
+        """
+
+        changes = {}
+        for pair, value in self.values.getValues().items():
+            if (value != parameters.get(pair, 0.0)):
+                changes[pair] = value - parameters.get(pair, 0.0)
+
+        return changes
+
+    def getParameters(self):
+        """
+        Get a snapshot of what this agent has learned (that can be sent to other processes):
+        every Q-value, {(state key, action): value}.
+        State hashes do not depend on the process, so states work as keys in every process.
+        This covers the whole table, so parallel training only sends the changes
+        (see `QLearningAgent.getParameterChanges`) to its workers.
+        """
+
+        return self.values.getValues()
 
     def getQValue(self, state, action):
         """
@@ -56,7 +100,14 @@ class QLearningAgent(ReinforcementAgent):
         Should return 0.0 if the (state, action) pair has never been seen.
         """
 
-        return self.values.get((state, action), 0.0)
+        return self.values.getQValue(state, action)
+
+    def getQValues(self, state, actions):
+        """
+        Get the Q-Value of each of the actions in a state (in the same order).
+        """
+
+        return self.values.getQValues(state, actions)
 
     def getValue(self, state):
         """
@@ -75,8 +126,7 @@ class QLearningAgent(ReinforcementAgent):
             return 0.0
 
         max_value = float("-inf")
-        for action in possible_actions:
-            qvalue = self.getQValue(state, action)
+        for qvalue in self.getQValues(state, possible_actions):
             if (max_value == float("-inf")) or (max_value <= qvalue):
                 max_value = qvalue
 
@@ -100,8 +150,7 @@ class QLearningAgent(ReinforcementAgent):
 
         max_value = float("-inf")
         max_action = ""
-        for action in possible_actions:
-            qvalue = self.getQValue(state, action)
+        for action, qvalue in zip(possible_actions, self.getQValues(state, possible_actions)):
             if (max_value == float("-inf")) or (max_value < qvalue):
                 max_value = qvalue
                 max_action = action
@@ -110,10 +159,16 @@ class QLearningAgent(ReinforcementAgent):
 
         return max_action
 
+    def setParameters(self, parameters):
+        """
+        Replace all the Q-values with a snapshot from `QLearningAgent.getParameters`.
+        """
+
+        self.values.setValues(parameters)
+
     def update(self, state, action, nextState, reward):
-        self.values[(state, action)] = (((1 - self.getAlpha()) * self.getQValue(state, action))
-                                        + (self.getAlpha() * (reward + (self.getDiscountRate()
-                                            * self.getValue(nextState)))))
+        target = reward + (self.getDiscountRate() * self.getValue(nextState))
+        self.values.update(state, action, target, self.getAlpha())
 
     def getAction(self, state):
         possible_actions = self.getLegalActions(state)
@@ -177,27 +232,141 @@ class ApproximateQAgent(PacmanQAgent):
         self.featExtractor = reflection.qualifiedImport(extractor)
 
         # You might want to initialize weights here.
-        self.weights = {}
+        # Each feature has a fixed position in the weights (see `ApproximateQAgent.getWeights`).
+        self.featureIndex = FeatureIndex(getattr(self.featExtractor, 'FEATURES', ()))
+        self.weights = array.array('d', [0.0]) * len(self.featureIndex)
+
+        # The feature vectors of the most recent states: {state: {action: vector}}.
+        # An update needs the features of the state it left and the state it reached,
+        # and those are the same ones that getAction needs.
+        self._featureCache = {}
+
+    def addParameterChanges(self, changes):
+        """
+        Add changes to the weights: {feature: change} (see `ApproximateQAgent.getParameterChanges`).
+        This is how a learner merges what its training workers learned.
+        """
+
+        for feature, change in changes.items():
+            self.weights[self._getWeightIndex(feature)] += change
+
+    # Override
+    def clearExperience(self):
+        super().clearExperience()
+        self._featureCache.clear()
+
+    def getFeatureVector(self, state, action):
+        """
+        Get the sparse feature vector (indexes, values) of taking an action in a state
+        (see `pacai.core.featureExtractors.FeatureIndex.vectorize`).
+        The features of each (state, action) are only extracted once per step.
+        """
+
+        stateVectors = self._featureCache.get(state)
+        if (stateVectors is None):
+            if (len(self._featureCache) >= FEATURE_CACHE_SIZE):
+                del self._featureCache[next(iter(self._featureCache))]
+
+            stateVectors = {}
+            self._featureCache[state] = stateVectors
+
+        vector = stateVectors.get(action)
+        if (vector is None):
+            features = self.featExtractor.getFeatures(self, state, action)
+            vector = self.featureIndex.vectorize(features)
+            stateVectors[action] = vector
+            self._growWeights()
+
+        return vector
+
+    def getParameterChanges(self, parameters):
+        """
+        Get how much each weight has changed since this agent had the given parameters
+        (see `ApproximateQAgent.getParameters`): {feature: change}.
+        """
+
+        changes = {}
+        for feature, weight in self.getWeights().items():
+            if (weight != parameters.get(feature, 0.0)):
+                changes[feature] = weight - parameters.get(feature, 0.0)
+
+        return changes
+
+    def getParameters(self):
+        """
+        Get a snapshot of what this agent has learned (that can be sent to other processes).
+        Features should mean the same thing in every process (e.g. names, not game states).
+        """
+
+        return self.getWeights()
 
     def getQValue(self, state, action):
-        features = self.featExtractor.getFeatures(self, state, action)
-        qvalue = 0
+        return self._getVectorValue(self.getFeatureVector(state, action))
 
-        for feature in features:
-            if feature not in self.weights:
-                self.weights[feature] = 0
-            qvalue = qvalue + (features[feature] * self.weights[feature])
+    def getQValues(self, state, actions):
+        return [self.getQValue(state, action) for action in actions]
 
-        return qvalue
+    def getWeights(self):
+        """
+        Get the weight of every feature: {feature: weight}.
+        """
+
+        return dict(zip(self.featureIndex.getFeatures(), self.weights))
+
+    def makeExperience(self, state, action, nextState, reward):
+        """
+        Remember the feature vectors (instead of the states) for experience replay:
+        the vector of the action taken, and the vectors of every action in the next state.
+        """
+
+        nextVectors = [self.getFeatureVector(nextState, nextAction)
+                for nextAction in self.getLegalActions(nextState)]
+
+        return (self.getFeatureVector(state, action), action, nextVectors, reward)
+
+    def setParameters(self, parameters):
+        """
+        Replace all the weights with a snapshot from `ApproximateQAgent.getParameters`.
+        Features keep their positions, so cached feature vectors stay valid.
+        """
+
+        for index in range(len(self.weights)):
+            self.weights[index] = 0.0
+
+        for feature, weight in parameters.items():
+            self.weights[self._getWeightIndex(feature)] = weight
 
     def update(self, state, action, nextState, reward):
-        features = self.featExtractor.getFeatures(self, state, action)
+        indexes, values = self.getFeatureVector(state, action)
         correction = ((reward + (self.discountRate * self.getValue(nextState)))
                       - self.getQValue(state, action))
 
-        for feature in features:
-            self.weights[feature] = (self.weights[feature]
-                                    + (self.getAlpha() * correction * features[feature]))
+        weights = self.weights
+        step = self.getAlpha() * correction
+        for i in range(len(indexes)):
+            weights[indexes[i]] += step * values[i]
+
+    def updateBatch(self, experiences):
+        """
+        Take a single step along the average gradient of the batch.
+        """
+
+        gradient = {}
+        for (vector, action, nextVectors, reward) in experiences:
+            nextValue = 0.0
+            if (len(nextVectors) > 0):
+                nextValue = max(self._getVectorValue(nextVector) for nextVector in nextVectors)
+
+            correction = (reward + (self.discountRate * nextValue)) - self._getVectorValue(vector)
+
+            indexes, values = vector
+            for i in range(len(indexes)):
+                gradient[indexes[i]] = gradient.get(indexes[i], 0.0) + correction * values[i]
+
+        weights = self.weights
+        step = self.getAlpha() / len(experiences)
+        for index, value in gradient.items():
+            weights[index] += step * value
 
     def final(self, state):
         """
@@ -211,4 +380,29 @@ class ApproximateQAgent(PacmanQAgent):
         if self.episodesSoFar == self.numTraining:
             # You might want to print your weights here for debugging.
             # *** Your Code Here ***
-            print(self.weights)
+            print(self.getWeights())
+
+    def _getVectorValue(self, vector):
+        indexes, values = vector
+        weights = self.weights
+
+        qvalue = 0.0
+        for i in range(len(indexes)):
+            qvalue += values[i] * weights[indexes[i]]
+
+        return qvalue
+
+    def _getWeightIndex(self, feature):
+        index = self.featureIndex.getIndex(feature)
+        self._growWeights()
+
+        return index
+
+    def _growWeights(self):
+        """
+        Give any new features a weight of zero.
+        """
+
+        newFeatures = len(self.featureIndex) - len(self.weights)
+        if (newFeatures > 0):
+            self.weights.extend(array.array('d', [0.0]) * newFeatures)
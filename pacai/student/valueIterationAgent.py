@@ -1,4 +1,11 @@
 from pacai.agents.learning.value import ValueEstimationAgent
+from pacai.core.mdp import CompiledMDP
+
+SYNCHRONOUS = 'synchronous'
+ASYNCHRONOUS = 'asynchronous'
+PRIORITIZED = 'prioritized'
+
+VALUE_ITERATION_MODES = [SYNCHRONOUS, ASYNCHRONOUS, PRIORITIZED]
 
 class ValueIterationAgent(ValueEstimationAgent):
     """
@@ -30,7 +37,8 @@ class ValueIterationAgent(ValueEstimationAgent):
     you should return None.
     """
 
-    def __init__(self, index, mdp, discountRate = 0.9, iters = 100, **kwargs):
+    def __init__(self, index, mdp, discountRate = 0.9, iters = 100, tolerance = 0.0,
+            mode = SYNCHRONOUS, **kwargs):
         super().__init__(index, **kwargs)
 
         self.mdp = mdp
@@ -39,24 +47,24 @@ class ValueIterationAgent(ValueEstimationAgent):
         self.values = {}  # A dictionary which holds the q-values for each state.
 
         # Compute the values here.
-        while self.iters > 0:
-            temp_values = self.values.copy()
-            all_states = mdp.getStates()
-            for state in all_states:
-                possible_actions = mdp.getPossibleActions(state)
-                possible_qvalues = []
-                for action in possible_actions:
-                    next_states_info = mdp.getTransitionStatesAndProbs(state, action)
-                    qvalue = 0
-                    for next_state_info in next_states_info:
-                        next_state = next_state_info[0]
-                        probability = next_state_info[1]
-                        qvalue = qvalue + (probability * (mdp.getReward(state, action, next_state)
-                                    + (self.discountRate * temp_values.get(next_state, 0.0))))
-                    possible_qvalues.append(qvalue)
-                if len(possible_qvalues) != 0:
-                    self.values[state] = max(possible_qvalues)
-            self.iters = self.iters - 1
+        # The mdp is compiled into arrays once, instead of being asked about every state
+        # on every iteration (see `pacai.core.mdp.CompiledMDP`).
+        # Iteration stops early once no value changes by more than the tolerance.
+        # The mode picks between synchronous sweeps, asynchronous (in-place) sweeps,
+        # and prioritized sweeping (where iters is the number of single state updates).
+        compiled = CompiledMDP(mdp)
+
+        if (mode == SYNCHRONOUS):
+            solve = compiled.valueIteration
+        elif (mode == ASYNCHRONOUS):
+            solve = compiled.asynchronousValueIteration
+        elif (mode == PRIORITIZED):
+            solve = compiled.prioritizedSweeping
+        else:
+            raise ValueError("Unknown value iteration mode: '%s'." % (mode))
+
+        values, self.numIterations = solve(discountRate, iters, tolerance)
+        self.values = compiled.getValueDict(values)
 
     def getValue(self, state):
         """
@@ -0,0 +1,53 @@
+"""
+Running independent jobs (e.g. whole games) across a pool of processes.
+"""
+
+import multiprocessing
+import random
+
+def getContext():
+    """
+    Get the multiprocessing context to use.
+
+    Fork is preferred (when the platform supports it),
+    since then the worker's initial arguments (e.g. agents) are inherited instead of pickled.
+    Agents may hold things that cannot be pickled (like lambdas).
+    """
+
+    if ('fork' in multiprocessing.get_all_start_methods()):
+        return multiprocessing.get_context('fork')
+
+    return multiprocessing.get_context()
+
+def createPool(numJobs, initializer = None, initargs = ()):
+    """
+    Create a pool of numJobs processes (that can be used for many rounds of tasks).
+    Each worker process calls initializer(*initargs) once before running any tasks.
+    """
+
+    if (numJobs < 1):
+        raise ValueError('The number of jobs must be positive, got %d.' % (numJobs))
+
+    return getContext().Pool(numJobs, initializer = initializer, initargs = initargs)
+
+def getSeeds(seed, count):
+    """
+    Derive a seed for each of count jobs from a master seed.
+    The same master seed always gives the same seeds,
+    no matter how many processes the jobs are spread across.
+    """
+
+    rng = random.Random(seed)
+    return [rng.getrandbits(32) for i in range(count)]
+
+def runInPool(function, tasks, numJobs, initializer = None, initargs = ()):
+    """
+    Call function on each task using a pool of numJobs processes.
+    Each worker process calls initializer(*initargs) once before running any tasks.
+
+    Results are returned in the same order as the tasks,
+    regardless of the order that they finish in.
+    """
+
+    with createPool(numJobs, initializer, initargs) as pool:
+        return pool.map(function, tasks, chunksize = 1)
@@ -0,0 +1,196 @@
+"""
+A compact table of Q-values.
+"""
+
+import array
+
+class QTable(object):
+    """
+    A table of Q-values for (state, action) pairs.
+
+    Each state (and action) that gets a value is interned to an integer index,
+    and all the values live in a single flat array with a row for each state
+    and a column for each action.
+    So a state is only stored once (instead of once per action),
+    and each value takes 8 bytes (instead of a float object and a dict entry).
+    Pairs that were never set have a value of 0.0 (and reading them does not grow the table).
+
+    A stateKey function can be given to index states by something smaller than the state itself
+    (e.g. just the parts of a state that the agent cares about).
+    States with the same key share their values.
+    """
+
+    def __init__(self, stateKey = None):
+        self._stateKey = stateKey
+
+        # {state key: row}
+        self._stateIndexes = {}
+
+        # {action: column}
+        self._actionIndexes = {}
+        self._actions = []
+
+        # Row-major values, numStates x numActions.
+        self._values = array.array('d')
+
+    def addValues(self, changes):
+        """
+        Add to the values of many pairs at once: {(state key, action): change}
+        (e.g. the difference between two `QTable.getValues` snapshots).
+        """
+
+        for (key, action), change in changes.items():
+            # Get the index first, since adding an action replaces the values.
+            index = self._getKeyIndex(key, action)
+            self._values[index] += change
+
+    def getActions(self):
+        """
+        Get all the actions that have a value (in column order).
+        """
+
+        return list(self._actions)
+
+    def getNumStates(self):
+        return len(self._stateIndexes)
+
+    def getQValue(self, state, action):
+        row = self._stateIndexes.get(self._getKey(state))
+        column = self._actionIndexes.get(action)
+        if (row is None or column is None):
+            return 0.0
+
+        return self._values[row * len(self._actions) + column]
+
+    def getQValues(self, state, actions):
+        """
+        Get the value of each of the actions in a state (in the same order).
+        The state is only looked up once.
+        """
+
+        row = self._stateIndexes.get(self._getKey(state))
+        if (row is None):
+            return [0.0] * len(actions)
+
+        values = self._values
+        start = row * len(self._actions)
+        actionIndexes = self._actionIndexes
+
+        qValues = []
+        for action in actions:
+            column = actionIndexes.get(action)
+            if (column is None):
+                qValues.append(0.0)
+            else:
+                qValues.append(values[start + column])
+
+        return qValues
+
+    def getValue(self, state, actions):
+        """
+        Get the best value of the actions in a state, or 0.0 if there are no actions.
+        """
+
+        if (len(actions) == 0):
+            return 0.0
+
+        return max(self.getQValues(state, actions))
+
+    def getValues(self):
+        """
+        Get a snapshot of every pair in the table: {(state key, action): value}.
+        Keys are used instead of states, so a snapshot can be loaded into another table
+        (see `QTable.setValues`), even in another process.
+        """
+
+        width = len(self._actions)
+
+        values = {}
+        for key, row in self._stateIndexes.items():
+            for column in range(width):
+                values[(key, self._actions[column])] = self._values[row * width + column]
+
+        return values
+
+    def setQValue(self, state, action, value):
+        # Get the index first, since adding an action replaces the values.
+        index = self._getIndex(state, action)
+        self._values[index] = value
+
+    def setValues(self, values):
+        """
+        Replace all the values with a snapshot from `QTable.getValues`.
+        Pairs that are not in the snapshot go back to 0.0.
+        """
+
+        for index in range(len(self._values)):
+            self._values[index] = 0.0
+
+        for (key, action), value in values.items():
+            index = self._getKeyIndex(key, action)
+            self._values[index] = value
+
+    def update(self, state, action, target, alpha):
+        """
+        Move the value of a pair towards the target by the learning rate (alpha).
+        Returns the new value.
+        """
+
+        index = self._getIndex(state, action)
+
+        value = (1 - alpha) * self._values[index] + alpha * target
+        self._values[index] = value
+
+        return value
+
+    def _addAction(self, action):
+        """
+        Add a column for a new action (which needs every row to be moved).
+        """
+
+        oldWidth = len(self._actions)
+        newWidth = oldWidth + 1
+
+        values = array.array('d', [0.0]) * (len(self._stateIndexes) * newWidth)
+        for row in range(len(self._stateIndexes)):
+            oldRow = self._values[row * oldWidth:(row + 1) * oldWidth]
+            values[row * newWidth:row * newWidth + oldWidth] = oldRow
+
+        self._values = values
+        self._actionIndexes[action] = oldWidth
+        self._actions.append(action)
+
+        return oldWidth
+
+    def _getIndex(self, state, action):
+        """
+        Get the index of a pair in the values, adding the state and action if they are new.
+        """
+
+        return self._getKeyIndex(self._getKey(state), action)
+
+    def _getKey(self, state):
+        if (self._stateKey is None):
+            return state
+
+        return self._stateKey(state)
+
+    def _getKeyIndex(self, key, action):
+        """
+        Get the index of a (state key, action) pair, adding the key and action if they are new.
+        """
+
+        column = self._actionIndexes.get(action)
+        if (column is None):
+            column = self._addAction(action)
+
+        row = self._stateIndexes.get(key)
+        if (row is None):
+            row = len(self._stateIndexes)
+            self._stateIndexes[key] = row
+            self._values.extend(array.array('d', [0.0]) * len(self._actions))
+
+        return row * len(self._actions) + column
+
+    def __len__(self):
+        return self.getNumStates()
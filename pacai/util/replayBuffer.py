@@ -0,0 +1,91 @@
+"""
+A fixed-size memory of experiences (transitions) for reinforcement learning.
+"""
+
+import array
+import random
+
+class ReplayBuffer(object):
+    """
+    A ring buffer of (state, action, nextState, reward) experiences.
+
+    Each field is kept in its own preallocated column,
+    and once the buffer is full the newest experience replaces the oldest one.
+    What gets stored as the "state" and "nextState" is up to the learner
+    (e.g. feature vectors instead of whole game states).
+    """
+
+    def __init__(self, capacity):
+        capacity = int(capacity)
+        if (capacity < 1):
+            raise ValueError('The replay capacity must be positive, got %d.' % (capacity))
+
+        self._capacity = capacity
+        self._size = 0
+
+        # Where the next experience will go.
+        self._next = 0
+
+        self._states = [None] * capacity
+        self._actions = [None] * capacity
+        self._nextStates = [None] * capacity
+        self._rewards = array.array('d', [0.0]) * capacity
+
+    def add(self, state, action, nextState, reward):
+        index = self._next
+
+        self._states[index] = state
+        self._actions[index] = action
+        self._nextStates[index] = nextState
+        self._rewards[index] = reward
+
+        self._next = (index + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+    def clear(self):
+        """
+        Forget every experience (keeping the preallocated columns).
+        """
+
+        for index in range(self._capacity):
+            self._states[index] = None
+            self._actions[index] = None
+            self._nextStates[index] = None
+            self._rewards[index] = 0.0
+
+        self._size = 0
+        self._next = 0
+
+    def getCapacity(self):
+        return self._capacity
+
+    def get(self, index):
+        """
+        Get an experience, where index 0 is the oldest.
+        """
+
+        if (index < 0 or index >= self._size):
+            raise IndexError('Replay index out of range: %d.' % (index))
+
+        index = (self._next - self._size + index) % self._capacity
+        return (self._states[index], self._actions[index], self._nextStates[index],
+                self._rewards[index])
+
+    def sample(self, batchSize, rng = random):
+        """
+        Get a batch of experiences.
+        The newest experience is always in the batch (so every experience is learned from),
+        and the rest are drawn uniformly (with replacement).
+        """
+
+        if (self._size == 0):
+            return []
+
+        batch = [self.get(self._size - 1)]
+        for i in range(batchSize - 1):
+            batch.append(self.get(rng.randrange(self._size)))
+
+        return batch
+
+    def __len__(self):
+        return self._size
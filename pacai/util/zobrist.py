@@ -0,0 +1,67 @@
+"""
+Zobrist hashing.
+
+Each component of a state (e.g. "food at (3, 4)" or "agent at (1, 1)")
+is assigned a fixed random key,
+and the hash of a state is the XOR of the keys of all of its components.
+Since XOR is its own inverse, a hash can be updated incrementally when a single component
+changes by XORing out the old key and XORing in the new one.
+"""
+
+import hashlib
+
+# Keys (and so XORs of keys) stay below 2^61 - 1,
+# so Python's hash() of a Zobrist hash is the hash itself.
+KEY_BITS = 60
+DEFAULT_SEED = 4
+
+class ZobristTable(object):
+    """
+    A lazily-filled table of pseudo-random keys.
+    Any tuple of numbers, strings, booleans, and tuples of them can be used as a feature.
+
+    Each key is a seeded digest of the feature's repr (with equal numbers written the same way),
+    so a feature has the same key no matter what order features are seen in
+    or what process is asking (unlike Python's own randomized string hashing).
+    Keys are cached after the first lookup.
+    """
+
+    def __init__(self, seed = DEFAULT_SEED):
+        self._seed = seed
+        self._keys = {}
+
+    def getKey(self, *feature):
+        key = self._keys.get(feature)
+        if (key is None):
+            key = self._computeKey(feature)
+            self._keys[feature] = key
+
+        return key
+
+    def _computeKey(self, feature):
+        text = '%r %r' % (self._seed, _normalize(feature))
+        digest = hashlib.blake2b(text.encode(), digest_size = 8).digest()
+        return int.from_bytes(digest, 'big') >> (64 - KEY_BITS)
+
+def _normalize(feature):
+    """
+    Get a version of a feature where values that are equal have the same repr,
+    e.g. an agent between grid points can be at (8.0, 5.0), which is equal to (8, 5).
+    """
+
+    if (isinstance(feature, tuple)):
+        return tuple(_normalize(value) for value in feature)
+
+    if (isinstance(feature, bool)):
+        return int(feature)
+
+    if (isinstance(feature, float) and feature.is_integer()):
+        return int(feature)
+
+    return feature
+
+_defaultTable = ZobristTable()
+
+# Get the key for a feature from the shared process-wide table.
+# This is bound directly (instead of wrapped) since it is called on every state change.
+getKey = _defaultTable.getKey
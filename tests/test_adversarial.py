@@ -0,0 +1,184 @@
+import random
+import sys
+import unittest
+
+from pacai.agents.search.multiagent import MOVE_TIME_FRACTION
+from pacai.bin.pacman import PacmanGameState
+from pacai.core.eval import score
+from pacai.core.layout import getLayout
+from pacai.core.search import adversarial
+from pacai.core.search.adversarial import AdversarialSearch
+from pacai.student.multiagents import AlphaBetaAgent
+
+SEED = 7
+NUM_STATES = 5
+DEPTH = 2
+
+"""
+Test the adversarial search engine against a plain (tree) search.
+"""
+class AdversarialSearchTest(unittest.TestCase):
+    def test_fixed_depth(self):
+        for expectimax in [False, True]:
+            engine = AdversarialSearch(score, expectimax = expectimax, tableSize = 1024)
+
+            # The table is kept between searches, which should not change any values.
+            for state in self._getStates():
+                value, action = engine.search(state, DEPTH)
+                expected = _treeValue(state, 0, DEPTH * state.getNumAgents(), expectimax)
+
+                self.assertAlmostEqual(expected, value)
+                self.assertIn(action, state.getLegalActions(0))
+
+    def test_iterative_deepening(self):
+        engine = AdversarialSearch(score)
+
+        state = PacmanGameState(getLayout('smallClassic'))
+        initialHash = hash(state)
+
+        action = engine.iterativeDeepening(state, 0.05)
+        self.assertIn(action, state.getLegalActions(0))
+        self.assertGreaterEqual(engine.getLastDepth(), 1)
+        self.assertEqual(initialHash, hash(state))
+
+        # The maximum depth is reached well before the time limit.
+        engine.iterativeDeepening(state, 60, maxDepth = 3)
+        self.assertEqual(3, engine.getLastDepth())
+
+    def test_parallel(self):
+        for expectimax in [False, True]:
+            for state in self._getStates():
+                expectedValue, expectedAction = AdversarialSearch(score,
+                        expectimax = expectimax).search(state, DEPTH)
+
+                results = []
+                for numJobs in [1, 2, 3]:
+                    engine = AdversarialSearch(score, expectimax = expectimax)
+                    results.append(engine.searchParallel(state, DEPTH, numJobs))
+                    engine.closePool()
+
+                # Every best move is found, no matter how many processes are used.
+                value, bestActions = results[0]
+                self.assertAlmostEqual(expectedValue, value)
+                self.assertIn(expectedAction, bestActions)
+                self.assertEqual(results[0], results[1])
+                self.assertEqual(results[0], results[2])
+
+        # The processes are kept between searches (and the results stay the same).
+        engine = AdversarialSearch(score)
+        states = self._getStates()
+        expected = [AdversarialSearch(score).searchParallel(state, DEPTH, 1) for state in states]
+
+        results = [engine.searchParallel(states[0], DEPTH, 2)]
+        pool = engine._pool
+        for state in states[1:]:
+            results.append(engine.searchParallel(state, DEPTH, 2))
+            self.assertIs(pool, engine._pool)
+
+        self.assertEqual(expected, results)
+
+        engine.closePool()
+        self.assertIsNone(engine._pool)
+
+        # Agents stop their processes at the end of the game.
+        agent = AlphaBetaAgent(0, numJobs = 2)
+        agent.getAction(states[0])
+        self.assertIsNotNone(agent.getSearchEngine()._pool)
+
+        agent.final(states[0])
+        self.assertIsNone(agent.getSearchEngine()._pool)
+
+    def test_next_below(self):
+        # The closest float below each value (the same as math.nextafter(value, -inf)).
+        cases = [
+            (1.0, 1.0 - 2.0 ** -53),
+            (-1.0, -1.0 - 2.0 ** -52),
+            (0.0, -5e-324),
+            (-0.0, -5e-324),
+            (5e-324, 0.0),
+            (-5e-324, -1e-323),
+            (float('inf'), sys.float_info.max),
+            (float('-inf'), float('-inf')),
+        ]
+
+        for value, expected in cases:
+            self.assertEqual(expected, adversarial._nextBelow(value))
+
+    def test_table_check(self):
+        engine = AdversarialSearch(score, tableSize = 16)
+        state, other = self._getStates()[:2]
+
+        key, check, entry = engine._probe(state, 0)
+        otherKey, otherCheck, otherEntry = engine._probe(other, 0)
+
+        # An entry with a matching key but a different state (a hash collision) is not used.
+        engine._store(key, otherCheck, 1, 100.0, adversarial.EXACT, None, True)
+        self.assertIsNone(engine._probe(state, 0)[2])
+
+        engine._store(key, check, 1, 100.0, adversarial.EXACT, None, True)
+        self.assertEqual(100.0, engine._probe(state, 0)[2][2])
+
+    def test_expectimax_bounds(self):
+        engine = AdversarialSearch(score, expectimax = True)
+        state = self._getStates()[0]
+        remaining = DEPTH * state.getNumAgents()
+
+        # A max node that cannot reach alpha only has an upper bound on its value.
+        engine._generation += 1
+        value = engine._value(state, 0, remaining, float('inf'), float('inf'))
+        self.assertEqual(adversarial.UPPER_BOUND, engine._probe(state, 0)[2][3])
+
+        # Which is not reused when the node is searched again with a full window.
+        expected = _treeValue(state, 0, remaining, True)
+        self.assertAlmostEqual(expected, engine._value(state, 0, remaining, float('-inf'),
+                float('inf')))
+        self.assertEqual(adversarial.EXACT, engine._probe(state, 0)[2][3])
+        self.assertLessEqual(value, expected)
+
+    def test_time_limit(self):
+        agent = AlphaBetaAgent(0)
+        self.assertIsNone(agent.getTimeLimit())
+
+        agent = AlphaBetaAgent(0, timeLimit = '0.5')
+        self.assertEqual(0.5, agent.getTimeLimit())
+
+        agent = AlphaBetaAgent(0, timeLimit = 'auto')
+        self.assertIsNone(agent.getTimeLimit())
+
+        agent.setMoveWarningTime(2)
+        self.assertAlmostEqual(2 * MOVE_TIME_FRACTION, agent.getTimeLimit())
+
+    def _getStates(self):
+        rng = random.Random(SEED)
+        state = PacmanGameState(getLayout('mediumClassic'))
+
+        states = []
+        while (len(states) < NUM_STATES):
+            for agentIndex in range(state.getNumAgents()):
+                state = state.generateSuccessor(agentIndex,
+                        rng.choice(state.getLegalActions(agentIndex)))
+
+            states.append(state)
+
+        return states
+
+def _treeValue(state, agentIndex, remaining, expectimax):
+    if (state.isOver() or remaining == 0):
+        return score(state)
+
+    nextAgent = (agentIndex + 1) % state.getNumAgents()
+
+    values = []
+    for action in state.getLegalActions(agentIndex):
+        successor = state.generateSuccessor(agentIndex, action)
+        values.append(_treeValue(successor, nextAgent, remaining - 1, expectimax))
+
+    if (agentIndex == 0):
+        return max(values)
+    elif (expectimax):
+        return sum(values) / len(values)
+
+    return min(values)
+
+if __name__ == '__main__':
+    unittest.main()
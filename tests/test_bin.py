@@ -1,8 +1,13 @@
+import contextlib
+import io
+import random
 import unittest
 
 from pacai.bin import capture
 from pacai.bin import gridworld
 from pacai.bin import pacman
+from pacai.bin import tournament
+from pacai.student.qlearningAgents import PacmanQAgent
 
 """
 This is a test class to assess the executables of this project.
@@ -21,6 +26,107 @@ class BinTest(unittest.TestCase):
             # Expected exception.
             pass
 
+    def test_pacman_jobs(self):
+        # Games do not depend on the number of processes (even when played in this process).
+        args = ['-p', 'GreedyAgent', '--null-graphics', '--layout', 'smallClassic',
+                '--num-games', '4', '--seed', '1234', '--quiet']
+
+        results = []
+        for jobs in ['1', '2', '3']:
+            games = pacman.main(args + ['--jobs', jobs])
+            results.append([(game.state.getScore(), game.moveHistory) for game in games])
+
+        self.assertEqual(4, len(results[0]))
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[0], results[2])
+
+        # Parallel games cannot be displayed.
+        with self.assertRaises(ValueError):
+            pacman.main(['-p', 'GreedyAgent', '--text-graphics', '--jobs', '2'])
+
+    def test_pacman_training_jobs(self):
+        args = ['-p', 'ApproximateQAgent', '--null-graphics', '--layout', 'smallGrid',
+                '--agent-args', 'extractor=pacai.core.featureExtractors.SimpleExtractor',
+                '--num-training', '5', '--num-games', '6', '--seed', '1234', '--quiet',
+                '--training-jobs', '2', '--sync-games', '2']
+
+        # The weights are printed once training is over.
+        with contextlib.redirect_stdout(io.StringIO()):
+            games = pacman.main(args)
+
+        self.assertEqual(1, len(games))
+
+        agent = games[0].agents[0]
+        self.assertEqual(6, agent.episodesSoFar)
+        self.assertEqual(0.0, agent.getEpsilon())
+        self.assertTrue(any(weight != 0.0 for weight in agent.getWeights().values()))
+
+        # Tabular agents can also be trained in parallel.
+        games = pacman.main(['-p', 'PacmanQAgent', '--null-graphics', '--layout', 'smallGrid',
+                '--num-training', '5', '--num-games', '6', '--seed', '1234', '--quiet',
+                '--training-jobs', '2', '--sync-games', '2'])
+
+        agent = games[0].agents[0]
+        self.assertEqual(6, agent.episodesSoFar)
+        self.assertTrue(any(value != 0.0 for value in agent.getParameters().values()))
+
+        # Each round starts from just the parameters it is sent,
+        # so playing the same round twice (in the same worker) learns the same thing.
+        args = pacman.readCommand(['-p', 'ApproximateQAgent', '--null-graphics',
+                '--layout', 'smallGrid',
+                '--agent-args', 'replayCapacity=100,replayBatchSize=4,numTraining=10'])
+        pacman._initGameWorker(pacman.ClassicGameRules(30), args['layout'], args['pacman'],
+                args['ghosts'], pacman.PacmanNullView(), False)
+
+        task = (0, [], 0, [1, 2])
+        self.assertEqual(pacman._trainGamesWorker(task), pacman._trainGamesWorker(task))
+
+        # Workers merge in the rounds they have not seen, and cannot skip any.
+        pacman._trainGamesWorker((0, [{'bias': 1.0}, {'bias': 0.5}], 0, [1]))
+        self.assertEqual((2, {'bias': 1.5}), pacman._workerParameters)
+        with self.assertRaises(ValueError):
+            pacman._trainGamesWorker((3, [], 0, [1]))
+
+        # Workers that all learned the same thing move Pacman no further than one worker would.
+        changes = {'bias': 0.5, 'eats-food': -1.0}
+        self.assertEqual(changes, pacman._mergeParameterChanges([changes] * 4))
+
+        # So values stay bounded (by the rewards) no matter how many workers there are.
+        mdp = gridworld._getGridWorld('BookGrid')
+        learner = PacmanQAgent(0, actionFn = mdp.getPossibleActions)
+        random.seed(0)
+        for trainingRound in range(40):
+            parameters = learner.getParameters()
+
+            allChanges = []
+            for worker in range(8):
+                workerAgent = PacmanQAgent(0, actionFn = mdp.getPossibleActions)
+                workerAgent.setParameters(parameters)
+                gridworld.runEpisodes(workerAgent, gridworld.GridworldEnvironment(mdp),
+                        workerAgent.getDiscountRate(), 2)
+                allChanges.append(workerAgent.getParameterChanges(parameters))
+
+            learner.addParameterChanges(pacman._mergeParameterChanges(allChanges))
+
+        values = learner.getParameters().values()
+        self.assertTrue(any(value != 0.0 for value in values))
+        self.assertLessEqual(max(abs(value) for value in values), 1.0 + 1e-9)
+
+        games = pacman.main(['-p', 'PacmanQAgent', '--null-graphics', '--layout', 'smallGrid',
+                '--num-training', '16', '--num-games', '17', '--seed', '1234', '--quiet',
+                '--training-jobs', '4', '--sync-games', '1'])
+
+        # No step is worth more than winning (and eating the last food).
+        agent = games[0].agents[0]
+        maxValue = ((pacman.BOARD_CLEAR_POINTS + pacman.FOOD_POINTS)
+                / (1.0 - agent.getDiscountRate()))
+        self.assertLess(max(abs(value) for value in agent.getParameters().values()), maxValue)
+
+        # Only some agents can be trained in parallel.
+        with self.assertRaises(ValueError):
+            pacman.main(['-p', 'GreedyAgent', '--null-graphics', '--num-training', '2',
+                    '--num-games', '3', '--training-jobs', '2'])
+
     def test_pacman_help(self):
         # Show all pacman arguments.
         try:
@@ -41,10 +147,74 @@ class BinTest(unittest.TestCase):
             if status.code != 0:
                 self.fail("Error occured when running --help.")
 
+    def test_tournament(self):
+        args = ['--teams', 'pacai.core.baselineTeam', 'pacai.student.myTeam',
+                '--layouts', 'defaultCapture', 'RANDOM94', '--max-moves', '100',
+                '--seed', '1234', '--quiet']
+
+        # Results do not depend on the number of processes.
+        standings = tournament.main(args + ['--jobs', '2'])
+        self.assertEqual(standings, tournament.main(args + ['--jobs', '3']))
+
+        # Two pairings on two layouts, and every team plays in every game.
+        for team in standings:
+            self.assertEqual(4, team['games'])
+            self.assertEqual(4, team['wins'] + team['losses'] + team['ties'])
+
+        # Each team can only be listed once.
+        duplicateArgs = ['--teams', 'pacai.core.baselineTeam', 'pacai.core.baselineTeam',
+                'pacai.student.myTeam', '--quiet']
+        self.assertRaises(ValueError, tournament.main, duplicateArgs)
+
+        results = [
+            {'red': 'a', 'blue': 'b', 'winner': tournament.RED_WIN},
+            {'red': 'b', 'blue': 'a', 'winner': tournament.TIE},
+        ]
+
+        standings = tournament.computeStandings(results)
+        self.assertEqual(['a', 'b'], [team['team'] for team in standings])
+        self.assertAlmostEqual(2 * tournament.DEFAULT_ELO,
+                standings[0]['elo'] + standings[1]['elo'])
+        self.assertEqual(0.5, standings[0]['winRate'])
+
     def test_gridworld(self):
         # Run game of gridworld with default agents.
         gridworld.main(['--null-graphics'])
 
+    def test_gridworld_headless(self):
+        opts = gridworld.parseOptions(['-a', 'q', '-k', '20', '--headless'])
+
+        # Headless episodes act (and learn) just like displayed ones.
+        random.seed(0)
+        mdp = gridworld._createGridWorld(opts)
+        agent, numEpisodes = gridworld._createAgent(opts, mdp)
+        env = gridworld.GridworldEnvironment(mdp)
+        expected = [gridworld.runEpisode(agent, env, opts.discount, agent.getAction,
+                lambda state: None, lambda message: None, lambda: None, episode)
+                for episode in range(numEpisodes)]
+
+        random.seed(0)
+        mdp = gridworld._createGridWorld(opts)
+        agent, numEpisodes = gridworld._createAgent(opts, mdp)
+        returns = gridworld.runEpisodes(agent, gridworld.GridworldEnvironment(mdp),
+                opts.discount, numEpisodes)
+        self.assertEqual(expected, list(returns))
+
+        # Results do not depend on the number of processes.
+        results = gridworld.main(['-a', 'q', '-k', '20', '--headless', '--runs', '3',
+                '--seed', '4'])
+        parallelResults = gridworld.main(['-a', 'q', '-k', '20', '--headless', '--runs', '3',
+                '--seed', '4', '--jobs', '2'])
+        self.assertEqual(3, len(results))
+        self.assertEqual(results, parallelResults)
+
+        # The random agent runs some episodes even when none are asked for (without changing opts).
+        opts = gridworld.parseOptions(['-a', 'random', '-k', '0', '--headless'])
+        agent, numEpisodes = gridworld._createAgent(opts, gridworld._createGridWorld(opts))
+        self.assertEqual(10, numEpisodes)
+        self.assertEqual(0, opts.episodes)
+        self.assertEqual(10, len(gridworld.main(['-a', 'random', '-k', '0', '--headless'])[0]))
+
     def test_gridworld_help(self):
         # Show all gridworld arguments.
         try:
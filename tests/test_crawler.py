@@ -0,0 +1,69 @@
+import random
+import unittest
+
+from pacai.bin import crawler
+from pacai.core.crawler import CrawlerEnvironment
+from pacai.ui.crawler.gui import CrawlingRobot
+from pacai.ui.crawler.gui import CrawlingRobotEnvironment
+
+NUM_STEPS = 1000
+
+"""
+Test the crawler without graphics.
+"""
+class CrawlerTest(unittest.TestCase):
+    def test_gui_rewards(self):
+        # The headless robots move just like the GUI robot.
+        guiEnvironment = CrawlingRobotEnvironment(CrawlingRobot(_Canvas()))
+        environment = CrawlerEnvironment(3)
+
+        rng = random.Random(0)
+        for i in range(NUM_STEPS):
+            state = guiEnvironment.getCurrentState()
+            self.assertEqual([state] * 3, environment.getCurrentStates())
+            self.assertEqual(guiEnvironment.getPossibleActions(state),
+                    environment.getPossibleActions(state))
+
+            action = rng.choice(guiEnvironment.getPossibleActions(state))
+            expectedState, expectedReward = guiEnvironment.doAction(action)
+            nextStates, rewards = environment.step([action, action, None])
+
+            self.assertEqual([expectedState, expectedState, state], nextStates)
+            self.assertAlmostEqual(expectedReward, rewards[0])
+            self.assertAlmostEqual(expectedReward, rewards[1])
+            self.assertEqual(0.0, rewards[2])
+
+            # Keep the last robot with the others.
+            environment.step([None, None, action])
+
+    def test_headless(self):
+        random.seed(0)
+        curve = crawler.main(['crawler', '--headless', '20000', '--robots', '2',
+                '--interval', '5000', '--quiet'])
+
+        # Learning makes the robots faster.
+        self.assertEqual(4, len(curve))
+        self.assertGreater(curve[-1], curve[0])
+
+class _Canvas(object):
+    """
+    Just enough of a canvas to make a GUI robot (without drawing it).
+    """
+
+    def create_line(self, *args, **kwargs):
+        return None
+
+    def create_polygon(self, *args, **kwargs):
+        return None
+
+    def create_rectangle(self, *args, **kwargs):
+        return None
+
+    def winfo_reqheight(self):
+        return 200
+
+    def winfo_reqwidth(self):
+        return 1000
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from pacai.core import distanceCalculator
+from pacai.core.layout import Layout
+
+# (1, 1) connects up to the top row, (4, 1) and (5, 1) connect through (4, 2),
+# and (1, 4) is walled off from everything else.
+LAYOUT_TEXT = [
+    '%%%%%%%',
+    '% %%%%%',
+    '%%%%%%%',
+    '%.   %%',
+    '% %% .%',
+    '%%%%%%%',
+]
+
+# Where the typecode is in a cached distance file (after the magic and version).
+CACHE_FILE_TYPECODE_OFFSET = 8
+
+"""
+Test maze distances.
+"""
+class DistanceTest(unittest.TestCase):
+    def test_maze_distances(self):
+        distancer = distanceCalculator.Distancer(Layout(LAYOUT_TEXT))
+
+        # Before computing maze distances, manhattan distance is used.
+        self.assertFalse(distancer.isReadyForMazeDistance())
+        self.assertEqual(3, distancer.getDistance((1, 1), (4, 1)))
+
+        distancer.getMazeDistances()
+        self.assertTrue(distancer.isReadyForMazeDistance())
+
+        self.assertEqual(0, distancer.getDistance((1, 2), (1, 2)))
+        self.assertEqual(5, distancer.getDistance((1, 2), (5, 1)))
+        self.assertEqual(5, distancer.getDistance((5, 1), (1, 2)))
+        self.assertEqual(5, distancer.getDistance((1, 1), (4, 1)))
+        self.assertEqual(sys.maxsize, distancer.getDistance((1, 4), (1, 2)))
+
+        # Positions between grid points snap to the closest grid points.
+        self.assertEqual(4.5, distancer.getDistance((1.5, 2), (5, 1)))
+
+        targets = [(1, 2), (4, 2), (5, 1), (1, 1), (1, 4)]
+        expected = [distancer.getDistance((1, 2), target) for target in targets]
+        self.assertEqual([0, 3, 5, 1, sys.maxsize], expected)
+        self.assertEqual(expected, distancer.getDistances((1, 2), targets))
+
+    def test_lazy_distances(self):
+        layout = Layout(LAYOUT_TEXT)
+        distances = distanceCalculator.computeDistances(layout)
+        lazyDistances = distanceCalculator.LazyMazeDistances(layout.walls, maxRows = 2)
+        self.assertEqual(0, lazyDistances.getNumCachedRows())
+
+        # A row can answer queries in either direction.
+        self.assertEqual(5, lazyDistances.getDistance((1, 2), (5, 1)))
+        self.assertEqual(5, lazyDistances.getDistance((5, 1), (1, 2)))
+        self.assertEqual(1, lazyDistances.getNumCachedRows())
+
+        cells = distances.getCells()
+        for cell in cells:
+            self.assertEqual(distances.getDistances(cell, cells),
+                    lazyDistances.getDistances(cell, cells))
+            self.assertLessEqual(lazyDistances.getNumCachedRows(), 2)
+
+        for cell in cells:
+            for other in cells:
+                self.assertEqual(distances.getDistance(cell, other),
+                        lazyDistances.getDistance(cell, other))
+
+        with self.assertRaises(ValueError):
+            distanceCalculator.LazyMazeDistances(layout.walls, maxRows = 0)
+
+        distanceCalculator.clearCache()
+        distancer = distanceCalculator.Distancer(layout, lazy = True)
+        distancer.getMazeDistances()
+        self.assertTrue(distancer.isReadyForMazeDistance())
+        self.assertEqual(5, distancer.getDistance((1, 1), (4, 1)))
+        self.assertEqual(4.5, distancer.getDistance((1.5, 2), (5, 1)))
+
+    def test_disk_cache(self):
+        layout = Layout(LAYOUT_TEXT)
+        oldCacheDir = distanceCalculator.getCacheDirectory()
+
+        with tempfile.TemporaryDirectory() as cacheDir:
+            try:
+                distanceCalculator.setCacheDirectory(cacheDir)
+                distanceCalculator.clearCache()
+
+                computed = distanceCalculator.loadDistances(layout)
+                self.assertEqual(1, len(os.listdir(cacheDir)))
+
+                # The in-memory cache is shared.
+                self.assertIs(computed, distanceCalculator.loadDistances(Layout(LAYOUT_TEXT)))
+
+                # Force a load from disk.
+                distanceCalculator.clearCache()
+                loaded = distanceCalculator.loadDistances(layout)
+                self.assertIsNot(computed, loaded)
+
+                cells = computed.getCells()
+                for cell in cells:
+                    self.assertEqual(computed.getDistances(cell, cells),
+                            loaded.getDistances(cell, cells))
+
+                # Release the memory map before the directory is removed.
+                del loaded
+
+                # A corrupt file is a cache miss (and gets rewritten).
+                path = os.path.join(cacheDir, os.listdir(cacheDir)[0])
+                with open(path, 'r+b') as file:
+                    file.seek(CACHE_FILE_TYPECODE_OFFSET)
+                    file.write(b'\xff')
+
+                distanceCalculator.clearCache()
+                recomputed = distanceCalculator.loadDistances(layout)
+                self.assertEqual(computed.getDistances(cells[0], cells),
+                        recomputed.getDistances(cells[0], cells))
+                self.assertIsNotNone(distanceCalculator._readDistances(layout.walls, path))
+            finally:
+                distanceCalculator.setCacheDirectory(oldCacheDir)
+                distanceCalculator.clearCache()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import random
+import subprocess
+import sys
+import unittest
+
+from pacai.bin.capture import CaptureGameState
+from pacai.bin.pacman import PacmanGameState
+from pacai.core.agentstate import AgentState
+from pacai.core.directions import Directions
+from pacai.core.layout import Layout
+from pacai.core.layout import getLayout
+from pacai.util import zobrist
+
+SEED = 4
+NUM_MOVES = 200
+
+"""
+Test game state mechanics.
+"""
+class GameStateTest(unittest.TestCase):
+    def test_incremental_hash_pacman(self):
+        state = PacmanGameState(getLayout('smallClassic'))
+        self._checkIncrementalHash(state)
+
+    def test_incremental_hash_capture(self):
+        state = CaptureGameState(getLayout('defaultCapture'), NUM_MOVES)
+        self._checkIncrementalHash(state)
+
+    def test_apply_undo_pacman(self):
+        state = PacmanGameState(getLayout('smallClassic'))
+        self._checkApplyUndo(state)
+
+    def test_apply_undo_capture(self):
+        state = CaptureGameState(getLayout('defaultCapture'), NUM_MOVES)
+        self._checkApplyUndo(state)
+
+    def test_agent_state_copy(self):
+        agentState = AgentState((1, 1), Directions.STOP, True)
+        self.assertFalse(hasattr(agentState, '__dict__'))
+
+        agentState.updatePosition((1, 0))
+        agentState.setScaredTimer(3)
+        initialHash = hash(agentState)
+
+        other = agentState.copy()
+        self.assertEqual(agentState, other)
+        self.assertEqual(initialHash, hash(other))
+
+        other.updatePosition((0, 1))
+        other.respawn()
+        self.assertNotEqual(agentState, other)
+        self.assertEqual((2, 1), agentState.getPosition())
+        self.assertEqual((1, 1), other.getPosition())
+        self.assertEqual(Directions.STOP, other.getDirection())
+        self.assertEqual(0, other.getScaredTimer())
+        self.assertEqual(other._computeHash(), hash(other))
+        self.assertEqual(initialHash, hash(agentState))
+
+    def test_undo_capsule(self):
+        state = PacmanGameState(Layout(['%%%%%%', '%Po.G%', '%%%%%%']))
+        initialState = state._initSuccessor()
+
+        # Eating a capsule changes every ghost, but a ghost's move only changes itself.
+        record = state.applyAction(0, Directions.EAST)
+        self.assertTrue(state.getGhostState(1).isScared())
+        self.assertEqual(2, len(record[1]))
+
+        ghostRecord = state.applyAction(1, Directions.WEST)
+        self.assertEqual([1], [index for (index, agentRecord) in ghostRecord[1]])
+
+        state.undo(ghostRecord)
+        state.undo(record)
+        self.assertEqual(initialState, state)
+        self.assertEqual(hash(initialState), hash(state))
+        self.assertEqual([(2, 1)], state.getCapsules())
+        self.assertFalse(state.getGhostState(1).isScared())
+
+    def test_stable_hash(self):
+        # Keys come from the features themselves, not the order they are first seen in.
+        features = [('food', x, y) for x in range(5) for y in range(5)]
+        forward = zobrist.ZobristTable()
+        backward = zobrist.ZobristTable()
+        forwardKeys = [forward.getKey(*feature) for feature in features]
+        backwardKeys = [backward.getKey(*feature) for feature in reversed(features)]
+        self.assertEqual(forwardKeys, list(reversed(backwardKeys)))
+
+        # Equal features get the same key.
+        self.assertEqual(forward.getKey('position', (8, 5)),
+                backward.getKey('position', (8.0, 5.0)))
+
+        # State hashes are the same in processes with different string hashing.
+        code = ('from pacai.bin.pacman import PacmanGameState; '
+                + 'from pacai.core.layout import getLayout; '
+                + 'print(hash(PacmanGameState(getLayout(\'smallClassic\'))))')
+
+        hashes = set()
+        for hashSeed in ['1', '2']:
+            env = dict(os.environ, PYTHONHASHSEED = hashSeed)
+            result = subprocess.run([sys.executable, '-c', code], env = env, check = True,
+                    stdout = subprocess.PIPE, universal_newlines = True)
+            hashes.add(int(result.stdout))
+
+        self.assertEqual({hash(PacmanGameState(getLayout('smallClassic')))}, hashes)
+
+    def _checkApplyUndo(self, state):
+        rng = random.Random(SEED)
+        initialState = state._initSuccessor()
+        initialHash = hash(state)
+
+        records = []
+        successor = state
+        agentIndex = 0
+        for i in range(NUM_MOVES):
+            if (state.isOver()):
+                break
+
+            action = rng.choice(state.getLegalActions(agentIndex))
+            successor = successor.generateSuccessor(agentIndex, action)
+            records.append(state.applyAction(agentIndex, action))
+            agentIndex = (agentIndex + 1) % state.getNumAgents()
+
+            # Applying in-place should match generating successors.
+            self.assertEqual(successor, state)
+            self.assertEqual(hash(successor), hash(state))
+            self.assertEqual(successor.getNumFood(), state.getNumFood())
+
+        for record in reversed(records):
+            state.undo(record)
+
+        self.assertEqual(initialState, state)
+        self.assertEqual(initialHash, hash(state))
+        self.assertEqual(initialState.getNumFood(), state.getNumFood())
+        self.assertEqual(initialState.getCapsules(), state.getCapsules())
+
+    def _checkIncrementalHash(self, state):
+        rng = random.Random(SEED)
+        hash(state)
+
+        agentIndex = 0
+        for i in range(NUM_MOVES):
+            if (state.isOver()):
+                break
+
+            action = rng.choice(state.getLegalActions(agentIndex))
+            state = state.generateSuccessor(agentIndex, action)
+            agentIndex = (agentIndex + 1) % state.getNumAgents()
+
+            self.assertEqual(state._computeZobrist(), state._zobrist)
+            for agentState in state.getAgentStates():
+                self.assertEqual(agentState._computeHash(), agentState._hash)
+
+if __name__ == '__main__':
+    unittest.main()
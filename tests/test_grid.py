@@ -0,0 +1,55 @@
+import unittest
+
+from pacai.core.grid import BitGrid
+from pacai.core.grid import Grid
+
+"""
+Test the boolean grids.
+"""
+class GridTest(unittest.TestCase):
+    def test_bitgrid_matches_grid(self):
+        width = 5
+        height = 4
+        cells = [(0, 0), (1, 3), (2, 2), (4, 0), (4, 3)]
+
+        grid = Grid(width, height)
+        bitGrid = BitGrid(width, height)
+        for x, y in cells:
+            grid[x][y] = True
+            bitGrid[x][y] = True
+
+        self.assertEqual(grid.asList(), bitGrid.asList())
+        self.assertEqual(grid.asList(False), bitGrid.asList(False))
+        self.assertEqual(grid.count(), bitGrid.count())
+        self.assertEqual(grid.count(False), bitGrid.count(False))
+        self.assertEqual(str(grid), str(bitGrid))
+
+        for x in range(width):
+            for y in range(height):
+                self.assertEqual(grid[x][y], bitGrid[x][y])
+
+        # Negative indexes behave like lists.
+        self.assertEqual(grid[-1][-1], bitGrid[-1][-1])
+
+    def test_bitgrid_copy(self):
+        grid = BitGrid(3, 3, initialValue = True)
+        self.assertEqual(9, grid.count())
+
+        other = grid.copy()
+        self.assertEqual(grid, other)
+        self.assertEqual(hash(grid), hash(other))
+
+        other[1][1] = False
+        self.assertTrue(grid[1][1])
+        self.assertFalse(other[1][1])
+        self.assertNotEqual(grid, other)
+        self.assertEqual(8, other.count())
+
+        with self.assertRaises(IndexError):
+            grid[0][3]
+
+        with self.assertRaises(ValueError):
+            grid[0][0] = 1
+
+if __name__ == '__main__':
+    unittest.main()
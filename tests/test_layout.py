@@ -0,0 +1,44 @@
+import unittest
+
+from pacai.core.actions import Actions
+from pacai.core.directions import Directions
+from pacai.core.layout import getLayout
+
+LAYOUTS = ['mediumClassic', 'defaultCapture', 'tinyMaze']
+
+"""
+Test the precomputed move tables of layouts.
+"""
+class LayoutTest(unittest.TestCase):
+    def test_move_tables(self):
+        for name in LAYOUTS:
+            layout = getLayout(name)
+            walls = layout.walls
+
+            for position in walls.asList(False):
+                self.assertEqual(Actions.getPossibleActions(position, Directions.STOP, walls),
+                        list(layout.getLegalActions(position, Directions.STOP)))
+                self.assertEqual(Actions.getLegalNeighbors(position, walls),
+                        list(layout.getLegalNeighbors(position)))
+
+                # Float positions are found in the same tables.
+                floatPosition = (float(position[0]), float(position[1]))
+                self.assertEqual(layout.getLegalActions(position, Directions.STOP),
+                        layout.getLegalActions(floatPosition, Directions.STOP))
+
+                moves = layout.getCardinalMoves(position)
+                expected = [action for action in Directions.CARDINAL
+                        if (action in layout.getLegalActions(position, Directions.STOP))]
+                self.assertEqual(expected, [action for (action, nextPosition) in moves])
+
+                for action, nextPosition in moves:
+                    self.assertEqual(Actions.getSuccessor(position, action), nextPosition)
+
+    def test_between_grid_points(self):
+        layout = getLayout('mediumClassic')
+
+        # Agents between grid points must continue straight.
+        self.assertEqual((Directions.EAST,), layout.getLegalActions((1.5, 1), Directions.EAST))
+
+if __name__ == '__main__':
+    unittest.main()
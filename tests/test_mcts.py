@@ -0,0 +1,63 @@
+import random
+import time
+import unittest
+
+from pacai.agents.search.mcts import MCTSAgent
+from pacai.agents.search.multiagent import MOVE_TIME_FRACTION
+from pacai.bin.pacman import PacmanGameState
+from pacai.core.layout import getLayout
+
+SEED = 11
+NUM_SIMULATIONS = 50
+
+"""
+Test the Monte Carlo Tree Search agent.
+"""
+class MCTSTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(SEED)
+
+    def test_tree_reuse(self):
+        # Without ghosts, every action always leads to the same state.
+        state = PacmanGameState(getLayout('tinyMaze'))
+
+        agent = MCTSAgent(0, numSimulations = NUM_SIMULATIONS)
+        agent.registerInitialState(state)
+
+        action = agent.getAction(state)
+        self.assertIn(action, state.getLegalActions(0))
+        self.assertEqual(NUM_SIMULATIONS, agent.getRoot().visits)
+
+        state = state.generateSuccessor(0, action)
+        previousVisits = agent.getRoot().children[action][hash(state)].visits
+        self.assertGreater(previousVisits, 0)
+
+        agent.getAction(state)
+        self.assertEqual(previousVisits + NUM_SIMULATIONS, agent.getRoot().visits)
+
+    def test_time_limit(self):
+        state = PacmanGameState(getLayout('smallClassic'))
+
+        agent = MCTSAgent(0, timeLimit = 0.2,
+                agentModel = 'pacai.agents.ghost.directional.DirectionalGhost')
+        agent.registerInitialState(state)
+
+        startTime = time.time()
+        action = agent.getAction(state)
+
+        self.assertIn(action, state.getLegalActions(0))
+        self.assertLess(time.time() - startTime, 1.0)
+        self.assertGreater(agent.getRoot().visits, 0)
+
+    def test_options(self):
+        agent = MCTSAgent(0, depth = '3', timeLimit = 'auto')
+        self.assertEqual(3, agent.getTreeDepth())
+        self.assertIsNone(agent.getTimeLimit())
+
+        # Automatic time limits are the same as the adversarial searchers'.
+        agent.setMoveWarningTime(2)
+        self.assertAlmostEqual(2 * MOVE_TIME_FRACTION, agent.getTimeLimit())
+        self.assertEqual(0.5, MCTSAgent(0, timeLimit = '0.5').getTimeLimit())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import unittest
+
+from pacai.agents.learning.policy import PolicyIterationAgent
+from pacai.bin.gridworld import _getGridWorld
+from pacai.core.mdp import CompiledMDP
+
+DISCOUNT = 0.9
+ITERATIONS = 100
+
+"""
+Test solving MDPs.
+"""
+class MDPTest(unittest.TestCase):
+    def test_value_iteration(self):
+        for name in ['BookGrid', 'BridgeGrid', 'DiscountGrid', 'MazeGrid']:
+            mdp = _getGridWorld(name)
+            expected = _valueIteration(mdp, DISCOUNT, ITERATIONS)
+
+            compiled = CompiledMDP(mdp)
+            values, numIterations = compiled.valueIteration(DISCOUNT, ITERATIONS)
+            values = compiled.getValueDict(values)
+
+            # Iteration only stops early once the values stop changing.
+            self.assertLessEqual(numIterations, ITERATIONS)
+            self.assertEqual(set(expected), set(values))
+            for state in expected:
+                self.assertAlmostEqual(expected[state], values[state])
+
+    def test_early_stopping(self):
+        compiled = CompiledMDP(_getGridWorld('BookGrid'))
+
+        values, numIterations = compiled.valueIteration(DISCOUNT, 1000, tolerance = 1e-6)
+        self.assertLess(numIterations, 1000)
+
+        # More iterations do not change the values (by more than the tolerance).
+        moreValues, moreIterations = compiled.valueIteration(DISCOUNT, 1, values = values)
+        for index in range(len(values)):
+            self.assertAlmostEqual(values[index], moreValues[index], delta = 1e-6)
+
+    def test_gridworld_model(self):
+        mdp = _getGridWorld('DiscountGrid')
+
+        for noise, livingReward in [(0.2, 0.0), (0.0, -1.0), (0.5, 0.5)]:
+            mdp.setNoise(noise)
+            mdp.setLivingReward(livingReward)
+
+            for state in mdp.getStates():
+                self.assertEqual(mdp._computePossibleActions(state),
+                        mdp.getPossibleActions(state))
+
+                for action in mdp.getPossibleActions(state):
+                    self.assertEqual(mdp._computeTransitionStatesAndProbs(state, action),
+                            list(mdp.getTransitionStatesAndProbs(state, action)))
+                    self.assertEqual(mdp._computeReward(state),
+                            mdp.getReward(state, action, None))
+
+        # Changing the noise is seen by the next call.
+        mdp.setNoise(0.0)
+        transitions = mdp.getTransitionStatesAndProbs(mdp.getStartState(), 'north')
+        self.assertEqual(1.0, max(probability for (nextState, probability) in transitions))
+
+    def test_modes(self):
+        for name in ['BookGrid', 'BridgeGrid', 'DiscountGrid', 'MazeGrid']:
+            compiled = CompiledMDP(_getGridWorld(name))
+            expected, numSweeps = compiled.valueIteration(DISCOUNT, 1000, tolerance = 1e-9)
+
+            values, numAsyncSweeps = compiled.asynchronousValueIteration(DISCOUNT, 1000,
+                    tolerance = 1e-9)
+            for index in range(len(values)):
+                self.assertAlmostEqual(expected[index], values[index], delta = 1e-6)
+
+            values, numUpdates = compiled.prioritizedSweeping(DISCOUNT, 100000, tolerance = 1e-9)
+            for index in range(len(values)):
+                self.assertAlmostEqual(expected[index], values[index], delta = 1e-6)
+
+            # Prioritized sweeping only updates the states that need it.
+            self.assertLess(numUpdates, numSweeps * compiled.numStates)
+
+    def test_policy_iteration(self):
+        for name in ['BookGrid', 'BridgeGrid', 'DiscountGrid', 'MazeGrid']:
+            mdp = _getGridWorld(name)
+            compiled = CompiledMDP(mdp)
+
+            expected, numSweeps = compiled.valueIteration(0.99, 10000, tolerance = 1e-12)
+            expected = compiled.getValueDict(expected)
+
+            agent = PolicyIterationAgent(0, mdp, 0.99, 100)
+            self.assertLess(agent.numIterations, numSweeps)
+
+            for state in expected:
+                self.assertAlmostEqual(expected[state], agent.getValue(state), delta = 1e-6)
+
+                # The policy is greedy with respect to its own values.
+                action = agent.getPolicy(state)
+                qValues = [agent.getQValue(state, other) for other in mdp.getPossibleActions(state)]
+                self.assertAlmostEqual(max(qValues), agent.getQValue(state, action), delta = 1e-6)
+
+    def test_proper_policy(self):
+        mdp = _getGridWorld('BookGrid')
+        mdp.setNoise(0.0)
+        compiled = CompiledMDP(mdp)
+
+        # Always going north just bumps into the top wall forever.
+        policy = compiled.initialPolicy()
+        self.assertFalse(compiled.isProperPolicy(policy))
+        self.assertRaises(ValueError, compiled.evaluatePolicy, policy, 1.0)
+
+        # The discounted values still converge.
+        compiled.evaluatePolicy(policy, DISCOUNT)
+
+        # The optimal policy always exits, so it can be evaluated without discounting.
+        values, policy, numIterations = compiled.policyIteration(DISCOUNT, ITERATIONS)
+        self.assertTrue(compiled.isProperPolicy(policy))
+
+        values, numSweeps = compiled.evaluatePolicy(policy, 1.0)
+        self.assertLess(numSweeps, 100)
+        self.assertAlmostEqual(1.0, values[compiled.getStateIndex(mdp.getStartState())])
+
+    def test_predecessors(self):
+        mdp = _getGridWorld('BookGrid')
+        compiled = CompiledMDP(mdp)
+        predecessors = compiled.getPredecessors()
+
+        for state in mdp.getStates():
+            for action in mdp.getPossibleActions(state):
+                for nextState, probability in mdp.getTransitionStatesAndProbs(state, action):
+                    self.assertIn(compiled.getStateIndex(state),
+                            predecessors[compiled.getStateIndex(nextState)])
+
+def _valueIteration(mdp, discountRate, iterations):
+    """
+    Plain value iteration, straight from the MDP.
+    """
+
+    values = {}
+    for i in range(iterations):
+        oldValues = dict(values)
+
+        for state in mdp.getStates():
+            qValues = []
+            for action in mdp.getPossibleActions(state):
+                qValue = 0.0
+                for nextState, probability in mdp.getTransitionStatesAndProbs(state, action):
+                    qValue += probability * (mdp.getReward(state, action, nextState)
+                            + discountRate * oldValues.get(nextState, 0.0))
+
+                qValues.append(qValue)
+
+            if (len(qValues) > 0):
+                values[state] = max(qValues)
+
+    return values
+
+if __name__ == '__main__':
+    unittest.main()
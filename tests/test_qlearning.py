@@ -0,0 +1,155 @@
+import random
+import unittest
+
+from pacai.bin import gridworld
+from pacai.core.featureExtractors import FeatureExtractor
+from pacai.core.featureExtractors import IdentityExtractor
+from pacai.student.qlearningAgents import ApproximateQAgent
+from pacai.student.qlearningAgents import QLearningAgent
+from pacai.util.replayBuffer import ReplayBuffer
+
+NUM_EPISODES = 50
+
+"""
+Test the Q-learning agents.
+"""
+class QLearningTest(unittest.TestCase):
+    def test_identity_features(self):
+        # With one feature per (state, action), approximate Q-learning is just Q-learning.
+        mdp = gridworld._getGridWorld('BookGrid')
+        agentOpts = {
+            'actionFn': mdp.getPossibleActions,
+            'alpha': 0.5,
+            'epsilon': 0.3,
+            'gamma': 0.9,
+            'numTraining': NUM_EPISODES,
+        }
+
+        random.seed(0)
+        expected = QLearningAgent(0, **agentOpts)
+        gridworld.runEpisodes(expected, gridworld.GridworldEnvironment(mdp), 0.9, NUM_EPISODES)
+
+        random.seed(0)
+        agent = ApproximateQAgent(0, **agentOpts)
+        gridworld.runEpisodes(agent, gridworld.GridworldEnvironment(mdp), 0.9, NUM_EPISODES)
+
+        for state in mdp.getStates():
+            for action in mdp.getPossibleActions(state):
+                self.assertAlmostEqual(expected.getQValue(state, action),
+                        agent.getQValue(state, action))
+
+    def test_feature_index(self):
+        agent = ApproximateQAgent(0,
+                extractor = 'pacai.core.featureExtractors.SimpleExtractor')
+
+        # Fixed features come first, in order.
+        self.assertEqual(['bias', '#-of-ghosts-1-step-away', 'eats-food', 'closest-food'],
+                agent.featureIndex.getFeatures())
+        self.assertEqual({feature: 0.0 for feature in agent.featureIndex.getFeatures()},
+                agent.getWeights())
+
+    def test_feature_cache(self):
+        mdp = gridworld._getGridWorld('BookGrid')
+        agent = ApproximateQAgent(0, actionFn = mdp.getPossibleActions)
+        agent.featExtractor = _CountingExtractor
+
+        state = mdp.getStartState()
+        nextState = (0, 1)
+        _CountingExtractor.calls = 0
+
+        # An update (and the next move) reuse the features that choosing the last move extracted.
+        action = agent.getPolicy(state)
+        agent.update(state, action, nextState, 1.0)
+        agent.getPolicy(nextState)
+
+        numFeatures = len(mdp.getPossibleActions(state)) + len(mdp.getPossibleActions(nextState))
+        self.assertEqual(numFeatures, _CountingExtractor.calls)
+
+    def test_parameters(self):
+        mdp = gridworld._getGridWorld('BookGrid')
+
+        for agentClass in [QLearningAgent, ApproximateQAgent]:
+            random.seed(0)
+            learner = agentClass(0, actionFn = mdp.getPossibleActions)
+            gridworld.runEpisodes(learner, gridworld.GridworldEnvironment(mdp), 0.9, 5)
+
+            # Workers start from the learner's parameters, and their changes are added up.
+            parameters = learner.getParameters()
+            expected = {}
+            for seed in range(2):
+                random.seed(seed)
+                worker = agentClass(0, actionFn = mdp.getPossibleActions)
+                worker.setParameters(parameters)
+                gridworld.runEpisodes(worker, gridworld.GridworldEnvironment(mdp), 0.9, 5)
+
+                changes = worker.getParameterChanges(parameters)
+                self.assertTrue(len(changes) > 0)
+                learner.addParameterChanges(changes)
+
+                for key, change in changes.items():
+                    expected[key] = expected.get(key, parameters.get(key, 0.0)) + change
+
+            for key, value in learner.getParameters().items():
+                self.assertAlmostEqual(expected.get(key, parameters.get(key, 0.0)), value)
+
+    def test_replay(self):
+        mdp = gridworld._getGridWorld('BookGrid')
+        agentOpts = {
+            'actionFn': mdp.getPossibleActions,
+            'numTraining': NUM_EPISODES,
+        }
+
+        # Replaying batches of just the newest experience is the same as learning online.
+        for agentClass in [QLearningAgent, ApproximateQAgent]:
+            random.seed(0)
+            expected = agentClass(0, **agentOpts)
+            gridworld.runEpisodes(expected, gridworld.GridworldEnvironment(mdp), 0.9,
+                    NUM_EPISODES)
+
+            random.seed(0)
+            agent = agentClass(0, replayCapacity = 100, replayBatchSize = 1, **agentOpts)
+            gridworld.runEpisodes(agent, gridworld.GridworldEnvironment(mdp), 0.9, NUM_EPISODES)
+
+            self.assertEqual(100, len(agent.replayBuffer))
+            for state in mdp.getStates():
+                for action in mdp.getPossibleActions(state):
+                    self.assertAlmostEqual(expected.getQValue(state, action),
+                            agent.getQValue(state, action))
+
+        # Bigger batches still learn.
+        random.seed(0)
+        agent = ApproximateQAgent(0, replayCapacity = 100, replayBatchSize = 8, **agentOpts)
+        gridworld.runEpisodes(agent, gridworld.GridworldEnvironment(mdp), 0.9, NUM_EPISODES)
+        self.assertGreater(agent.getValue(mdp.getStartState()), 0.0)
+
+    def test_replay_buffer(self):
+        buffer = ReplayBuffer(3)
+        self.assertEqual([], buffer.sample(4))
+
+        for i in range(5):
+            buffer.add(i, 'a%d' % (i), i + 1, float(i))
+
+        self.assertEqual(3, len(buffer))
+        self.assertEqual([(2, 'a2', 3, 2.0), (3, 'a3', 4, 3.0), (4, 'a4', 5, 4.0)],
+                [buffer.get(i) for i in range(len(buffer))])
+
+        batch = buffer.sample(10, random.Random(0))
+        self.assertEqual(10, len(batch))
+        self.assertEqual((4, 'a4', 5, 4.0), batch[0])
+        self.assertTrue(all(experience[0] in (2, 3, 4) for experience in batch))
+
+        buffer.clear()
+        self.assertEqual(0, len(buffer))
+        self.assertEqual([], buffer.sample(4))
+        buffer.add(5, 'a5', 6, 5.0)
+        self.assertEqual([(5, 'a5', 6, 5.0)], buffer.sample(1))
+
+class _CountingExtractor(FeatureExtractor):
+    calls = 0
+
+    def getFeatures(self, state, action):
+        _CountingExtractor.calls += 1
+        return IdentityExtractor.getFeatures(self, state, action)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import random
+import unittest
+
+from pacai.util.qtable import QTable
+
+"""
+Test the Q-value table.
+"""
+class QTableTest(unittest.TestCase):
+    def test_values(self):
+        rng = random.Random(0)
+        table = QTable()
+        expected = {}
+
+        # Actions show up over time, so the table has to widen while it already has values.
+        for i in range(2000):
+            state = (rng.randint(0, 20), rng.randint(0, 20))
+            action = rng.randint(0, min(10, i // 100))
+            target = rng.random()
+
+            self.assertEqual(expected.get((state, action), 0.0), table.getQValue(state, action))
+
+            expected[(state, action)] = 0.5 * expected.get((state, action), 0.0) + 0.5 * target
+            self.assertEqual(expected[(state, action)], table.update(state, action, target, 0.5))
+
+        for (state, action), value in expected.items():
+            self.assertEqual(value, table.getQValue(state, action))
+
+        actions = table.getActions()
+        for state in set(state for (state, action) in expected):
+            qValues = [expected.get((state, action), 0.0) for action in actions]
+            self.assertEqual(qValues, table.getQValues(state, actions))
+            self.assertEqual(max(qValues), table.getValue(state, actions))
+
+    def test_unseen(self):
+        table = QTable()
+        table.setQValue('a', 'north', 1.0)
+
+        # Reading does not add anything.
+        self.assertEqual(0.0, table.getQValue('b', 'north'))
+        self.assertEqual(0.0, table.getQValue('a', 'south'))
+        self.assertEqual([1.0, 0.0], table.getQValues('a', ['north', 'south']))
+        self.assertEqual(0.0, table.getValue('a', []))
+        self.assertEqual(1, len(table))
+        self.assertEqual(['north'], table.getActions())
+
+    def test_snapshot(self):
+        table = QTable(stateKey = lambda state: state[0])
+        table.setQValue((1, 'x'), 'north', 2.0)
+        table.setQValue((2, 'x'), 'south', 3.0)
+
+        snapshot = table.getValues()
+        self.assertEqual({(1, 'north'): 2.0, (1, 'south'): 0.0, (2, 'north'): 0.0,
+                (2, 'south'): 3.0}, snapshot)
+
+        # Snapshots (and changes) are by key, and can add new keys and actions.
+        other = QTable(stateKey = lambda state: state[0])
+        other.setQValue((3, 'y'), 'east', 1.0)
+        other.setValues(snapshot)
+        other.addValues({(1, 'north'): 0.5, (4, 'west'): -1.0})
+
+        self.assertEqual(2.5, other.getQValue((1, 'y'), 'north'))
+        self.assertEqual(3.0, other.getQValue((2, 'y'), 'south'))
+        self.assertEqual(0.0, other.getQValue((3, 'y'), 'east'))
+        self.assertEqual(-1.0, other.getQValue((4, 'y'), 'west'))
+
+    def test_state_key(self):
+        table = QTable(stateKey = lambda state: state[0])
+        table.setQValue((1, 'x'), 'north', 2.0)
+
+        self.assertEqual(2.0, table.getQValue((1, 'y'), 'north'))
+        self.assertEqual(0.0, table.getQValue((2, 'x'), 'north'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,19 @@
+import json
 import os
 import tempfile
 import unittest
 
 from pacai.bin import capture
 from pacai.bin import pacman
+from pacai.core import replay
+from pacai.core.directions import Directions
+from pacai.core.layout import getLayout
 
 PACMAN_FILENAME = 'pacai_unittest_pacman.replay'
 CAPTURE_FILENAME = 'pacai_unittest_capture.replay'
 
+MOVES = [(0, Directions.WEST), (1, Directions.NORTH), (2, Directions.STOP), (31, Directions.EAST)]
+
 """
 Test saving and playing replays.
 """
@@ -23,6 +29,8 @@ class ReplayTest(unittest.TestCase):
         pacman.main(['--null-graphics', '--replay', replayPath])
 
         os.remove(replayPath)
+        if (os.path.isfile(replayPath + replay.KEYFRAMES_EXTENSION)):
+            os.remove(replayPath + replay.KEYFRAMES_EXTENSION)
 
     def test_capture(self):
         replayPath = os.path.join(tempfile.gettempdir(), CAPTURE_FILENAME)
@@ -34,6 +42,187 @@ class ReplayTest(unittest.TestCase):
         capture.main(['--null-graphics', '--replay', replayPath])
 
         os.remove(replayPath)
+        if (os.path.isfile(replayPath + replay.KEYFRAMES_EXTENSION)):
+            os.remove(replayPath + replay.KEYFRAMES_EXTENSION)
+
+    def test_recorded_moves(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            replayPath = os.path.join(tempDir, PACMAN_FILENAME)
+
+            games = pacman.main(['--null-graphics', '-p', 'GreedyAgent', '--num-games', '2',
+                    '--layout', 'smallClassic', '--record', replayPath, '--quiet'])
+
+            archive = replay.ReplayArchive(replayPath)
+            self.assertEqual(2, len(archive))
+
+            for game, recorded in zip(games, archive):
+                self.assertTrue(recorded.isComplete())
+                self.assertEqual(game.moveHistory, recorded.getActions())
+                self.assertEqual(game.state.getInitialLayout().layoutText,
+                        recorded.getLayout().layoutText)
+
+    def test_rescore(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            replayPath = os.path.join(tempDir, CAPTURE_FILENAME)
+
+            games = capture.main(['--null-graphics', '--num-games', '2', '--max-moves', '300',
+                    '--record', replayPath, '--quiet'])
+
+            finalStates = capture.main(['--null-graphics', '--replay', replayPath, '--rescore'])
+            # The replays have their own layouts, so compare everything else.
+            self.assertEqual(len(games), len(finalStates))
+            for game, finalState in zip(games, finalStates):
+                self.assertEqual(game.state.getScore(), finalState.getScore())
+                self.assertEqual(game.state.getFood(), finalState.getFood())
+                self.assertEqual(game.state.getAgentStates(), finalState.getAgentStates())
+
+            # Seeking to the end shows just the final state.
+            capture.main(['--null-graphics', '--replay', replayPath, '--replay-seek', '-1'])
+
+    def test_seek(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            replayPath = os.path.join(tempDir, PACMAN_FILENAME)
+
+            games = pacman.main(['--null-graphics', '-p', 'GreedyAgent', '--layout', 'smallClassic',
+                    '--record', replayPath, '--quiet'])
+            recorded = replay.ReplayArchive(replayPath).getGame(0)
+            actions = recorded.getActions()
+
+            states = [pacman.PacmanGameState(recorded.getLayout())]
+            for action in actions:
+                states.append(states[-1].generateSuccessor(*action))
+
+            player = replay.ReplayPlayer(states[0], actions, keyframeInterval = 7)
+            self.assertEqual(len(actions), player.getNumMoves())
+            self.assertEqual(1, player.getNumKeyframes())
+
+            self.assertEqual(games[0].state.getScore(), player.getFinalState().getScore())
+            self.assertEqual(games[0].state.getAgentStates(),
+                    player.getFinalState().getAgentStates())
+            self.assertEqual(len(actions) // 7 + 1, player.getNumKeyframes())
+
+            for numMoves in reversed(range(len(states))):
+                self.assertEqual(states[numMoves], player.getState(numMoves))
+
+            self.assertEqual(states[-3], player.getState(-3))
+            self.assertEqual(states[5:], list(player.iterStates(5)))
+
+            with self.assertRaises(IndexError):
+                player.getState(len(actions) + 1)
+
+    def test_saved_keyframes(self):
+        with tempfile.TemporaryDirectory() as tempDir:
+            replayPath = os.path.join(tempDir, PACMAN_FILENAME)
+
+            pacman.main(['--null-graphics', '-p', 'GreedyAgent', '--layout', 'smallClassic',
+                    '--record', replayPath, '--quiet'])
+            recorded = replay.ReplayArchive(replayPath).getGame(0)
+            self.assertEqual([], recorded.getKeyframes())
+
+            actions = recorded.getActions()
+            states = [pacman.PacmanGameState(recorded.getLayout())]
+            for action in actions:
+                states.append(states[-1].generateSuccessor(*action))
+
+            # Replaying the game saves its keyframes next to the replay file.
+            pacman.main(['--null-graphics', '--replay', replayPath, '--quiet'])
+            self.assertTrue(os.path.isfile(replayPath + replay.KEYFRAMES_EXTENSION))
+
+            archive = replay.ReplayArchive(replayPath)
+            keyframes = archive.getGame(0).getKeyframes()
+            self.assertEqual(len(actions) // replay.DEFAULT_KEYFRAME_INTERVAL, len(keyframes))
+            self.assertEqual([], archive.getGame(0).getKeyframes(keyframeInterval = 7))
+
+            # A new player can seek from the saved keyframes right away.
+            player = replay.ReplayPlayer(states[0], actions, snapshots = keyframes)
+            self.assertEqual(len(keyframes) + 1, player.getNumKeyframes())
+
+            for numMoves in reversed(range(len(states))):
+                state = player.getState(numMoves)
+                self.assertEqual(states[numMoves], state)
+                self.assertEqual(hash(states[numMoves]), hash(state))
+
+            self.assertFalse(archive.saveKeyframes(0, player))
+
+    def test_snapshot(self):
+        state = capture.CaptureGameState(getLayout('defaultCapture'), 300)
+        agentIndex = 0
+        for i in range(100):
+            state = state.generateSuccessor(agentIndex, state.getLegalActions(agentIndex)[-1])
+            agentIndex = (agentIndex + 1) % state.getNumAgents()
+
+        loaded = state.loadSnapshot(json.loads(json.dumps(state.getSnapshot())))
+        self.assertEqual(state, loaded)
+        self.assertEqual(hash(state), hash(loaded))
+        self.assertEqual(state.getTimeleft(), loaded.getTimeleft())
+        self.assertEqual(state.getRedFood(), loaded.getRedFood())
+        self.assertEqual(state.getBlueCapsules(), loaded.getBlueCapsules())
+
+    def test_crash(self):
+        layout = getLayout('defaultCapture')
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            replayPath = os.path.join(tempDir, CAPTURE_FILENAME)
+
+            with replay.ReplayWriter(replayPath) as writer:
+                writer.writeGame(layout, [], crash = (0, True), length = 100)
+                writer.writeGame(layout, [], length = 100)
+
+            archive = replay.ReplayArchive(replayPath)
+            self.assertEqual((0, True), archive.getGame(0).getCrash())
+            self.assertEqual([], archive.getGame(0).getActions())
+            self.assertIsNone(archive.getGame(1).getCrash())
+
+            # Rescoring applies the crash penalty (the red agent crashed, so blue wins).
+            finalStates = capture.main(['--null-graphics', '--replay', replayPath, '--rescore',
+                    '--quiet'])
+            self.assertEqual([-1, 0], [state.getScore() for state in finalStates])
+
+    def test_archive(self):
+        layout = getLayout('smallClassic', maxGhosts = 1)
+
+        with tempfile.TemporaryDirectory() as tempDir:
+            replayPath = os.path.join(tempDir, PACMAN_FILENAME)
+
+            with replay.ReplayWriter(replayPath) as writer:
+                writer.writeGame(layout, MOVES, name = 'first')
+                writer.writeGame(layout, [], name = 'second')
+
+            # Append a game, but crash (never close the writer) part way through.
+            writer = replay.ReplayWriter(replayPath, append = True)
+            writer.startGame(layout, name = 'crashed')
+            for agentIndex, action in MOVES[:2]:
+                writer.recordMove(agentIndex, action)
+            writer._file.close()
+
+            archive = replay.ReplayArchive(replayPath)
+            self.assertEqual(3, archive.getNumGames())
+            self.assertEqual(['first', 'second', 'crashed'],
+                    [recorded.getInfo()['name'] for recorded in archive])
+
+            self.assertEqual(MOVES, archive.getGame(0).getActions())
+            self.assertEqual(1, archive.getGame(0).getLayout().getNumGhosts())
+            self.assertEqual(0, archive.getGame(1).getNumMoves())
+            self.assertTrue(archive.getGame(1).isComplete())
+
+            crashed = archive.getGame(-1)
+            self.assertFalse(crashed.isComplete())
+            self.assertEqual(MOVES[:2], crashed.getActions())
+
+            # Appending after a crash keeps the partial game.
+            with replay.ReplayWriter(replayPath, append = True) as writer:
+                writer.writeGame(layout, MOVES, name = 'last')
+
+            archive = replay.ReplayArchive(replayPath)
+            self.assertEqual(4, len(archive))
+            self.assertEqual(MOVES[:2], archive.getGame(2).getActions())
+            self.assertEqual(MOVES, archive.getGame(3).getActions())
+
+            with open(replayPath, 'wb') as file:
+                file.write(b'not a replay')
+
+            with self.assertRaises(ValueError):
+                replay.ReplayArchive(replayPath)
 
 if __name__ == '__main__':
     unittest.main()